@@ -4,40 +4,126 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
-# create the app
+# create the app; routes and CLI commands register on it when create_app() imports them
 app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev_key_for_testing")
-
-# Configure SQLite database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///climate_app.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Maximum content length for file uploads (5MB)
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024
-
-# initialize the app with the extension
-db.init_app(app)
-
-with app.app_context():
-    # Import the models here
-    import models  # noqa: F401
-    
-    # Create all database tables
-    db.create_all()
-    
-    # Import and register routes
-    from routes import *
-    
+
+def create_app():
+    """
+    Configure the app and register its extensions, routes and CLI commands
+
+    Does not touch the database: run `flask --app main init-db` to create or
+    upgrade the schema, or set MIGRATE_ON_STARTUP=1. Modules that are only
+    needed by some requests are imported on first use; warm_up() loads them
+    ahead of time. Returns the same app however often it is called.
+    """
+    if "sqlalchemy" in app.extensions:
+        return app
+
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev_key_for_testing")
+
+    # Logging: LOG_LEVEL applies to every logger, LOG_LEVELS overrides single ones,
+    # e.g. "werkzeug=WARNING,utils.http_client=DEBUG,sqlalchemy.engine=INFO";
+    # LOG_FORMAT is "json" or "text". Records are written by a background thread
+    # unless LOG_QUEUE=0.
+    app.config["LOG_LEVEL"] = os.environ.get("LOG_LEVEL", "INFO")
+    app.config["LOG_LEVELS"] = os.environ.get("LOG_LEVELS", "")
+    app.config["LOG_FORMAT"] = os.environ.get("LOG_FORMAT", "json")
+    app.config["LOG_QUEUE"] = os.environ.get("LOG_QUEUE", "1") != "0"
+
+    from utils.logging_setup import configure as configure_logging, init_app as init_request_ids
+    configure_logging(app.config)
+
+    # prediction.html builds its lists with {% do %}
+    app.jinja_env.add_extension("jinja2.ext.do")
+
+    # Configure SQLite database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///climate_app.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Create or upgrade the schema while starting; otherwise run
+    # `flask --app main init-db` once per deploy, before the workers start
+    app.config["MIGRATE_ON_STARTUP"] = os.environ.get("MIGRATE_ON_STARTUP") == "1"
+
+    # Maximum content length for file uploads (5MB)
+    app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024
+
+    # Where the weather, forecast, historical disaster, strategy and image analysis
+    # caches live: "memory" (per worker), "sqlite" (shared by the workers on this
+    # host) or "redis" (shared across hosts)
+    app.config["CACHE_BACKEND"] = os.environ.get("CACHE_BACKEND", "memory")
+    app.config["CACHE_SQLITE_PATH"] = os.environ.get("CACHE_SQLITE_PATH", "/tmp/climate_app_cache.db")
+    app.config["CACHE_REDIS_URL"] = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # initialize the app with the extension
+    db.init_app(app)
+
+    from utils.cache_backends import configure as configure_cache
+    configure_cache(app.config)
+
+    # Time requests, template renders and database statements for /metrics
+    from utils.metrics import init_app as init_metrics
+    init_metrics(app)
+
+    # Tag each request's log records and response with a request ID
+    init_request_ids(app)
+
+    with app.app_context():
+        # Import the models here
+        import models  # noqa: F401
+
+        if app.config["MIGRATE_ON_STARTUP"]:
+            from schema import init_db
+            init_db()
+
+        # Import and register routes and CLI commands
+        import routes  # noqa: F401
+        import commands  # noqa: F401
+
+        # Optionally ingest weather observations in a background thread of this
+        # process; otherwise run `flask --app main ingest-weather --loop` separately.
+        # The thread starts on the first request, so a gunicorn master that
+        # preloads the app never runs it while forking workers
+        if os.environ.get("WEATHER_INGEST_IN_PROCESS") == "1":
+            from utils.weather_ingest import start_ingestion_thread
+
+            @app.before_request
+            def _start_ingestion():
+                start_ingestion_thread(app)
+
     logger.info("Application initialized successfully")
+    return app
+
+def warm_up():
+    """
+    Import the modules the app otherwise loads on first use and build their
+    read-only tables, so that workers forked afterwards share them, and
+    give up on image jobs that earlier workers left queued
+    """
+    from utils.search_index import build_index
+    from utils.disaster_prediction import get_risk_model
+    get_risk_model()
+
+    from utils.image_jobs import expire_stale_jobs
+    with app.app_context():
+        try:
+            expire_stale_jobs()
+        except Exception as e:
+            logger.warning("Could not expire stale image analysis jobs: %s", e)
+
+    # Workers inherit the index rather than each building it on its first
+    # search; without a schema yet, they build it themselves
+    with app.app_context():
+        try:
+            build_index()
+        except Exception as e:
+            logger.warning("Search index not built before forking: %s", e)
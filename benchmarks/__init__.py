@@ -0,0 +1,7 @@
+# This file makes the benchmarks directory a Python package
+
+import os
+
+# Benchmarks run against scratch databases, whose tables are created when the
+# app starts rather than with `flask --app main init-db`
+os.environ.setdefault("MIGRATE_ON_STARTUP", "1")
@@ -0,0 +1,86 @@
+"""
+Upstream calls and lookup latency for each cache backend
+
+Starts the stub upstream (and the stub Redis server), then runs several
+worker processes that each read the weather and forecast for every city, as
+gunicorn workers warming up would. With the memory backend every worker
+fetches on its own; with the shared backends only the first does.
+
+    python -m benchmarks.cache_backends --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.stub_redis import start_stub_redis
+from benchmarks.stub_upstream import start_stub_server, stub_environ
+
+
+def worker(config, environ, start_event):
+    os.environ.update(environ)
+    from utils import cache_backends
+    from utils.weather_api import CITY_COORDINATES, get_weather_data, get_forecast_data
+
+    cache_backends.configure(config)
+    start_event.wait()
+    for city in CITY_COORDINATES:
+        get_weather_data(city)
+        get_forecast_data(city)
+
+
+def lookup_latency(config, repeat):
+    from utils import cache_backends
+    from utils.cache import TTLCache
+    from utils.weather_api import _fetch_forecast_data
+
+    cache_backends.configure(config)
+    cache = TTLCache(f"bench_{config['CACHE_BACKEND']}", maxsize=16, default_ttl=60)
+    cache.set("Mumbai", _fetch_forecast_data("Mumbai"))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        cache.get("Mumbai")
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cache backends")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=2000, help="lookups timed per backend")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    _, redis_url = start_stub_redis()
+    environ = stub_environ(base_url)
+    os.environ.update(environ)
+    counts = server.RequestHandlerClass.counts
+
+    print(f"{args.workers} workers reading weather and forecast for every city")
+    print(f"{'backend':<10}{'upstream calls':>16}{'lookup us':>12}")
+    for backend in ("memory", "sqlite", "redis"):
+        config = {
+            "CACHE_BACKEND": backend,
+            "CACHE_SQLITE_PATH": os.path.join(tempfile.mkdtemp(), "cache.db"),
+            "CACHE_REDIS_URL": redis_url
+        }
+        counts.clear()
+        context = multiprocessing.get_context("spawn")
+        start_event = context.Event()
+        processes = [context.Process(target=worker, args=(config, environ, start_event)) for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        start_event.set()
+        for process in processes:
+            process.join()
+
+        calls = counts.get("open-meteo", 0)
+        latency = lookup_latency(config, args.repeat)
+        print(f"{backend:<10}{calls:>16}{latency * 1e6:>12.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
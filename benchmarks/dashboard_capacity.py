@@ -0,0 +1,78 @@
+"""
+Per-worker /dashboard capacity with sequential vs concurrent upstream fetches
+
+Starts the stub upstream with a fixed latency, then times the dashboard's
+weather, forecast and prediction fetches run one after another (the old
+path) and side by side on the shared thread pool (utils.upstream_fanout).
+Caches are cleared before every iteration so each one pays the upstream
+round trips.
+A sync gunicorn worker serves one request at a time, so its capacity is
+1 / latency.
+
+    python -m benchmarks.dashboard_capacity --latency 0.2 --iterations 20
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stub_upstream import start_stub_server, stub_environ
+
+
+def _clear_caches(weather_api):
+    from utils.render_cache import page_cache
+
+    weather_api.weather_cache.clear()
+    weather_api.forecast_cache.clear()
+    weather_api.batch_cache.clear()
+    # Otherwise the route serves the page it stored on the first iteration
+    page_cache.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sequential and concurrent /dashboard fetch capacity")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub upstream latency in seconds")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--city", default="Mumbai")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency)
+    os.environ.update(stub_environ(base_url))
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+    from utils import weather_api
+    from utils.disaster_prediction import predict_disasters
+    from utils.upstream_fanout import gather_dashboard_data
+    from main import app
+
+    def sequential_fetch():
+        weather_api.get_weather_data(args.city)
+        weather_api.get_forecast_data(args.city)
+        predict_disasters(args.city)
+
+    def concurrent_fetch():
+        gather_dashboard_data(args.city)
+
+    client = app.test_client()
+
+    def dashboard_route():
+        client.get(f"/dashboard?city={args.city}")
+
+    print(f"stub upstream latency: {args.latency * 1000:.0f} ms, iterations: {args.iterations}")
+    print(f"{'path':<20}{'mean ms':>10}{'p50 ms':>10}{'req/s/worker':>15}")
+    for name, fetch in (("sequential fetch", sequential_fetch), ("concurrent fetch", concurrent_fetch), ("/dashboard route", dashboard_route)):
+        timings = []
+        for _ in range(args.iterations):
+            _clear_caches(weather_api)
+            start = time.perf_counter()
+            fetch()
+            timings.append(time.perf_counter() - start)
+        mean = statistics.mean(timings)
+        print(f"{name:<20}{mean * 1000:>10.1f}{statistics.median(timings) * 1000:>10.1f}{1 / mean:>15.2f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Query latency on the models' tables with and without their indexes
+
+Seeds WeatherData, DisasterRecord, DisasterPrediction and ImageAnalysis with
+synthetic rows, times the app's hot queries with only primary keys, then
+creates the indexes declared in models.py and times them again.
+DisasterPrediction gets one row per city and disaster type, as the app
+stores it, whatever --rows is. Runs against
+a throwaway SQLite file by default; pass a PostgreSQL URL to measure there
+(its tables are dropped and recreated, so use a scratch database).
+
+    python -m benchmarks.db_indexes --rows 1000000
+    python -m benchmarks.db_indexes --database-url postgresql://localhost/bench
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from utils.reference_data import CITIES, DISASTER_TYPES
+
+BATCH_SIZE = 20000
+EPOCH = datetime(2020, 1, 1)
+
+
+def weather_rows(count):
+    for i in range(count):
+        yield {
+            "location": CITIES[i % len(CITIES)],
+            "timestamp": EPOCH + timedelta(hours=i // len(CITIES)),
+            "temperature": 20 + i % 15,
+            "humidity": 40 + i % 50,
+            "wind_speed": 5 + i % 20,
+            "precipitation": (i % 7) * 0.5
+        }
+
+
+def prediction_rows():
+    # The unique index allows one stored prediction per city and disaster type
+    for i, (city, disaster_type) in enumerate((city, disaster_type) for city in CITIES for disaster_type in DISASTER_TYPES):
+        yield {
+            "location": city,
+            "disaster_type": disaster_type,
+            "probability": (i % 100) / 100,
+            "predicted_severity": 1 + i % 5,
+            "prediction_date": EPOCH,
+            "valid_until": EPOCH + timedelta(days=7 + 7 * (i % 2))
+        }
+
+
+def record_rows(count):
+    for i in range(count):
+        yield {
+            "disaster_type": DISASTER_TYPES[i % len(DISASTER_TYPES)],
+            "location": CITIES[i % len(CITIES)],
+            "severity": 1 + i % 5,
+            "date": EPOCH + timedelta(hours=i),
+            "description": f"Synthetic disaster record {i}",
+            "source_id": i if i % 2 else None
+        }
+
+
+def image_rows(count):
+    for i in range(count):
+        yield {
+            "filename": f"upload_{i}.jpg",
+            "upload_date": EPOCH + timedelta(seconds=i * 30),
+            "location": CITIES[i % len(CITIES)],
+            "disaster_type": DISASTER_TYPES[i % len(DISASTER_TYPES)],
+            "confidence_score": (i % 100) / 100
+        }
+
+
+def seed(db, model, rows):
+    batch = []
+    with db.engine.begin() as connection:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                connection.execute(model.__table__.insert(), batch)
+                batch = []
+        if batch:
+            connection.execute(model.__table__.insert(), batch)
+
+
+def build_queries(db, models, rows):
+    WeatherData, DisasterRecord, DisasterPrediction, ImageAnalysis = models
+    last_hour = EPOCH + timedelta(hours=rows // len(CITIES))
+
+    def latest_weather():
+        city = random.choice(CITIES)
+        WeatherData.query.filter(WeatherData.location == city).order_by(WeatherData.timestamp.desc()).first()
+
+    def weather_last_24h():
+        city = random.choice(CITIES)
+        WeatherData.query.filter(
+            WeatherData.location == city,
+            WeatherData.timestamp >= last_hour - timedelta(hours=24)
+        ).all()
+
+    def valid_predictions():
+        # As prediction_store reads a dashboard's cities
+        cities = random.sample(CITIES, 5)
+        DisasterPrediction.query.filter(
+            DisasterPrediction.location.in_(cities),
+            DisasterPrediction.valid_until > EPOCH + timedelta(days=1)
+        ).all()
+
+    def recent_image_analyses():
+        ImageAnalysis.query.order_by(ImageAnalysis.upload_date.desc()).limit(5).all()
+
+    def historical_snapshot():
+        DisasterRecord.query.filter(DisasterRecord.source_id.isnot(None)).order_by(DisasterRecord.date.desc()).limit(20).all()
+
+    def record_by_source_id():
+        DisasterRecord.query.filter(DisasterRecord.source_id == random.randrange(1, rows // 10, 2)).first()
+
+    return [
+        ("weather: latest for city", latest_weather),
+        ("weather: city last 24h", weather_last_24h),
+        ("prediction: valid for 5 cities", valid_predictions),
+        ("image: 5 most recent", recent_image_analyses),
+        ("record: historical snapshot", historical_snapshot),
+        ("record: by ReliefWeb id", record_by_source_id),
+    ]
+
+
+def time_queries(db, queries, repeat):
+    results = {}
+    for name, query in queries:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            timings.append(time.perf_counter() - start)
+            db.session.rollback()
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query latency with and without model indexes")
+    parser.add_argument("--database-url", default=None, help="default: a temporary SQLite file")
+    parser.add_argument("--rows", type=int, default=1000000, help="WeatherData rows; other tables scale from this")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+    from main import app
+    from app import db
+    from models import WeatherData, DisasterRecord, DisasterPrediction, ImageAnalysis
+    models = (WeatherData, DisasterRecord, DisasterPrediction, ImageAnalysis)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        indexes = [index for model in models for index in model.__table__.indexes]
+        for index in indexes:
+            index.drop(db.engine)
+
+        start = time.perf_counter()
+        seed(db, WeatherData, weather_rows(args.rows))
+        seed(db, DisasterPrediction, prediction_rows())
+        seed(db, ImageAnalysis, image_rows(args.rows // 4))
+        seed(db, DisasterRecord, record_rows(args.rows // 10))
+        seeded = args.rows + len(CITIES) * len(DISASTER_TYPES) + args.rows // 4 + args.rows // 10
+        print(f"seeded {seeded} rows "
+              f"into {db.engine.dialect.name} in {time.perf_counter() - start:.1f}s")
+
+        queries = build_queries(db, models, args.rows)
+        before = time_queries(db, queries, args.repeat)
+
+        start = time.perf_counter()
+        for index in indexes:
+            index.create(db.engine)
+        print(f"created {len(indexes)} indexes in {time.perf_counter() - start:.1f}s")
+        if db.engine.dialect.name in ("sqlite", "postgresql"):
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql("ANALYZE")
+
+        after = time_queries(db, queries, args.repeat)
+
+        print(f"{'query':<34}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+        for name, _ in queries:
+            print(f"{name:<34}{before[name] * 1000:>12.3f}{after[name] * 1000:>12.3f}{before[name] / after[name]:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
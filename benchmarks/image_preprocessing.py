@@ -0,0 +1,64 @@
+"""
+Bytes sent to inference and latency with and without image preprocessing
+
+Runs analyze_image on synthetic phone-sized photos against the stub upstream,
+first sending the raw uploads and then the downsampled copies produced by
+utils.image_preprocessing, and reports bytes posted per image, the decoded
+pixel buffer per image (the full photo for raw uploads, the reduced-scale
+JPEG decode when preprocessing) and the end-to-end latency.
+
+    python -m benchmarks.image_preprocessing --images 8 --latency 0.2 --bandwidth 20
+"""
+import argparse
+import os
+from io import BytesIO
+import statistics
+import time
+
+from benchmarks.local_classifier import synthetic_photo
+from benchmarks.stub_upstream import start_stub_server, stub_environ
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing before inference")
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--size", default="4000x3000", help="synthetic photo size, WIDTHxHEIGHT")
+    parser.add_argument("--latency", type=float, default=0.0, help="stub upstream latency in seconds")
+    parser.add_argument("--bandwidth", type=float, default=20.0, help="upload Mbit/s to the stub, 0 for unlimited")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency, bandwidth=args.bandwidth)
+    os.environ.update(stub_environ(base_url))
+
+    from PIL import Image
+    from utils import image_analysis, image_preprocessing
+
+    width, height = (int(value) for value in args.size.split("x"))
+    images = [synthetic_photo(width, height, seed) for seed in range(args.images)]
+    counts = server.RequestHandlerClass.counts
+
+    print(f"{len(images)} {width}x{height} JPEGs, {sum(map(len, images)) / len(images) / 1024:.0f} KB average")
+    print(f"{'mode':<14}{'KB sent/image':>15}{'decoded MB/image':>18}{'p50 ms':>10}{'max ms':>10}")
+    for mode, size in (("raw upload", 0), ("preprocessed", image_preprocessing.INFERENCE_IMAGE_SIZE)):
+        image_analysis.prepare_for_inference = (
+            lambda image_data, size=size: image_preprocessing.prepare_for_inference(image_data, size)
+        )
+        counts.clear()
+        timings = []
+        for image_data in images:
+            start = time.perf_counter()
+            image_analysis.analyze_image(image_data)
+            timings.append(time.perf_counter() - start)
+
+        with Image.open(BytesIO(images[0])) as image:
+            if size:
+                image.draft("RGB", (size, size))
+            decoded = image.size[0] * image.size[1] * 3
+        print(f"{mode:<14}{counts.get('bytes_received', 0) / len(images) / 1024:>15.0f}"
+              f"{decoded / 1e6:>18.1f}{statistics.median(timings) * 1000:>10.1f}{max(timings) * 1000:>10.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
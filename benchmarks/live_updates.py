@@ -0,0 +1,175 @@
+"""
+Load test of the live update stream
+
+Starts the stub upstream and one gevent gunicorn worker against a scratch
+database, opens --subscribers streams spread over every city, then stores a
+new weather observation for each city and measures how long the update
+takes to reach every subscriber. Also reports the worker's memory per open
+stream and how many upstream requests were made, against what the same
+viewers would cause by polling.
+
+    python -m benchmarks.live_updates --subscribers 2000
+
+Needs gevent and gunicorn (pip install .[live-updates]).
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.stub_upstream import start_stub_server, stub_environ
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def worker_rss_mb(master_pid):
+    """
+    Resident memory of the gunicorn worker forked by master_pid
+    """
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as children:
+        worker_pid = int(children.read().split()[0])
+    with open(f"/proc/{worker_pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+async def subscriber(port, city, connected, received, stop):
+    """
+    Hold one stream open, recording when each weather event arrives
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 20)
+    writer.write(f"GET /api/stream/{city} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+
+    first = True
+    try:
+        while not stop.is_set():
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b"event: weather"):
+                if first:
+                    first = False
+                    connected.append(time.time())
+                else:
+                    received.append((city, time.time()))
+    finally:
+        writer.close()
+
+
+async def run_load(port, cities, count, timeout, master_pid, db_path):
+    connected = []
+    received = []
+    stop = asyncio.Event()
+    start = time.time()
+    tasks = [
+        asyncio.create_task(subscriber(port, cities[i % len(cities)], connected, received, stop))
+        for i in range(count)
+    ]
+
+    while len(connected) < count and time.time() - start < timeout:
+        await asyncio.sleep(0.1)
+    print(f"{len(connected)}/{count} subscribers received their first update in {time.time() - start:.1f}s")
+    rss = worker_rss_mb(master_pid)
+
+    # Publish one change per city through the database, as ingestion would
+    observed_at = datetime.utcnow().replace(microsecond=0)
+    connection = sqlite3.connect(db_path)
+    connection.executemany(
+        "INSERT INTO weather_data (location, temperature, humidity, wind_speed, precipitation, timestamp, "
+        "wind_direction, weathercode) VALUES (?, 31.5, 70, 12, 0.5, ?, 180, 61)",
+        [(city, observed_at.strftime("%Y-%m-%d %H:%M:%S.000000")) for city in cities]
+    )
+    connection.commit()
+    connection.close()
+    changed_at = time.time()
+
+    while len(received) < len(connected) and time.time() - changed_at < timeout:
+        await asyncio.sleep(0.05)
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return connected, [arrived - changed_at for _, arrived in received], rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the live update stream")
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--interval", type=int, default=2, help="LIVE_UPDATE_INTERVAL of the worker")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    counts = server.RequestHandlerClass.counts
+    db_path = os.path.join(tempfile.mkdtemp(), "live_updates.db")
+    port = free_port()
+
+    environ = dict(os.environ)
+    environ.update(stub_environ(base_url))
+    environ.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "LIVE_UPDATE_INTERVAL": str(args.interval),
+        "LIVE_MAX_SUBSCRIBERS": str(args.subscribers + 100),
+        "PYTHONPATH": os.getcwd()
+    })
+    gunicorn = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-k", "gevent", "--worker-connections", str(args.subscribers + 100),
+         "-w", "1", "-b", f"127.0.0.1:{port}", "--log-level", "warning", "main:app"],
+        env=environ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        from utils.weather_api import CITY_COORDINATES
+        cities = list(CITY_COORDINATES)
+
+        deadline = time.time() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+        time.sleep(1)
+        idle_rss = worker_rss_mb(gunicorn.pid)
+
+        counts.clear()
+        test_start = time.time()
+        connected, latencies, rss = asyncio.run(
+            run_load(port, cities, args.subscribers, args.timeout, gunicorn.pid, db_path)
+        )
+        duration = time.time() - test_start
+        upstream_calls = counts.get("open-meteo", 0)
+
+        latencies.sort()
+        print(f"Worker memory: {idle_rss:.0f} MB idle, {rss:.0f} MB with {len(connected)} streams "
+              f"({(rss - idle_rss) * 1024 / max(len(connected), 1):.1f} KB per stream)")
+        if latencies:
+            print(f"Update delivered to {len(latencies)}/{len(connected)} subscribers: "
+                  f"p50 {statistics.median(latencies) * 1000:.0f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.0f} ms, "
+                  f"max {latencies[-1] * 1000:.0f} ms (refresh interval {args.interval}s)")
+        print(f"Open-Meteo requests during {duration:.0f}s: {upstream_calls} "
+              f"(polling viewers would make {len(connected) * 2} per round)")
+    finally:
+        gunicorn.terminate()
+        gunicorn.wait()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
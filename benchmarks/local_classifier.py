@@ -0,0 +1,120 @@
+"""
+Images per second per core for the local ONNX image classifier
+
+Times preprocessing alone and end-to-end classification of synthetic photos
+at several batch sizes, with ONNX Runtime limited to one thread. Pass an
+exported model with --model; without one a small randomly initialized CNN
+with the same input and output shapes is built (needs the `onnx` package),
+which measures the pipeline but not a production-sized network.
+
+    python -m benchmarks.local_classifier --model instance/disaster_types.onnx
+"""
+import argparse
+import os
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+
+
+def synthetic_photo(width, height, seed):
+    """
+    JPEG bytes of a noisy gradient, roughly the size of a phone photo
+    """
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)
+    pixels = np.stack([
+        np.tile(gradient, (height, 1)),
+        np.tile(gradient[::-1], (height, 1)),
+        np.full((height, width), 128, dtype=np.float32)
+    ], axis=2)
+    pixels = np.clip(pixels + rng.normal(0, 20, pixels.shape), 0, 255).astype(np.uint8)
+
+    output = BytesIO()
+    Image.fromarray(pixels).save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+def build_small_cnn(path, labels):
+    """
+    Write a small randomly initialized CNN taking the classifier's input shape
+    """
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+
+    from utils.local_classifier import INPUT_SIZE
+
+    rng = np.random.default_rng(0)
+    channels = [3, 16, 32, 64, 128]
+    nodes, initializers = [], []
+    current = "input"
+    for i in range(len(channels) - 1):
+        weight = rng.normal(0, 0.1, (channels[i + 1], channels[i], 3, 3)).astype(np.float32)
+        initializers.append(numpy_helper.from_array(weight, f"conv{i}_w"))
+        nodes.append(helper.make_node("Conv", [current, f"conv{i}_w"], [f"conv{i}"], strides=[2, 2], pads=[1, 1, 1, 1]))
+        nodes.append(helper.make_node("Relu", [f"conv{i}"], [f"relu{i}"]))
+        current = f"relu{i}"
+
+    weight = rng.normal(0, 0.1, (channels[-1], len(labels))).astype(np.float32)
+    initializers.append(numpy_helper.from_array(weight, "fc_w"))
+    nodes.append(helper.make_node("GlobalAveragePool", [current], ["pooled"]))
+    nodes.append(helper.make_node("Flatten", ["pooled"], ["flat"]))
+    nodes.append(helper.make_node("MatMul", ["flat", "fc_w"], ["logits"]))
+
+    graph = helper.make_graph(
+        nodes, "small_cnn",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch", 3, INPUT_SIZE, INPUT_SIZE])],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", len(labels)])],
+        initializers
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    # IR version 8 loads in every ONNX Runtime release with opset 13
+    model.ir_version = 8
+    helper.set_model_props(model, {"labels": ",".join(labels)})
+    onnx.save(model, path)
+
+
+def images_per_second(run, images, batch_size, seconds):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for i in range(0, len(images), batch_size):
+            run(images[i:i + batch_size])
+            count += len(images[i:i + batch_size])
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local image classifier")
+    parser.add_argument("--model", default=None, help="ONNX model; default: a small random CNN")
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--size", default="1600x1200", help="synthetic photo size, WIDTHxHEIGHT")
+    parser.add_argument("--seconds", type=float, default=3.0, help="time per measurement")
+    args = parser.parse_args()
+
+    from utils.local_classifier import LocalClassifier, DEFAULT_LABELS, preprocess
+
+    model_path = args.model
+    if model_path is None:
+        model_path = os.path.join(tempfile.mkdtemp(), "small_cnn.onnx")
+        build_small_cnn(model_path, DEFAULT_LABELS)
+
+    classifier = LocalClassifier(model_path, threads=1)
+
+    width, height = (int(value) for value in args.size.split("x"))
+    images = [synthetic_photo(width, height, seed) for seed in range(args.images)]
+    average_kb = sum(len(image) for image in images) / len(images) / 1024
+    print(f"{len(images)} {width}x{height} JPEGs, {average_kb:.0f} KB average, 1 thread")
+
+    rate = images_per_second(lambda batch: [preprocess(image) for image in batch], images, 1, args.seconds)
+    print(f"{'preprocess only':<24}{rate:>10.1f} images/s/core")
+    for batch_size in (1, 4, 16):
+        rate = images_per_second(classifier.classify_batch, images, batch_size, args.seconds)
+        print(f"{f'classify, batch {batch_size}':<24}{rate:>10.1f} images/s/core")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Per-request cost of the logging setup
+
+Runs the same requests through the test client under each logging setup,
+with stderr written to a file as it would be under a process manager:
+
+- basicConfig: the previous setup, every logger at DEBUG written on the
+  request thread in the default text format
+- sync: the configured levels (INFO, urllib3 and SQLAlchemy at WARNING),
+  JSON written on the request thread (LOG_QUEUE=0)
+- queued: the configured levels, JSON written by the listener thread
+- queued debug: every logger at DEBUG, JSON written by the listener thread
+
+Each round requests a forecast with its cache cleared, so the upstream call
+logs as it would on a miss, the same forecast cached, and an unsupported
+city, which logs an error. A few tens of microseconds per request are well
+inside the run-to-run variation of the requests themselves, so rather than
+comparing request times, the time spent in logging is measured where it is
+spent: in Logger._log on the request and upstream executor threads, which
+the request waits for, and in QueueListener.handle on the listener thread.
+Calls dropped by a level check return before Logger._log and cost about
+0.3 us each in every setup. The request ID hooks, which the previous setup
+did not have, are timed on their own in a request context and counted in
+the total of the others.
+The setups take turns in blocks within one process and the median block of
+each is reported.
+
+    python -m benchmarks.logging_pipeline --rounds 100 --blocks 9
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from logging.handlers import QueueListener
+
+from benchmarks.stub_upstream import start_stub_server, stub_environ
+
+URLS = ["/api/forecast/Mumbai", "/api/forecast/Mumbai", "/api/forecast/Nowhere"]
+
+# Seconds spent in each logging call, appended from any thread
+request_path_times = []
+listener_times = []
+
+
+def use_basic_config():
+    """
+    Log the way app.py did before: no per-logger levels and root at DEBUG
+    """
+    from utils import logging_setup
+
+    logging_setup.configure({"LOG_QUEUE": False})
+    logging.logMultiprocessing = True
+    logging.logAsyncioTasks = True
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for name in logging_setup.DEFAULT_LOGGER_LEVELS:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    logging.basicConfig(level=logging.DEBUG)
+
+
+SETUPS = [
+    ("basicConfig", None),
+    ("sync", {"LOG_QUEUE": False}),
+    ("queued", {}),
+    ("queued debug", {"LOG_LEVEL": "DEBUG", "LOG_LEVELS": "urllib3=DEBUG,sqlalchemy=DEBUG,PIL=DEBUG"}),
+]
+
+
+def instrument(method, times):
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            times.append(time.perf_counter() - start)
+    return timed
+
+
+def wait_for_listener():
+    """
+    Wait until the listener thread has written every queued record
+    """
+    from utils import logging_setup
+
+    handler = logging_setup._handler
+    while getattr(handler, "queue", None) is not None and not handler.queue.empty():
+        time.sleep(0.001)
+    # The record taken off the queue last may still be being written
+    time.sleep(0.005)
+
+
+def run_block(client, rounds, forecast_cache):
+    """
+    Records, request path and listener seconds spent logging, per request
+    """
+    del request_path_times[:], listener_times[:]
+    for _ in range(rounds):
+        forecast_cache.clear()
+        for url in URLS:
+            client.get(url)
+    wait_for_listener()
+    requests = rounds * len(URLS)
+    return len(request_path_times) / requests, sum(request_path_times) / requests, sum(listener_times) / requests
+
+
+def request_id_cost(app, number=20000):
+    """
+    Seconds per request spent in the request ID hooks
+    """
+    from flask import Response
+    from utils import logging_setup
+
+    hooks = {
+        hook.__name__: hook
+        for hooks in (app.before_request_funcs, app.after_request_funcs, app.teardown_request_funcs)
+        for hook in hooks[None] if hook.__module__ == logging_setup.__name__
+    }
+    response = Response("")
+    with app.test_request_context("/api/forecast/Mumbai"):
+        def request():
+            hooks["_set_request_id"]()
+            hooks["_add_request_id_header"](response)
+            hooks["_clear_request_id"](None)
+        return min(timeit.repeat(request, number=number, repeat=5)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the per-request cost of the logging setup")
+    parser.add_argument("--rounds", type=int, default=100, help="rounds of uncached, cached and failing requests per block")
+    parser.add_argument("--blocks", type=int, default=9, help="blocks per setup")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{directory}/bench.db")
+    os.environ.setdefault("METRICS_DIR", os.path.join(directory, "metrics"))
+    sys.stderr = open(os.path.join(directory, "stderr.log"), "w")
+
+    server, base_url = start_stub_server()
+    os.environ.update(stub_environ(base_url))
+    from main import app
+    from utils import logging_setup
+    from utils.weather_api import forecast_cache
+
+    logging.Logger._log = instrument(logging.Logger._log, request_path_times)
+    QueueListener.handle = instrument(QueueListener.handle, listener_times)
+
+    client = app.test_client()
+    for url in URLS:
+        client.get(url)
+
+    results = {label: [] for label, _ in SETUPS}
+    for _ in range(args.blocks):
+        for label, config in SETUPS:
+            if config is None:
+                use_basic_config()
+            else:
+                logging_setup.configure(config)
+            results[label].append(run_block(client, args.rounds, forecast_cache))
+    server.shutdown()
+    hooks = request_id_cost(app)
+
+    print(f"{args.blocks} blocks of {args.rounds} rounds of {', '.join(URLS)}; median block, per request")
+    print(f"{'setup':<16}{'records':>9}{'request path us':>17}{'request id us':>15}{'listener us':>13}{'total us':>10}")
+    for label, config in SETUPS:
+        records, request_path, listener = (statistics.median(values) for values in zip(*results[label]))
+        request_id = 0.0 if config is None else hooks
+        print(f"{label:<16}{records:>9.2f}{request_path * 1e6:>17.1f}{request_id * 1e6:>15.1f}"
+              f"{listener * 1e6:>13.1f}{(request_path + request_id + listener) * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Overhead of the metrics instrumentation
+
+Times the primitives every instrumented call pays (a histogram observation,
+a perf_counter timer around it, the timed() decorator and the SQL statement
+labels), then the CPU time of a cheap JSON route through the test client
+with METRICS=1 and METRICS=0, each in a fresh process, and the time to
+render /metrics over the given number of worker files.
+
+    python -m benchmarks.metrics --requests 5000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+
+def per_call_ns(statement, setup, number=200000):
+    return min(timeit.repeat(statement, setup, number=number, repeat=5)) / number * 1e9
+
+
+def request_cpu(requests):
+    """
+    Mean CPU time per /api/forecast request in this process
+    """
+    from benchmarks.stub_upstream import start_stub_server, stub_environ
+
+    server, base_url = start_stub_server()
+    os.environ.update(stub_environ(base_url))
+    from main import app
+
+    client = app.test_client()
+    client.get("/api/forecast/Mumbai")
+    start = time.process_time()
+    for _ in range(requests):
+        client.get("/api/forecast/Mumbai")
+    server.shutdown()
+    return (time.process_time() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the overhead of the metrics instrumentation")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=8, help="worker files for the /metrics render")
+    parser.add_argument("--child", choices=("0", "1"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(request_cpu(args.requests)))
+        return
+
+    setup = "from utils.metrics import http_request_duration, function_duration, timed, _statement_labels; import time"
+    print(f"{'primitive':<44}{'ns/call':>10}")
+    for label, statement, extra_setup in (
+        ("Histogram.observe", "http_request_duration.observe(0.003, '/dashboard', 'GET', 200)", ""),
+        ("perf_counter timer + observe",
+         "s = time.perf_counter(); function_duration.observe(time.perf_counter() - s, 'f')", ""),
+        ("timed() decorator overhead", "f()", "f = timed('bench')(lambda: None)"),
+        ("SQL statement labels (memoized)", "_statement_labels(q)",
+         "q = 'SELECT weather_data.id FROM weather_data WHERE weather_data.location = ?'"),
+    ):
+        print(f"{label:<44}{per_call_ns(statement, setup + '; ' + extra_setup if extra_setup else setup):>10.0f}")
+
+    results = {}
+    for enabled in ("0", "1"):
+        environ = dict(os.environ, METRICS=enabled, METRICS_DIR=tempfile.mkdtemp(),
+                       DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.metrics", "--child", enabled, "--requests", str(args.requests)],
+            env=environ, capture_output=True, text=True, check=True
+        ).stdout
+        results[enabled] = json.loads(output.strip().splitlines()[-1])
+    print(f"/api/forecast CPU per request: {results['0'] * 1e6:.0f} us without metrics, "
+          f"{results['1'] * 1e6:.0f} us with ({(results['1'] - results['0']) * 1e6:+.1f} us)")
+
+    # Render /metrics over several workers' files
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp()
+    from utils import metrics
+    for status in (200, 404, 500):
+        for route in ("/dashboard", "/prediction", "/strategies", "/api/forecast/<city>", "/api/weather/<city>"):
+            for _ in range(100):
+                metrics.http_request_duration.observe(0.004, route, "GET", status)
+    values = metrics.snapshot()
+    os.makedirs(metrics.METRICS_DIR, exist_ok=True)
+    for number in range(args.workers - 1):
+        # Made-up pids of exited workers; the first render retires them
+        with open(os.path.join(metrics.METRICS_DIR, f"{4000000 + number}.json"), "w") as handle:
+            json.dump(values, handle)
+    for label in ("first, retiring the exited workers", "later"):
+        start = time.perf_counter()
+        text = metrics.render_metrics()
+        print(f"/metrics render ({label}): {(time.perf_counter() - start) * 1000:.1f} ms, "
+              f"{len(text.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Cost of loading and looking up the reference data
+
+Times compiling data/reference.json, and reading the tables at import from
+the compiled file and, as when it cannot be written, from the source, both
+for the shipped data and for a copy with --cities cities. Then times the
+lookups requests make, next to how they worked before: the weather code
+table rebuilt on every call and the precautions copied into a new list.
+
+    python -m benchmarks.reference_data --cities 1000
+"""
+import argparse
+import json
+import os
+import tempfile
+import timeit
+from contextlib import closing
+
+from utils import reference_data
+from utils.weather_api import get_weather_description
+from utils.disaster_prediction import get_disaster_precautions, DISASTER_PRECAUTIONS
+
+
+def synthetic_source(directory, cities):
+    """
+    Write a copy of the reference data with the given number of cities
+    """
+    with open(reference_data.REFERENCE_DATA_SOURCE) as handle:
+        data = json.load(handle)
+    shipped = data["cities"]
+    data["cities"] = [
+        dict(shipped[i % len(shipped)], name=f"{shipped[i % len(shipped)]['name']} {i}") for i in range(cities)
+    ]
+    path = os.path.join(directory, f"reference_{cities}.json")
+    with open(path, "w") as handle:
+        json.dump(data, handle)
+    return path
+
+
+def best_ms(function, number=20):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1000
+
+
+def load_compiled(source, path):
+    with closing(reference_data._open(source, path)) as connection:
+        return reference_data._read_tables(connection)
+
+
+def load_source(source):
+    with closing(reference_data.sqlite3.connect(":memory:")) as connection:
+        reference_data._write(connection, *reference_data._read_source(source), None)
+        return reference_data._read_tables(connection)
+
+
+def previous_lookups():
+    """
+    The weather description and precaution lookups as they were: the weather
+    code table a literal in the function, built on every call, and the
+    precautions copied into a new list
+    """
+    namespace = {"DISASTER_PRECAUTIONS": DISASTER_PRECAUTIONS}
+    table = ", ".join(f"{code!r}: {text!r}" for code, text in reference_data.WEATHER_DESCRIPTIONS.items())
+    exec(
+        f"def get_weather_description(code):\n"
+        f"    weather_codes = {{{table}}}\n"
+        f"    return weather_codes.get(code, 'Unknown')\n"
+        f"def get_disaster_precautions(disaster_type):\n"
+        f"    return list(DISASTER_PRECAUTIONS.get(disaster_type, ['Follow general safety instructions']))\n",
+        namespace
+    )
+    return namespace["get_weather_description"], namespace["get_disaster_precautions"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure loading and looking up the reference data")
+    parser.add_argument("--cities", type=int, default=1000, help="cities in the synthetic copy")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    sources = [("shipped", reference_data.REFERENCE_DATA_SOURCE), (f"{args.cities} cities", synthetic_source(directory, args.cities))]
+
+    print(f"{'data':<14}{'source KB':>11}{'compiled KB':>13}{'compile ms':>12}{'load compiled ms':>18}{'load source ms':>16}")
+    for label, source in sources:
+        path = os.path.join(directory, os.path.basename(source) + ".sqlite")
+        compile_ms = best_ms(lambda: reference_data.compile_reference(source, path), number=5)
+        compiled_ms = best_ms(lambda: load_compiled(source, path))
+        source_ms = best_ms(lambda: load_source(source))
+        print(f"{label:<14}{os.path.getsize(source) / 1024:>11.1f}{os.path.getsize(path) / 1024:>13.1f}"
+              f"{compile_ms:>12.2f}{compiled_ms:>18.2f}{source_ms:>16.2f}")
+
+    number = 200000
+    print(f"\n{'lookup':<34}{'previous us':>13}{'now us':>9}")
+    previous_weather_description, previous_disaster_precautions = previous_lookups()
+    lookups = [
+        ("get_weather_description(61)", lambda: previous_weather_description(61), lambda: get_weather_description(61)),
+        ('get_disaster_precautions("Flood")', lambda: previous_disaster_precautions("Flood"),
+         lambda: get_disaster_precautions("Flood")),
+    ]
+    for label, previous, now in lookups:
+        previous_us = min(timeit.repeat(previous, number=number, repeat=5)) / number * 1e6
+        now_us = min(timeit.repeat(now, number=number, repeat=5)) / number * 1e6
+        print(f"{label:<34}{previous_us:>13.3f}{now_us:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+CPU time per page request with and without the render cache
+
+Starts the stub upstream, warms the weather, forecast and prediction caches
+of every city, then requests /dashboard?city=... for all 20 cities in turn
+through the test client in three modes: every page loaded and rendered
+(RENDER_CACHE=0), data version checked on every request (RENDER_REVALIDATE=0)
+and the default revalidation window. /prediction and /strategies?type=...
+are measured the same way. Reports the process CPU time and wall time per
+request; upstream data is cached in every mode, so the difference is the
+template rendering and, within the window, the data reads.
+
+    python -m benchmarks.render_cache --rounds 20
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stub_upstream import start_stub_server, stub_environ
+
+
+def run_rounds(client, urls, rounds):
+    cpu = []
+    wall = []
+    for _ in range(rounds):
+        for url in urls:
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            response = client.get(url)
+            wall.append(time.perf_counter() - wall_start)
+            cpu.append(time.process_time() - cpu_start)
+            assert response.status_code == 200, f"{url}: {response.status_code}"
+    return cpu, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /dashboard with and without the render cache")
+    parser.add_argument("--rounds", type=int, default=20, help="requests per city")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    os.environ.update(stub_environ(base_url))
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+    from main import app
+    from routes import INDIAN_CITIES, DISASTER_TYPES
+    from utils import render_cache
+
+    pages = [
+        ("/dashboard", [f"/dashboard?city={city}" for city in INDIAN_CITIES]),
+        ("/prediction", ["/prediction"]),
+        ("/strategies", [f"/strategies?type={disaster_type}" for disaster_type in DISASTER_TYPES])
+    ]
+
+    client = app.test_client()
+    # Fill the upstream caches and store predictions before timing anything
+    for _, urls in pages:
+        for url in urls:
+            client.get(url)
+
+    print(f"{args.rounds} rounds over every city or disaster type")
+    modes = [
+        ("off", False, 0),
+        ("revalidate 0", True, 0),
+        (f"revalidate {render_cache.RENDER_REVALIDATE}", True, render_cache.RENDER_REVALIDATE)
+    ]
+    print(f"{'page':<14}{'render cache':<16}{'cpu ms/req':>12}{'p50 ms':>10}{'p99 ms':>10}{'cpu saved':>11}")
+    for page, urls in pages:
+        baseline = None
+        for mode, enabled, revalidate in modes:
+            render_cache.RENDER_CACHE_ENABLED = enabled
+            render_cache.page_cache.default_ttl = revalidate
+            render_cache.page_cache.clear()
+            cpu, wall = run_rounds(client, urls, args.rounds)
+            wall.sort()
+            mean_cpu = statistics.mean(cpu)
+            saved = f"{(1 - mean_cpu / baseline) * 100:.0f}%" if baseline else ""
+            baseline = baseline or mean_cpu
+            print(f"{page:<14}{mode:<16}{mean_cpu * 1000:>12.2f}"
+                  f"{statistics.median(wall) * 1000:>10.2f}{wall[int(len(wall) * 0.99) - 1] * 1000:>10.2f}{saved:>11}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
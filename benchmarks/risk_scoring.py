@@ -0,0 +1,51 @@
+"""
+Time the vectorized risk scoring engine over every city and hazard
+
+Builds Open-Meteo shaped arrays for all cities with the stub upstream's
+payload generator, then times the full pipeline (matrices, features, signals
+and scores) and the scoring step alone.
+
+    python -m benchmarks.risk_scoring --repeat 2000
+"""
+import argparse
+import time
+
+from benchmarks.stub_upstream import open_meteo_location
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the disaster risk scoring engine")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    from utils.risk_scoring import HAZARDS, build_weather_matrices, weather_features, hazard_signals
+    from utils.weather_api import CITY_COORDINATES
+    from utils.disaster_prediction import get_risk_model
+
+    risk_model = get_risk_model()
+    cities = risk_model.cities
+    arrays = {}
+    for city in cities:
+        location = open_meteo_location(*CITY_COORDINATES[city])
+        arrays[city] = {"hourly": location["hourly"], "daily": location["daily"]}
+
+    def full_pipeline():
+        signals = hazard_signals(weather_features(build_weather_matrices(arrays, cities)))
+        risk_model.score(signals, 7)
+
+    signals = hazard_signals(weather_features(build_weather_matrices(arrays, cities)))
+
+    def score_only():
+        risk_model.score(signals, 7)
+
+    print(f"{len(cities)} cities x {len(HAZARDS)} hazards, {args.repeat} runs")
+    for name, run in (("matrices + features + score", full_pipeline), ("score from cached signals", score_only)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            run()
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"{name:<30}{elapsed * 1e6:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
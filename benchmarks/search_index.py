@@ -0,0 +1,84 @@
+"""
+Query latency of the full-text search index on a synthetic corpus
+
+Builds a SearchIndex of the default strategies plus generated disaster
+reports (80-word bodies drawing on common disaster vocabulary and a long
+tail of rare words), then times a mix of common, rare and multi-word
+queries with and without filters.
+
+    python -m benchmarks.search_index --documents 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+COMMON_WORDS = (
+    "flood cyclone rainfall evacuation relief district india earthquake heat wave "
+    "landslide response damage village rescue shelter warning coastal river"
+).split()
+
+QUERIES = [
+    ("flood", {}),
+    ("flood relief", {}),
+    ("evacuation coastal cyclone", {}),
+    ("earthquake", {"disaster_type": "Earthquake"}),
+    ("rescue", {"kind": "disaster"}),
+    ("word1234", {}),
+    ("word17 flood", {}),
+    ("landslide warning village", {"kind": "disaster", "disaster_type": "Landslide"}),
+]
+
+
+def synthetic_documents(count, seed=1):
+    rng = random.Random(seed)
+    rare_words = [f"word{i}" for i in range(20000)]
+    types = ["Flood", "Cyclone", "Drought", "Earthquake", "Landslide", "Heat Wave"]
+    for number in range(count):
+        words = [
+            rng.choice(COMMON_WORDS) if rng.random() < 0.15 else rng.choice(rare_words)
+            for _ in range(80)
+        ]
+        disaster_type = rng.choice(types)
+        yield {
+            "doc_key": f"disaster:{number}",
+            "kind": "disaster",
+            "disaster_type": disaster_type,
+            "title": f"India: {disaster_type} - {2000 + number % 25}",
+            "body": " ".join(words),
+            "source": "ReliefWeb",
+            "url": None,
+            "date": None
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the full-text search index")
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50, help="runs per query")
+    args = parser.parse_args()
+
+    from utils.search_index import SearchIndex, _add_default_strategies
+
+    start = time.perf_counter()
+    index = SearchIndex()
+    _add_default_strategies(index)
+    for document in synthetic_documents(args.documents):
+        index.add(document)
+    print(f"Indexed {len(index)} documents in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'query':<48}{'matches':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    for query, filters in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            total, _ = index.search(query, limit=20, **filters)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        label = query + "".join(f" {key}={value}" for key, value in filters.items())
+        print(f"{label:<48}{total:>9}{statistics.median(timings) * 1000:>9.2f}"
+              f"{timings[int(len(timings) * 0.99) - 1] * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
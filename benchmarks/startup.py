@@ -0,0 +1,209 @@
+"""
+Startup time and worker memory
+
+Part one starts the app in a fresh interpreter --runs times per mode and
+reports the median time to import main (which calls create_app) and to
+serve the first dashboard, against the stub upstream and a scratch database:
+
+- previous: the schema created and upgraded while starting
+  (MIGRATE_ON_STARTUP=1) and numpy, the risk model and the search index
+  loaded before the first request, as every worker used to
+- lazy: the schema left to init-db and those modules loaded on first use
+
+Part two starts gunicorn with --workers sync workers and measures how long
+it takes until every worker is ready to accept requests, the CPU time the
+master and the workers spent booting and their memory once they are ready:
+
+- previous: every worker loads the app, migrates and loads numpy
+- per worker: every worker loads the app (GUNICORN_PRELOAD=0)
+- preloaded: the master loads and warms the app once, then forks
+
+Proportional set size (PSS) splits pages shared between processes among
+them, so the PSS of all processes added up is the memory they take together.
+
+    python -m benchmarks.startup --runs 7 --workers 4
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stub_upstream import start_stub_server, stub_environ
+from benchmarks.live_updates import free_port
+
+REPO = os.getcwd()
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+# Run in a fresh interpreter; prints the seconds to start and to serve the first dashboard
+COLD_START = """
+import os, time
+start = time.perf_counter()
+from main import app
+if os.environ.get("STARTUP_EAGER") == "1":
+    from app import warm_up
+    warm_up()
+started = time.perf_counter()
+response = app.test_client().get("/dashboard?city=Mumbai")
+assert response.status_code == 200, response.status_code
+print(started - start, time.perf_counter() - started)
+"""
+
+# Runs the repository's gunicorn.conf.py, then marks each worker once it is ready
+GUNICORN_CONFIG = """
+exec(open(os.path.join({repo!r}, "gunicorn.conf.py")).read())
+
+def post_worker_init(worker):
+    if os.environ.get("STARTUP_EAGER") == "1":
+        from app import warm_up
+        warm_up()
+    open(os.path.join({markers!r}, str(worker.pid)), "w").close()
+"""
+
+MODES = {
+    "previous": {"MIGRATE_ON_STARTUP": "1", "STARTUP_EAGER": "1", "GUNICORN_PRELOAD": "0"},
+    "per worker": {"MIGRATE_ON_STARTUP": "0", "GUNICORN_PRELOAD": "0"},
+    "preloaded": {"MIGRATE_ON_STARTUP": "0", "GUNICORN_PRELOAD": "1"},
+}
+
+COLD_MODES = ["previous", "lazy"]
+
+
+def cpu_seconds(pid):
+    """
+    User and system CPU time pid has used
+    """
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def memory_mb(pid):
+    """
+    Proportional and private (unique) memory of pid, in MB
+    """
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            name, _, rest = line.partition(":")
+            if rest.strip().endswith("kB"):
+                values[name] = int(rest.split()[0])
+    return values["Pss"] / 1024, (values["Private_Clean"] + values["Private_Dirty"]) / 1024
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as listing:
+        return [int(child) for child in listing.read().split()]
+
+
+def cold_start(environ, mode, db_template, directory):
+    """
+    Seconds to start and to serve the first dashboard, in a fresh interpreter
+    """
+    db_path = os.path.join(directory, "cold.db")
+    if mode == "previous":
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        extra = {"MIGRATE_ON_STARTUP": "1", "STARTUP_EAGER": "1"}
+    else:
+        shutil.copy(db_template, db_path)
+        extra = {"MIGRATE_ON_STARTUP": "0"}
+    output = subprocess.run(
+        [sys.executable, "-c", COLD_START], env=dict(environ, DATABASE_URL=f"sqlite:///{db_path}", **extra),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return [float(value) for value in output.split()]
+
+
+def boot_gunicorn(environ, mode, workers, db_template, directory):
+    """
+    Seconds until every worker is ready, master and worker CPU seconds,
+    total PSS and mean private MB per worker
+    """
+    scratch = tempfile.mkdtemp(dir=directory)
+    markers = os.path.join(scratch, "ready")
+    os.mkdir(markers)
+    config = os.path.join(scratch, "gunicorn.conf.py")
+    with open(config, "w") as handle:
+        handle.write("import os\n" + GUNICORN_CONFIG.format(repo=REPO, markers=markers))
+    db_path = os.path.join(scratch, "boot.db")
+    if mode != "previous":
+        shutil.copy(db_template, db_path)
+
+    start = time.perf_counter()
+    gunicorn = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", config, "-w", str(workers),
+         "-b", f"127.0.0.1:{free_port()}", "--log-level", "warning", "main:app"],
+        env=dict(environ, DATABASE_URL=f"sqlite:///{db_path}", **MODES[mode]),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + 120
+        while len(os.listdir(markers)) < workers:
+            if time.perf_counter() > deadline or gunicorn.poll() is not None:
+                raise RuntimeError(f"gunicorn did not start {workers} workers in {mode} mode")
+            time.sleep(0.005)
+        ready = time.perf_counter() - start
+        # Let the workers settle before reading their counters
+        time.sleep(0.5)
+        worker_pids = children(gunicorn.pid)
+        worker_cpu = sum(cpu_seconds(pid) for pid in worker_pids)
+        memory = [memory_mb(pid) for pid in [gunicorn.pid] + worker_pids]
+        total_pss = sum(pss for pss, _ in memory)
+        private = statistics.mean(private for _, private in memory[1:])
+        return ready, cpu_seconds(gunicorn.pid), worker_cpu, total_pss, private
+    finally:
+        gunicorn.terminate()
+        gunicorn.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure startup time and worker memory")
+    parser.add_argument("--runs", type=int, default=7, help="starts per mode")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    directory = tempfile.mkdtemp()
+    environ = dict(os.environ)
+    environ.update(stub_environ(base_url))
+    environ.update({"PYTHONPATH": REPO, "METRICS_DIR": os.path.join(directory, "metrics"), "LOG_LEVEL": "WARNING"})
+
+    # A database with an up-to-date schema, as left by `flask --app main init-db`
+    db_template = os.path.join(directory, "template.db")
+    subprocess.run(
+        [sys.executable, "-m", "flask", "--app", "main", "init-db"],
+        env=dict(environ, DATABASE_URL=f"sqlite:///{db_template}"), check=True, stdout=subprocess.DEVNULL
+    )
+
+    try:
+        cold = {mode: [] for mode in COLD_MODES}
+        boots = {mode: [] for mode in MODES}
+        for _ in range(args.runs):
+            for mode in COLD_MODES:
+                cold[mode].append(cold_start(environ, mode, db_template, directory))
+            for mode in MODES:
+                boots[mode].append(boot_gunicorn(environ, mode, args.workers, db_template, directory))
+    finally:
+        server.shutdown()
+
+    print(f"Single process, median of {args.runs} starts")
+    print(f"{'mode':<12}{'start ms':>10}{'first dashboard ms':>20}{'total ms':>10}")
+    for mode in COLD_MODES:
+        started, first = (statistics.median(values) for values in zip(*cold[mode]))
+        print(f"{mode:<12}{started * 1000:>10.0f}{first * 1000:>20.0f}{(started + first) * 1000:>10.0f}")
+
+    print(f"\ngunicorn, {args.workers} sync workers on {os.cpu_count()} CPUs, median of {args.runs} starts")
+    print(f"{'mode':<12}{'ready ms':>10}{'master CPU ms':>15}{'worker CPU ms':>15}"
+          f"{'total PSS MB':>14}{'private MB/worker':>19}")
+    for mode in MODES:
+        ready, master_cpu, worker_cpu, total_pss, private = (statistics.median(values) for values in zip(*boots[mode]))
+        print(f"{mode:<12}{ready * 1000:>10.0f}{master_cpu * 1000:>15.0f}{worker_cpu * 1000:>15.0f}"
+              f"{total_pss:>14.1f}{private:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Latency of get_disaster_strategies against a slow ReliefWeb
+
+Starts the stub upstream with the given latency and times, for every
+disaster type, the first request (nothing cached: bounded by
+STRATEGY_FETCH_BUDGET), a request once the background fetch has filled the
+cache, and a request after the entry expired (served stale while it
+reloads). Also times building the default strategy list alone.
+
+    python -m benchmarks.strategies --latency 4 --budget 1.5
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.stub_upstream import start_stub_server, stub_environ
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the government strategy lookup")
+    parser.add_argument("--latency", type=float, default=4.0, help="stub upstream latency in seconds")
+    parser.add_argument("--budget", type=float, default=1.5, help="STRATEGY_FETCH_BUDGET in seconds")
+    parser.add_argument("--repeat", type=int, default=10000)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency)
+    os.environ.update(stub_environ(base_url))
+    os.environ["STRATEGY_FETCH_BUDGET"] = str(args.budget)
+
+    from utils.govt_strategies import DEFAULT_STRATEGIES, get_default_strategies, get_disaster_strategies, strategy_cache
+
+    disaster_types = list(DEFAULT_STRATEGIES)
+    counts = server.RequestHandlerClass.counts
+
+    def timed(disaster_type):
+        start = time.perf_counter()
+        strategies = get_disaster_strategies(disaster_type)
+        return time.perf_counter() - start, len(strategies)
+
+    print(f"{len(disaster_types)} disaster types, ReliefWeb latency {args.latency}s, budget {args.budget}s")
+    print(f"{'request':<12}{'p50 ms':>10}{'max ms':>10}{'strategies':>12}")
+
+    def report(label, results):
+        timings = [timing for timing, _ in results]
+        print(f"{label:<12}{statistics.median(timings) * 1000:>10.2f}{max(timings) * 1000:>10.2f}"
+              f"{statistics.median(size for _, size in results):>12.0f}")
+
+    report("cold", [timed(disaster_type) for disaster_type in disaster_types])
+    time.sleep(args.latency + 0.5)
+    report("cached", [timed(disaster_type) for disaster_type in disaster_types])
+
+    for disaster_type in disaster_types:
+        strategy_cache.set(disaster_type.lower(), strategy_cache.peek(disaster_type.lower())[0], ttl=0)
+    report("stale", [timed(disaster_type) for disaster_type in disaster_types])
+    print(f"ReliefWeb requests: {counts.get('reliefweb', 0)}")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        get_default_strategies("Flood")
+    print(f"get_default_strategies: {(time.perf_counter() - start) / args.repeat * 1e6:.2f} us/call")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
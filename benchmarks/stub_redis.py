@@ -0,0 +1,131 @@
+"""
+Minimal in-memory server speaking the Redis protocol (RESP2)
+
+Implements the commands the redis cache backend uses (GET, SET with EX/PX/NX,
+DEL, SCAN, PING, FLUSHDB, DBSIZE) so it can be exercised without a Redis
+installation:
+
+    python -m benchmarks.stub_redis --port 6390
+    CACHE_BACKEND=redis CACHE_REDIS_URL=redis://127.0.0.1:6390/0 gunicorn main:app
+
+Or call start_stub_redis() to run it in a background thread.
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+
+_store = {}  # key -> (value, expires_at or None)
+_store_lock = threading.Lock()
+
+
+def _live(key, now):
+    entry = _store.get(key)
+    if entry is not None and entry[1] is not None and entry[1] <= now:
+        del _store[key]
+        return None
+    return entry
+
+
+def _encode(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, Exception):
+        return b"-ERR " + str(reply).encode() + b"\r\n"
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
+    if reply == "OK" or reply == "PONG":
+        return b"+" + reply.encode() + b"\r\n"
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+def execute(args):
+    command = args[0].upper()
+    now = time.time()
+    with _store_lock:
+        if command == b"PING":
+            return "PONG"
+        if command == b"GET":
+            entry = _live(args[1], now)
+            return entry[0] if entry is not None else None
+        if command == b"SET":
+            expires_at = None
+            options = [arg.upper() for arg in args[3:]]
+            for i, option in enumerate(options):
+                if option == b"EX":
+                    expires_at = now + int(args[4 + i])
+                elif option == b"PX":
+                    expires_at = now + int(args[4 + i]) / 1000
+            if b"NX" in options and _live(args[1], now) is not None:
+                return None
+            _store[args[1]] = (args[2], expires_at)
+            return "OK"
+        if command == b"DEL":
+            return sum(1 for key in args[1:] if _store.pop(key, None) is not None)
+        if command == b"SCAN":
+            pattern = b"*"
+            for i, arg in enumerate(args):
+                if arg.upper() == b"MATCH":
+                    pattern = args[i + 1]
+            keys = [key for key in list(_store) if _live(key, now) and fnmatch.fnmatchcase(key, pattern)]
+            return [b"0", keys]
+        if command == b"DBSIZE":
+            return sum(1 for key in list(_store) if _live(key, now))
+        if command == b"FLUSHDB":
+            _store.clear()
+            return "OK"
+        if command in (b"CLIENT", b"SELECT"):
+            return "OK"
+    return Exception(f"unknown command '{command.decode()}'")
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.startswith(b"*"):
+                continue
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(_encode(execute(args)))
+
+
+class StubRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_stub_redis(port=0):
+    """
+    Start the stub server in a daemon thread
+
+    Returns:
+        tuple: (server, url) where url is a redis:// URL for CACHE_REDIS_URL
+    """
+    server = StubRedisServer(("127.0.0.1", port), RESPHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"redis://127.0.0.1:{server.server_address[1]}/0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    server = StubRedisServer(("127.0.0.1", args.port), RESPHandler)
+    print(f"Stub Redis listening on redis://127.0.0.1:{args.port}/0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
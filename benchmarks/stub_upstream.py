@@ -0,0 +1,384 @@
+"""
+Local stand-in for the Open-Meteo, ReliefWeb and Hugging Face APIs
+
+Serves canned responses in each upstream's format, with configurable latency
+and error rate, so the app can be exercised without network access. Point the
+app at it with:
+
+    OPEN_METEO_URL=http://127.0.0.1:8900/v1/forecast
+    RELIEFWEB_API_URL=http://127.0.0.1:8900/v1
+    HUGGINGFACE_API_URL=http://127.0.0.1:8900
+
+Run standalone with `python -m benchmarks.stub_upstream --port 8900`, or call
+start_stub_server() to run it in a background thread.
+
+Real payloads can be recorded once and replayed instead of the canned ones:
+
+    python -m benchmarks.stub_upstream --record benchmarks/recordings
+    python -m benchmarks.stub_upstream --replay benchmarks/recordings
+
+In record mode every request is forwarded to the real upstream and its
+response stored under the directory, one file per method, path and query.
+In replay mode a recorded response is served when one matches, otherwise the
+canned one; latency and error rate apply either way. Open-Meteo times in a
+replayed payload are shifted forward so that its current hour is now.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, parse_qsl, urlencode
+
+# Where recording mode forwards each upstream's requests
+REAL_UPSTREAMS = {
+    "open-meteo": "https://api.open-meteo.com",
+    "reliefweb": "https://api.reliefweb.int",
+    "huggingface": "https://api-inference.huggingface.co"
+}
+
+# Request headers passed on to the real upstream when recording
+FORWARDED_HEADERS = ("Authorization", "Content-Type", "Accept")
+
+
+def open_meteo_location(latitude, longitude, now=None):
+    """
+    Build one location's Open-Meteo forecast response
+    """
+    now = (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+    start = now.replace(hour=0)
+    hours = [start + timedelta(hours=i) for i in range(24 * 7)]
+    days = [start + timedelta(days=i) for i in range(7)]
+    seed = int(abs(latitude * 1000 + longitude))
+
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "current_weather": {
+            "time": now.strftime("%Y-%m-%dT%H:%M"),
+            "temperature": 20 + seed % 15,
+            "windspeed": 5 + seed % 20,
+            "winddirection": seed % 360,
+            "weathercode": [0, 2, 3, 61, 95][seed % 5]
+        },
+        "hourly": {
+            "time": [hour.strftime("%Y-%m-%dT%H:%M") for hour in hours],
+            "temperature_2m": [20 + (seed + i) % 15 for i in range(len(hours))],
+            "relativehumidity_2m": [40 + (seed + i) % 50 for i in range(len(hours))],
+            "precipitation": [((seed + i) % 7) * 0.5 for i in range(len(hours))],
+            "windspeed_10m": [5 + (seed + i) % 20 for i in range(len(hours))],
+            "winddirection_10m": [(seed + i * 7) % 360 for i in range(len(hours))],
+            "weathercode": [[0, 2, 3, 61, 95][(seed + i) % 5] for i in range(len(hours))]
+        },
+        "daily": {
+            "time": [day.strftime("%Y-%m-%d") for day in days],
+            "weathercode": [[0, 2, 3, 61, 95][(seed + i) % 5] for i in range(7)],
+            "temperature_2m_max": [30 + (seed + i) % 10 for i in range(7)],
+            "temperature_2m_min": [18 + (seed + i) % 8 for i in range(7)],
+            "precipitation_sum": [((seed + i) % 5) * 3.0 for i in range(7)]
+        }
+    }
+
+
+def open_meteo_response(query):
+    latitudes = [float(v) for v in query.get("latitude", ["0"])[0].split(",")]
+    longitudes = [float(v) for v in query.get("longitude", ["0"])[0].split(",")]
+    locations = [open_meteo_location(lat, lon) for lat, lon in zip(latitudes, longitudes)]
+    return locations if len(locations) > 1 else locations[0]
+
+
+def reliefweb_disasters_response(limit=20):
+    disaster_types = ["Flood", "Tropical Cyclone", "Drought", "Earthquake", "Land Slide", "Heat Wave"]
+    data = []
+    for i in range(limit):
+        disaster_type = disaster_types[i % len(disaster_types)]
+        data.append({
+            "id": str(50000 + i),
+            "fields": {
+                "id": 50000 + i,
+                "name": f"India: {disaster_type} - {2024 - i // 6}",
+                "description": f"{disaster_type} affecting several districts in India.",
+                "status": "past" if i > 2 else "current",
+                "date": {"event": f"{2024 - i // 6}-0{1 + i % 9}-15T00:00:00+00:00"},
+                "type": [{"name": disaster_type}],
+                "url": f"https://reliefweb.int/disaster/stub-{50000 + i}"
+            }
+        })
+    return {"count": len(data), "data": data}
+
+
+def reliefweb_reports_response(limit=10):
+    data = []
+    for i in range(limit):
+        data.append({
+            "id": str(90000 + i),
+            "fields": {
+                "title": f"Response guidelines {i + 1}",
+                "body": "Guidance for state and district authorities on preparedness and response.",
+                "date": {"created": f"2024-0{1 + i % 9}-01T00:00:00+00:00"},
+                "source": [{"name": "NDMA"}],
+                "url": f"https://reliefweb.int/report/stub-{90000 + i}",
+                "file": [{"url": f"https://reliefweb.int/files/stub-{90000 + i}.pdf"}]
+            }
+        })
+    return {"count": len(data), "data": data}
+
+
+def recording_key(method, path):
+    """
+    What identifies a recorded response: the method and the path with its
+    query parameters sorted. POST bodies (uploaded images) are not part of
+    the key, so any image replays the recorded classification.
+    """
+    parts = urlsplit(path)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method} {parts.path}?{query}"
+
+
+def recording_path(directory, upstream, key):
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+    return os.path.join(directory, upstream, f"{digest}.json")
+
+
+def load_recording(directory, upstream, key):
+    """
+    The recorded (status, payload) for key, or None
+    """
+    try:
+        with open(recording_path(directory, upstream, key)) as handle:
+            recording = json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+    payload = recording["body"]
+    if upstream == "open-meteo" and recording["status"] == 200:
+        recorded_hour = datetime.fromisoformat(recording["recorded_at"]).replace(minute=0, second=0)
+        current_hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        hours = int((current_hour - recorded_hour).total_seconds() // 3600)
+        payload = shift_open_meteo_times(payload, hours)
+    return recording["status"], payload
+
+
+def save_recording(directory, upstream, key, status, payload):
+    path = recording_path(directory, upstream, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as handle:
+        json.dump({
+            "key": key,
+            "upstream": upstream,
+            "status": status,
+            "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "body": payload
+        }, handle)
+
+
+def shift_open_meteo_times(payload, hours):
+    """
+    Move every timestamp of an Open-Meteo response forward by whole hours,
+    and its daily dates by the whole days among them
+    """
+    if not hours:
+        return payload
+    if isinstance(payload, list):
+        return [shift_open_meteo_times(location, hours) for location in payload]
+
+    def shift(value, delta, fmt):
+        return (datetime.strptime(value, fmt) + delta).strftime(fmt)
+
+    payload = dict(payload)
+    hour_delta = timedelta(hours=hours)
+    day_delta = timedelta(days=hours // 24)
+    if "current_weather" in payload:
+        current = dict(payload["current_weather"])
+        current["time"] = shift(current["time"], hour_delta, "%Y-%m-%dT%H:%M")
+        payload["current_weather"] = current
+    if "hourly" in payload:
+        payload["hourly"] = dict(payload["hourly"])
+        payload["hourly"]["time"] = [shift(t, hour_delta, "%Y-%m-%dT%H:%M") for t in payload["hourly"]["time"]]
+    if "daily" in payload and day_delta:
+        payload["daily"] = dict(payload["daily"])
+        payload["daily"]["time"] = [shift(t, day_delta, "%Y-%m-%d") for t in payload["daily"]["time"]]
+    return payload
+
+
+CLASSIFIER_RESPONSE = [
+    {"label": "flood", "score": 0.91},
+    {"label": "non_disaster", "score": 0.05},
+    {"label": "fire", "score": 0.04}
+]
+
+CAPTION_RESPONSE = [{"generated_text": "a flooded street with cars partially submerged"}]
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body go out in separate writes; without this, delayed ACKs
+    # add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    # Set per server by make_handler()
+    latency = 0.0
+    error_rate = 0.0
+    bandwidth = 0.0  # Mbit/s for request bodies, 0 for unlimited
+    replay_dir = None
+    record_dir = None
+    counts = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        if parts.path.endswith("/forecast"):
+            self._respond("open-meteo", lambda: open_meteo_response(query))
+        elif parts.path.endswith("/disasters"):
+            limit = int(query.get("limit", ["20"])[0])
+            self._respond("reliefweb", lambda: reliefweb_disasters_response(limit))
+        elif parts.path.endswith("/reports"):
+            limit = int(query.get("limit", ["10"])[0])
+            self._respond("reliefweb", lambda: reliefweb_reports_response(limit))
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        with _counts_lock:
+            self.counts["bytes_received"] = self.counts.get("bytes_received", 0) + length
+        if self.bandwidth:
+            # Simulate the upload time of a client-side link
+            time.sleep(length * 8 / (self.bandwidth * 1e6))
+        if "disaster_types" in self.path:
+            self._respond("huggingface", lambda: CLASSIFIER_RESPONSE, body)
+        elif "captioning" in self.path:
+            self._respond("huggingface", lambda: CAPTION_RESPONSE, body)
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _respond(self, upstream, build, body=None):
+        with _counts_lock:
+            self.counts[upstream] = self.counts.get(upstream, 0) + 1
+        key = recording_key(self.command, self.path)
+        if self.record_dir:
+            status, payload = self._forward(upstream, body)
+            save_recording(self.record_dir, upstream, key, status, payload)
+            self._send(status, payload)
+            return
+
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self._send(503, {"error": "stub upstream error"})
+            return
+
+        recorded = load_recording(self.replay_dir, upstream, key) if self.replay_dir else None
+        if recorded is not None:
+            with _counts_lock:
+                self.counts["replayed"] = self.counts.get("replayed", 0) + 1
+            self._send(*recorded)
+        else:
+            self._send(200, build())
+
+    def _forward(self, upstream, body):
+        """
+        Send the request to the real upstream, returning (status, payload)
+        """
+        import requests
+
+        headers = {name: self.headers[name] for name in FORWARDED_HEADERS if self.headers.get(name)}
+        response = requests.request(
+            self.command, REAL_UPSTREAMS[upstream] + self.path, data=body, headers=headers, timeout=60
+        )
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, {"error": response.text[:1000]}
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_counts_lock = threading.Lock()
+
+
+def make_handler(latency=0.0, error_rate=0.0, bandwidth=0.0, replay_dir=None, record_dir=None):
+    """
+    Build a handler class bound to its own latency, error rate, bandwidth,
+    recordings and counters
+    """
+    return type("BoundStubUpstreamHandler", (StubUpstreamHandler,), {
+        "latency": latency,
+        "error_rate": error_rate,
+        "bandwidth": bandwidth,
+        "replay_dir": replay_dir,
+        "record_dir": record_dir,
+        "counts": {}
+    })
+
+
+def start_stub_server(port=0, latency=0.0, error_rate=0.0, bandwidth=0.0, replay_dir=None, record_dir=None):
+    """
+    Start the stub upstream in a daemon thread
+
+    Returns:
+        tuple: (server, base_url); server.RequestHandlerClass.counts holds
+        per-upstream request counts, the number of replayed responses and
+        the POST body bytes received, and server.shutdown() stops it
+    """
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port), make_handler(latency, error_rate, bandwidth, replay_dir, record_dir)
+    )
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def stub_environ(base_url):
+    """
+    Environment variables that point the app's upstream clients at base_url
+    """
+    return {
+        "OPEN_METEO_URL": f"{base_url}/v1/forecast",
+        "RELIEFWEB_API_URL": f"{base_url}/v1",
+        "HUGGINGFACE_API_URL": base_url
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of responses that are 503s")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="Mbit/s for request bodies, 0 for unlimited")
+    recordings = parser.add_mutually_exclusive_group()
+    recordings.add_argument("--replay", metavar="DIR", help="serve responses recorded in DIR where they match")
+    recordings.add_argument("--record", metavar="DIR", help="forward to the real upstreams and record into DIR")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(
+        args.latency, args.error_rate, args.bandwidth, replay_dir=args.replay, record_dir=args.record
+    ))
+    mode = f"recording into {args.record}" if args.record else f"replaying {args.replay}" if args.replay else "canned"
+    print(f"Stub upstream listening on http://127.0.0.1:{args.port} ({mode})")
+    for name, value in stub_environ(f"http://127.0.0.1:{args.port}").items():
+        print(f"  {name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,592 @@
+"""
+Benchmark suite for every route in routes.py and every public function in
+utils/
+
+Starts the stub upstream with the given latency and error rate, replaying
+recorded payloads when --replay is given (see benchmarks.stub_upstream),
+points the app at it and a scratch database, then times every case: each
+route through the test client, and each public utils function with sample
+arguments. Caches stay warm between iterations, so the numbers are the
+steady state a worker sees; cases marked "uncached" clear the relevant
+cache before each iteration and pay the upstream round trip.
+
+Results, with the commit, environment and settings they were measured
+with, are written as JSON to --output. --compare BASELINE.json prints the
+change against an earlier run and exits with status 1 when a p50 or p99
+regressed by more than --threshold.
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json --compare before.json
+    python -m benchmarks.suite --latency 0.1 --error-rate 0.05 --only routes
+
+A public function that is neither benchmarked nor listed in SKIPPED with a
+reason, and a route without a sample request, are reported as uncovered,
+so the suite keeps up with the code.
+"""
+import argparse
+import importlib
+import inspect
+import json
+import math
+import os
+import pkgutil
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from io import BytesIO
+
+from benchmarks.stub_upstream import start_stub_server, stub_environ
+
+# Public utils functions that are not timed, and why
+SKIPPED = {
+    "utils.cache_backends.configure": "process configuration, called once at startup",
+    "utils.metrics.init_app": "registers hooks, called once at startup",
+    "utils.metrics.start_flusher": "starts a thread, once per process",
+    "utils.logging_setup.configure": "process configuration, called once at startup",
+    "utils.logging_setup.init_app": "registers hooks, called once at startup",
+    "utils.weather_ingest.run_ingestion_loop": "runs until stopped; its work is ingest_weather_observations",
+    "utils.weather_ingest.start_ingestion_thread": "starts a thread running run_ingestion_loop",
+    "utils.image_jobs.submit_images": "queues work for the process pool; timed through POST /api/image-analysis/batch",
+}
+
+# Fewest timed calls per case, however slow it is
+MIN_ITERATIONS = 5
+
+# (name, kind, call, setup, context): setup runs untimed before every
+# iteration; context is "app", "request" or None
+Case = namedtuple("Case", "name kind call setup context", defaults=(None, "app"))
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an ascending list
+    """
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+def sample_image(seed=0):
+    from benchmarks.local_classifier import synthetic_photo
+
+    return synthetic_photo(640, 480, seed)
+
+
+def route_samples(fixtures):
+    """
+    Sample requests per endpoint: (method, url, builder of the request data).
+    Fixture ids in urls are {placeholders}, so case names stay the same
+    between runs.
+    """
+    image = fixtures["image"]
+
+    def upload():
+        return {"file": (BytesIO(image), "photo.jpg"), "location": "Mumbai"}
+
+    def batch_upload():
+        return {"files": [(BytesIO(image), "a.jpg"), (BytesIO(image), "b.jpg")], "location": "Mumbai"}
+
+    return {
+        "index": [("GET", "/", None)],
+        "dashboard": [("GET", "/dashboard?city=Mumbai", None)],
+        "prediction": [("GET", "/prediction", None)],
+        "image_analysis": [("GET", "/image_analysis", None), ("POST", "/image_analysis", upload)],
+        "strategies": [("GET", "/strategies?type=Flood", None)],
+        "api_cities": [("GET", "/api/cities", None)],
+        "api_weather_all": [("GET", "/api/weather/all", None)],
+        "api_weather": [("GET", "/api/weather/Mumbai", None)],
+        "api_weather_history": [("GET", "/api/weather/Mumbai/history?hours=24", None)],
+        "api_forecast": [("GET", "/api/forecast/Mumbai", None)],
+        "api_all_disaster_predictions": [("GET", "/api/disasters/predictions", None)],
+        "api_disaster_predictions": [("GET", "/api/disasters/predictions/Mumbai", None)],
+        "api_historical_disasters": [("GET", "/api/disasters/historical", None)],
+        "api_strategies": [("GET", "/api/strategies/Flood", None)],
+        "api_stream": [("GET", "/api/stream/Mumbai", None)],
+        "api_search": [("GET", "/api/search?q=flood+relief", None)],
+        "api_image_analysis_batch": [("POST", "/api/image-analysis/batch", batch_upload)],
+        "api_image_analysis_batch_status": [("GET", "/api/image-analysis/batch/{batch_id}", None)],
+        "api_image_analysis": [("GET", "/api/image-analysis/{analysis_id}", None)],
+        "api_cache_stats": [("GET", "/api/cache/stats", None)],
+        "metrics": [("GET", "/metrics", None)],
+    }
+
+
+def route_cases(app, fixtures):
+    """
+    One case per sample request, and the endpoints and methods without one
+    """
+    samples = route_samples(fixtures)
+    cases = []
+    uncovered = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == "static":
+            continue
+        endpoint_samples = samples.get(rule.endpoint, [])
+        for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+            if not any(sample[0] == method for sample in endpoint_samples):
+                uncovered.append(f"{method} {rule.rule}")
+
+    local = threading.local()
+
+    def request(method, url, build):
+        def call():
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = app.test_client()
+            response = client.open(url, method=method, data=build() if build else None)
+            response.get_data()
+            response.close()
+            if response.status_code >= 500:
+                raise Exception(f"{method} {url} returned {response.status_code}")
+        return call
+
+    for endpoint_samples in samples.values():
+        for method, url, build in endpoint_samples:
+            cases.append(Case(f"{method} {url}", "route", request(method, url.format(**fixtures), build), context=None))
+    return cases, uncovered
+
+
+def function_cases(app, fixtures):
+    """
+    Cases for the public functions of utils/, with sample arguments
+    """
+    from app import db
+    from models import ImageAnalysis, DisasterRecord
+    from utils import (
+        cache, cache_backends, disaster_prediction, govt_strategies, historical_store, http_cache, http_client,
+        image_analysis, image_cache, image_jobs, image_preprocessing, live_updates, local_classifier, logging_setup,
+        metrics, prediction_store, reference_data, render_cache, risk_scoring, search_index, upstream_fanout,
+        weather_api, weather_ingest
+    )
+
+    image = fixtures["image"]
+    image_hash = image_cache.analysis_key(image)
+    city = "Mumbai"
+    cities = list(weather_api.CITY_COORDINATES)
+    # Compiled next to, rather than over, the file the app has loaded
+    reference_path = os.path.join(tempfile.mkdtemp(), "reference.sqlite")
+
+    with app.app_context():
+        # Unsaved copies, whose attributes never need a session to load
+        stored = db.session.get(ImageAnalysis, fixtures["analysis_id"])
+        analysis_row = ImageAnalysis(**{
+            column.name: getattr(stored, column.name) for column in ImageAnalysis.__table__.columns
+        })
+        disaster_row = DisasterRecord(
+            id=1, disaster_type="Flood", location="Assam", severity=3, date=datetime(2024, 7, 1),
+            description="Flooding across several districts.", source_id=50000, name="India: Floods - Jul 2024",
+            url="https://reliefweb.int/disaster/bench"
+        )
+        arrays = weather_api.get_all_weather_arrays()
+        predictions = prediction_store.get_predictions(city)
+        strategy = {"title": "Flood response guidelines", "body": "Evacuate low-lying areas.",
+                    "url": "https://reliefweb.int/report/bench", "source": "NDMA", "date": "2024-01-01"}
+    matrices = risk_scoring.build_weather_matrices(arrays["cities"], cities)
+    features = risk_scoring.weather_features(matrices)
+    timed_noop = metrics.timed("benchmark")(lambda: None)
+
+    def consume(stream):
+        return b"".join(stream)
+
+    def clear(*caches):
+        def setup():
+            for ttl_cache in caches:
+                ttl_cache.clear()
+        return setup
+
+    function = "function"
+    return [
+        Case("utils.upstream_fanout.gather", function, lambda: upstream_fanout.gather([(len, ())])),
+        Case("utils.upstream_fanout.gather_dashboard_data", function,
+             lambda: upstream_fanout.gather_dashboard_data(city, app)),
+        Case("utils.upstream_fanout.fetch_weather_data", function,
+             lambda: upstream_fanout.fetch_weather_data(city, app)),
+        Case("utils.upstream_fanout.fetch_disaster_predictions", function,
+             lambda: upstream_fanout.fetch_disaster_predictions(city, app)),
+        Case("utils.upstream_fanout.fetch_historical_disasters", function,
+             lambda: upstream_fanout.fetch_historical_disasters(app)),
+        Case("utils.upstream_fanout.fetch_all_disaster_predictions", function,
+             lambda: upstream_fanout.fetch_all_disaster_predictions(reference_data.CITIES, app)),
+        Case("utils.upstream_fanout.gather_prediction_data", function,
+             lambda: upstream_fanout.gather_prediction_data(reference_data.CITIES, app)),
+        Case("utils.cache.get_all_cache_stats", function, cache.get_all_cache_stats),
+        Case("utils.cache_backends.create_backend", function, lambda: cache_backends.create_backend(256)),
+        Case("utils.disaster_prediction.predict_disasters", function,
+             lambda: disaster_prediction.predict_disasters(city)),
+        Case("utils.disaster_prediction.predict_all_disasters", function, disaster_prediction.predict_all_disasters),
+        Case("utils.disaster_prediction.load_weather_inputs", function, disaster_prediction.load_weather_inputs),
+        Case("utils.disaster_prediction.get_prediction_inputs_key", function,
+             lambda: disaster_prediction.get_prediction_inputs_key(None, arrays)),
+        Case("utils.disaster_prediction.score_disasters", function,
+             lambda: disaster_prediction.score_disasters(None, None, arrays)),
+        Case("utils.disaster_prediction.get_risk_model", function, disaster_prediction.get_risk_model),
+        Case("utils.disaster_prediction.build_prediction", function,
+             lambda: disaster_prediction.build_prediction(city, "Flood", 0.6, 3, datetime.now(), datetime.now())),
+        Case("utils.disaster_prediction.get_historical_disasters (uncached)", function,
+             disaster_prediction.get_historical_disasters),
+        Case("utils.disaster_prediction.get_disaster_description", function,
+             lambda: disaster_prediction.get_disaster_description("Flood", 3)),
+        Case("utils.disaster_prediction.get_disaster_precautions", function,
+             lambda: disaster_prediction.get_disaster_precautions("Flood")),
+        Case("utils.govt_strategies.get_disaster_strategies", function,
+             lambda: govt_strategies.get_disaster_strategies("Flood")),
+        Case("utils.govt_strategies.get_versioned_disaster_strategies", function,
+             lambda: govt_strategies.get_versioned_disaster_strategies("Flood")),
+        Case("utils.govt_strategies.get_reliefweb_strategies (uncached)", function,
+             lambda: govt_strategies.get_reliefweb_strategies("Flood")),
+        Case("utils.govt_strategies.get_default_strategies", function,
+             lambda: govt_strategies.get_default_strategies("Flood")),
+        Case("utils.govt_strategies.default_strategies_date", function, govt_strategies.default_strategies_date),
+        Case("utils.govt_strategies.get_default_strategies_by_phase", function,
+             lambda: govt_strategies.get_default_strategies_by_phase("Flood", "response")),
+        Case("utils.historical_store.get_stored_historical_disasters", function,
+             historical_store.get_stored_historical_disasters),
+        Case("utils.historical_store.get_historical_snapshot", function, historical_store.get_historical_snapshot),
+        Case("utils.historical_store.refresh_historical_disasters", function,
+             historical_store.refresh_historical_disasters),
+        Case("utils.http_cache.make_etag", function, lambda: http_cache.make_etag(123.0), context="request"),
+        Case("utils.http_cache.json_response", function,
+             lambda: http_cache.json_response(predictions, prediction_store.predictions_version(predictions), 60),
+             context="request"),
+        Case("utils.http_cache.seconds_until", function, lambda: http_cache.seconds_until(time.time() + 60)),
+        Case("utils.http_client.get_client", function, lambda: http_client.get_client(weather_api.OPEN_METEO_URL)),
+        Case("utils.http_client.get (uncached)", function,
+             lambda: http_client.get(weather_api.OPEN_METEO_URL, params={"latitude": 19.07, "longitude": 72.87,
+                                                                         "current_weather": "true"}).close()),
+        Case("utils.http_client.post (uncached)", function,
+             lambda: http_client.post(image_analysis.DISASTER_MODEL_URL, data=image).close()),
+        Case("utils.http_client.get_upstream_stats", function, http_client.get_upstream_stats),
+        Case("utils.image_analysis.get_classifier_backend", function, image_analysis.get_classifier_backend),
+        Case("utils.image_analysis.get_model_version", function, image_analysis.get_model_version),
+        Case("utils.image_analysis.build_classification", function,
+             lambda: image_analysis.build_classification("flood", 0.9)),
+        Case("utils.image_analysis.analyze_image (uncached)", function, lambda: image_analysis.analyze_image(image)),
+        Case("utils.image_analysis.classify_disaster (uncached)", function,
+             lambda: image_analysis.classify_disaster(image)),
+        Case("utils.image_analysis.generate_image_caption (uncached)", function,
+             lambda: image_analysis.generate_image_caption(image)),
+        Case("utils.image_analysis.infer_disaster_from_caption", function,
+             lambda: image_analysis.infer_disaster_from_caption("a flooded street with cars partially submerged")),
+        Case("utils.image_cache.analysis_key", function, lambda: image_cache.analysis_key(image)),
+        Case("utils.image_cache.get_cached_analysis", function, lambda: image_cache.get_cached_analysis(image_hash)),
+        Case("utils.image_cache.store_analysis", function,
+             lambda: image_cache.store_analysis(image_hash, image_analysis.build_classification("flood", 0.9))),
+        Case("utils.image_cache.analyze_image_cached", function, lambda: image_cache.analyze_image_cached(image)),
+        Case("utils.image_jobs.get_job", function, lambda: image_jobs.get_job(fixtures["analysis_id"])),
+        Case("utils.image_jobs.get_batch", function, lambda: image_jobs.get_batch(fixtures["batch_id"])),
+        Case("utils.image_jobs.analysis_to_dict", function, lambda: image_jobs.analysis_to_dict(analysis_row)),
+        Case("utils.image_jobs.get_queue_stats", function, image_jobs.get_queue_stats),
+        Case("utils.image_jobs.expire_stale_jobs", function, image_jobs.expire_stale_jobs),
+        Case("utils.image_preprocessing.read_upload", function,
+             lambda: image_preprocessing.read_upload(BytesIO(image), 5 * 1024 * 1024)),
+        Case("utils.image_preprocessing.inspect_image", function, lambda: image_preprocessing.inspect_image(image)),
+        Case("utils.image_preprocessing.prepare_for_inference", function,
+             lambda: image_preprocessing.prepare_for_inference(image)),
+        Case("utils.live_updates.holds_streams", function, live_updates.holds_streams),
+        Case("utils.live_updates.subscribe", function, lambda: consume(live_updates.subscribe(app, city))),
+        Case("utils.live_updates.refresh_updates", function, lambda: live_updates.refresh_updates(cities)),
+        Case("utils.local_classifier.preprocess", function, lambda: local_classifier.preprocess(image)),
+        Case("utils.logging_setup.parse_levels", function,
+             lambda: logging_setup.parse_levels("werkzeug=WARNING,utils.http_client=DEBUG")),
+        Case("utils.metrics.timed", function, timed_noop),
+        Case("utils.metrics.snapshot", function, metrics.snapshot),
+        Case("utils.metrics.flush", function, metrics.flush),
+        Case("utils.metrics.render_metrics", function, metrics.render_metrics),
+        Case("utils.prediction_store.get_predictions", function, lambda: prediction_store.get_predictions(city)),
+        Case("utils.prediction_store.get_all_predictions", function, prediction_store.get_all_predictions),
+        Case("utils.prediction_store.refresh_predictions", function, prediction_store.refresh_predictions),
+        Case("utils.prediction_store.predictions_version", function,
+             lambda: prediction_store.predictions_version(predictions)),
+        Case("utils.reference_data.compile_reference", function,
+             lambda: reference_data.compile_reference(path=reference_path)),
+        Case("utils.render_cache.render_cached", function,
+             lambda: render_cache.render_cached(
+                 "benchmark", "Flood", "strategies.html",
+                 lambda: (1, {"disaster_types": ["Flood"], "selected_type": "Flood",
+                              "strategies": govt_strategies.get_default_strategies("Flood")})
+             ),
+             context="request"),
+        Case("utils.risk_scoring.build_weather_matrices", function,
+             lambda: risk_scoring.build_weather_matrices(arrays["cities"], cities)),
+        Case("utils.risk_scoring.weather_features", function, lambda: risk_scoring.weather_features(matrices)),
+        Case("utils.risk_scoring.hazard_signals", function, lambda: risk_scoring.hazard_signals(features)),
+        Case("utils.search_index.build_index", function, search_index.build_index),
+        Case("utils.search_index.tokenize", function,
+             lambda: search_index.tokenize(strategy["title"] + " " + strategy["body"])),
+        Case("utils.search_index.store_documents", function,
+             lambda: search_index.store_documents([search_index.guideline_document("Flood", strategy)])),
+        Case("utils.search_index.disaster_document", function,
+             lambda: search_index.disaster_document(disaster_row)),
+        Case("utils.search_index.guideline_document", function,
+             lambda: search_index.guideline_document("Flood", strategy)),
+        Case("utils.search_index.search_documents", function, lambda: search_index.search_documents("flood relief")),
+        Case("utils.weather_api.get_weather_data", function, lambda: weather_api.get_weather_data(city)),
+        Case("utils.weather_api.get_weather_data (uncached)", function, lambda: weather_api.get_weather_data(city),
+             setup=clear(weather_api.weather_cache)),
+        Case("utils.weather_api.get_forecast_data", function, lambda: weather_api.get_forecast_data(city)),
+        Case("utils.weather_api.get_versioned_forecast_data", function,
+             lambda: weather_api.get_versioned_forecast_data(city)),
+        Case("utils.weather_api.get_versioned_forecast_data (uncached)", function,
+             lambda: weather_api.get_versioned_forecast_data(city), setup=clear(weather_api.forecast_cache)),
+        Case("utils.weather_api.get_all_weather_data", function, weather_api.get_all_weather_data),
+        Case("utils.weather_api.get_all_weather_arrays", function, weather_api.get_all_weather_arrays),
+        Case("utils.weather_api.get_cached_weather_arrays", function, weather_api.get_cached_weather_arrays),
+        Case("utils.weather_api.get_all_weather_arrays (uncached)", function, weather_api.get_all_weather_arrays,
+             setup=clear(weather_api.batch_cache)),
+        Case("utils.weather_api.get_hourly_observations (uncached)", function, weather_api.get_hourly_observations),
+        Case("utils.weather_api.cache_ttl", function, lambda: weather_api.cache_ttl(weather_api.WEATHER_CACHE_TTL)),
+        Case("utils.weather_api.get_cache_stats", function, weather_api.get_cache_stats),
+        Case("utils.weather_api.get_weather_description", function, lambda: weather_api.get_weather_description(61)),
+        Case("utils.weather_ingest.ingest_weather_observations", function,
+             weather_ingest.ingest_weather_observations),
+        Case("utils.weather_ingest.get_stored_weather", function, lambda: weather_ingest.get_stored_weather(city)),
+        Case("utils.weather_ingest.get_current_weather", function, lambda: weather_ingest.get_current_weather(city)),
+        Case("utils.weather_ingest.get_weather_history", function,
+             lambda: weather_ingest.get_weather_history(city, 24)),
+    ]
+
+
+def public_functions():
+    """
+    Qualified names of the functions defined in utils/ without a leading
+    underscore
+    """
+    import utils
+
+    names = []
+    for module_info in pkgutil.iter_modules(utils.__path__):
+        module = importlib.import_module(f"utils.{module_info.name}")
+        for name, member in inspect.getmembers(module, inspect.isfunction):
+            if not name.startswith("_") and member.__module__ == module.__name__:
+                names.append(f"{module.__name__}.{name}")
+    return sorted(names)
+
+
+def run_case(app, case, iterations, max_seconds, concurrency):
+    """
+    Time one case; returns its result dict
+    """
+    def contexts():
+        if case.context == "request":
+            return app.test_request_context("/benchmark")
+        if case.context == "app":
+            return app.app_context()
+        return _NullContext()
+
+    def loop(timings, errors, deadline, count):
+        with contexts():
+            while len(timings) < count and time.perf_counter() < deadline or len(timings) < min(MIN_ITERATIONS, count):
+                if case.setup is not None:
+                    case.setup()
+                start = time.perf_counter()
+                try:
+                    case.call()
+                except Exception as e:
+                    errors.append(str(e))
+                finally:
+                    timings.append(time.perf_counter() - start)
+                    if case.context is not None:
+                        _discard_session()
+
+    # One untimed call so first-use costs (imports, cold caches) are excluded
+    loop([], [], 0, 1)
+
+    threads = concurrency if case.kind == "route" else 1
+    timings_per_thread = [[] for _ in range(threads)]
+    errors = []
+    deadline = time.perf_counter() + max_seconds
+    started = time.perf_counter()
+    workers = [
+        threading.Thread(target=loop, args=(timings, errors, deadline, iterations // threads or 1))
+        for timings in timings_per_thread
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    timings = sorted(timing for thread_timings in timings_per_thread for timing in thread_timings)
+    return {
+        "name": case.name,
+        "kind": case.kind,
+        "iterations": len(timings),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_per_s": round(len(timings) / elapsed, 2),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 4),
+        "p50_ms": round(percentile(timings, 0.5) * 1000, 4),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 4),
+        "max_ms": round(timings[-1] * 1000, 4)
+    }
+
+
+class _NullContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def _discard_session():
+    # Keep cases from leaving a transaction open for the next one
+    from app import db
+    db.session.remove()
+
+
+def create_fixtures(app, image):
+    """
+    Store one uploaded batch, for the routes and functions that read jobs
+    """
+    client = app.test_client()
+    response = client.post("/api/image-analysis/batch", data={
+        "files": [(BytesIO(image), "fixture.jpg")], "location": "Mumbai"
+    })
+    body = response.get_json()
+    if response.status_code != 202:
+        raise Exception(f"Could not create the image batch fixture: {body}")
+    return {"image": image, "batch_id": body["batch_id"], "analysis_id": body["jobs"][0]["id"]}
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def compare(results, baseline_path, threshold, min_delta_ms):
+    """
+    Print the change of every case against a baseline run; returns the
+    names of the cases that regressed
+    """
+    with open(baseline_path) as handle:
+        baseline = {result["name"]: result for result in json.load(handle)["results"]}
+
+    regressions = []
+    print(f"\n{'case':<64}{'p50 ms':>24}{'p99 ms':>24}")
+    for result in results:
+        before = baseline.get(result["name"])
+        if before is None:
+            print(f"{result['name'][:63]:<64}{'new':>24}")
+            continue
+        cells = []
+        regressed = False
+        for field in ("p50_ms", "p99_ms"):
+            old, new = before[field], result[field]
+            change = (new - old) / old * 100 if old else 0.0
+            cells.append(f"{old:.2f} -> {new:.2f} {change:+.0f}%")
+            if new > old * (1 + threshold) and new - old > min_delta_ms:
+                regressed = True
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{result['name'][:63]:<64}{cells[0]:>24}{cells[1]:>24}{marker}")
+        if regressed:
+            regressions.append(result["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every route and public utils function")
+    parser.add_argument("--iterations", type=int, default=200, help="most timed calls per case")
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="time budget per case")
+    parser.add_argument("--concurrency", type=int, default=1, help="client threads for route cases")
+    parser.add_argument("--latency", type=float, default=0.0, help="stub upstream latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream responses that are 503s")
+    parser.add_argument("--replay", metavar="DIR", help="replay upstream payloads recorded in DIR")
+    parser.add_argument("--only", choices=("routes", "functions"))
+    parser.add_argument("--filter", default="", help="only cases whose name contains this")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="smaller slowdowns are noise")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency, error_rate=args.error_rate, replay_dir=args.replay)
+    os.environ.update(stub_environ(base_url))
+    scratch = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{scratch}/benchmark.db"
+    os.environ["METRICS_DIR"] = os.path.join(scratch, "metrics")
+    os.environ["CACHE_SQLITE_PATH"] = os.path.join(scratch, "cache.db")
+
+    import logging
+    from main import app
+    from app import warm_up
+    logging.disable(logging.INFO)
+    # As gunicorn's master does before forking, so cases see a worker's steady state
+    warm_up()
+
+    fixtures = create_fixtures(app, sample_image())
+    cases = []
+    uncovered = []
+    if args.only != "functions":
+        route_case_list, uncovered_routes = route_cases(app, fixtures)
+        cases.extend(route_case_list)
+        uncovered.extend(uncovered_routes)
+    if args.only != "routes":
+        function_case_list = function_cases(app, fixtures)
+        cases.extend(function_case_list)
+        timed_functions = {case.name.split(" ")[0] for case in function_case_list}
+        uncovered.extend(
+            name for name in public_functions()
+            if name not in timed_functions and name not in SKIPPED
+        )
+    cases = [case for case in cases if args.filter in case.name]
+
+    print(f"{len(cases)} cases, stub latency {args.latency * 1000:.0f} ms, error rate {args.error_rate:.0%}"
+          f"{', replaying ' + args.replay if args.replay else ''}")
+    print(f"{'case':<64}{'p50 ms':>10}{'p99 ms':>10}{'ops/s':>11}{'errors':>8}")
+    results = []
+    for case in cases:
+        result = run_case(app, case, args.iterations, args.max_seconds, args.concurrency)
+        results.append(result)
+        print(f"{case.name[:63]:<64}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+              f"{result['throughput_per_s']:>11.1f}{result['errors']:>8}")
+
+    for name in uncovered:
+        print(f"uncovered: {name}")
+    counts = server.RequestHandlerClass.counts
+    server.shutdown()
+
+    if args.output:
+        report = {
+            "suite_version": 1,
+            "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count()
+            },
+            "settings": {
+                "iterations": args.iterations,
+                "max_seconds": args.max_seconds,
+                "concurrency": args.concurrency,
+                "latency": args.latency,
+                "error_rate": args.error_rate,
+                "replay": args.replay
+            },
+            "upstream_requests": counts,
+            "skipped": SKIPPED,
+            "uncovered": uncovered,
+            "results": results
+        }
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} cases regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import click
+from app import app
+
+@app.cli.command("init-db")
+def init_db_command():
+    """
+    Create the database tables and add any columns and indexes they are missing
+    """
+    from schema import init_db
+    
+    init_db()
+    click.echo("Database schema is up to date")
+
+@app.cli.command("compile-reference")
+def compile_reference_command():
+    """
+    Compile data/reference.json into the SQLite file the app reads at startup
+    """
+    from utils.reference_data import compile_reference, REFERENCE_DATA_PATH
+    
+    version = compile_reference()
+    click.echo(f"Compiled reference data {version} to {REFERENCE_DATA_PATH}; restart the app to load it")
+
+@app.cli.command("ingest-weather")
+@click.option("--loop", is_flag=True, help="Keep ingesting every --interval seconds")
+@click.option("--interval", type=int, default=None, help="Seconds between runs with --loop  [default: WEATHER_INGEST_INTERVAL or 900]")
+@click.option("--past-days", default=1, show_default=True, help="Days of hourly history to fetch")
+def ingest_weather(loop, interval, past_days):
+    """
+    Fetch hourly observations for all cities and store them in WeatherData,
+    then refresh the disaster predictions computed from older weather
+    """
+    from utils.weather_ingest import ingest_weather_observations, run_ingestion_loop, INGEST_INTERVAL
+    from utils.prediction_store import refresh_predictions
+    
+    if loop:
+        from utils.metrics import start_flusher
+        
+        interval = interval or INGEST_INTERVAL
+        click.echo(f"Ingesting weather observations every {interval} seconds")
+        start_flusher()
+        run_ingestion_loop(app, interval)
+    else:
+        count = ingest_weather_observations(past_days=past_days)
+        click.echo(f"Stored {count} hourly weather observations")
+        click.echo(f"Stored {refresh_predictions()} updated disaster predictions")
+
+@app.cli.command("reindex-search")
+def reindex_search():
+    """
+    Store every DisasterRecord in the search index, e.g. after upgrading
+    """
+    from app import db
+    from models import DisasterRecord
+    from utils.search_index import store_documents, disaster_document
+    
+    documents = [disaster_document(record) for record in DisasterRecord.query.all()]
+    store_documents(documents)
+    db.session.commit()
+    click.echo(f"Indexed {len(documents)} historical disaster records")
+
+@app.cli.command("expire-image-jobs")
+def expire_image_jobs():
+    """
+    Mark image analysis jobs queued for longer than IMAGE_JOB_DEADLINE as failed
+    """
+    from utils.image_jobs import expire_stale_jobs
+    
+    count = expire_stale_jobs()
+    click.echo(f"Marked {count} stale image analysis jobs as failed")
@@ -0,0 +1,43 @@
+"""
+gunicorn settings, read from the working directory by default
+
+The app is loaded once in the master, which then imports the modules
+requests otherwise load on first use and builds their read-only tables, so
+workers forked from it start at once and share those pages copy-on-write.
+Run `flask --app main init-db` before starting gunicorn; the master does
+not create or upgrade the schema unless MIGRATE_ON_STARTUP=1.
+
+Set GUNICORN_PRELOAD=0 to load the app in every worker instead. --reload
+always does, since a preloaded master would keep serving the old code.
+"""
+import gc
+import os
+import sys
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0" and "--reload" not in sys.argv
+
+
+def when_ready(server):
+    """
+    Warm the preloaded app in the master, before any worker is forked
+    """
+    if not server.cfg.preload_app:
+        return
+    from app import warm_up
+    warm_up()
+    # Keep the garbage collector from writing to the master's objects in
+    # every worker, which would copy the pages they share
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """
+    Drop database connections a preloaded master opened, so no worker
+    shares a socket with another
+    """
+    if not server.cfg.preload_app:
+        return
+    from app import app, db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -9,6 +9,13 @@ class WeatherData(db.Model):
     wind_speed = db.Column(db.Float, nullable=False)
     precipitation = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    wind_direction = db.Column(db.Float, nullable=True)
+    weathercode = db.Column(db.Integer, nullable=True)
+    
+    # One row per city per hour; also the conflict target for ingestion upserts
+    __table_args__ = (
+        db.Index('ix_weather_data_location_timestamp', 'location', 'timestamp', unique=True),
+    )
     
     def __repr__(self):
         return f'<WeatherData {self.location} at {self.timestamp}>'
@@ -17,10 +24,23 @@ class DisasterRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     disaster_type = db.Column(db.String(50), nullable=False)
     location = db.Column(db.String(100), nullable=False)
-    severity = db.Column(db.Integer, nullable=False)  # Scale 1-5
+    severity = db.Column(db.Integer, nullable=False)  # Scale 1-5, 0 if unrated
     date = db.Column(db.DateTime, nullable=False)
     casualties = db.Column(db.Integer, nullable=True)
     description = db.Column(db.Text, nullable=True)
+    # ReliefWeb fields, set for records imported by utils.historical_store
+    source_id = db.Column(db.Integer, nullable=True)
+    name = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(50), nullable=True)
+    url = db.Column(db.String(255), nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_disaster_record_location_type_date', 'location', 'disaster_type', 'date'),
+        db.Index('ix_disaster_record_date', 'date'),
+        # A ReliefWeb disaster is stored at most once
+        db.Index('ix_disaster_record_source_id', 'source_id', unique=True),
+    )
     
     def __repr__(self):
         return f'<DisasterRecord {self.disaster_type} at {self.location}>'
@@ -33,6 +53,14 @@ class DisasterPrediction(db.Model):
     predicted_severity = db.Column(db.Integer, nullable=False)  # Scale 1-5
     prediction_date = db.Column(db.DateTime, default=datetime.utcnow)
     valid_until = db.Column(db.DateTime, nullable=False)
+    # Identifies the inputs the prediction was computed from
+    inputs_key = db.Column(db.String(255), nullable=True)
+    
+    __table_args__ = (
+        # One current prediction per city and disaster type; also serves the
+        # reads by city, which filter valid_until over a handful of rows
+        db.Index('ix_disaster_prediction_location_type', 'location', 'disaster_type', unique=True),
+    )
     
     def __repr__(self):
         return f'<DisasterPrediction {self.disaster_type} at {self.location}>'
@@ -45,6 +73,52 @@ class ImageAnalysis(db.Model):
     analysis_result = db.Column(db.Text, nullable=True)
     disaster_type = db.Column(db.String(50), nullable=True)
     confidence_score = db.Column(db.Float, nullable=True)
+    # utils.image_cache.analysis_key of the upload, linking it to its cached result
+    content_hash = db.Column(db.String(64), nullable=True)
+    # Set for images uploaded in a batch and analyzed by utils.image_jobs
+    batch_id = db.Column(db.String(32), nullable=True)
+    status = db.Column(db.String(20), nullable=True)  # queued, done or failed
+    
+    __table_args__ = (
+        db.Index('ix_image_analysis_upload_date', 'upload_date'),
+        db.Index('ix_image_analysis_content_hash', 'content_hash'),
+        db.Index('ix_image_analysis_batch_id', 'batch_id'),
+    )
     
     def __repr__(self):
         return f'<ImageAnalysis {self.filename}>'
+
+class ImageAnalysisCache(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)  # utils.image_cache.analysis_key
+    result = db.Column(db.Text, nullable=False)  # analyze_image result as JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # One cached result per distinct image
+        db.Index('ix_image_analysis_cache_content_hash', 'content_hash', unique=True),
+    )
+    
+    def __repr__(self):
+        return f'<ImageAnalysisCache {self.content_hash[:12]}>'
+
+class SearchDocument(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    doc_key = db.Column(db.String(255), nullable=False)  # e.g. "disaster:52341", "guideline:<url>"
+    kind = db.Column(db.String(20), nullable=False)  # disaster, guideline
+    disaster_type = db.Column(db.String(50), nullable=True)
+    title = db.Column(db.Text, nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    source = db.Column(db.String(255), nullable=True)
+    url = db.Column(db.String(255), nullable=True)
+    date = db.Column(db.String(32), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_search_document_doc_key', 'doc_key', unique=True),
+        # Workers sync their search index from rows updated since their last sync
+        db.Index('ix_search_document_updated_at', 'updated_at'),
+    )
+    
+    def __repr__(self):
+        return f'<SearchDocument {self.doc_key}>'
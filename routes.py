@@ -1,31 +1,38 @@
 import os
-from flask import render_template, request, jsonify, redirect, url_for, flash, session
+from datetime import datetime
+from flask import render_template, request, jsonify, redirect, url_for, flash, session, Response
 from werkzeug.utils import secure_filename
+from sqlalchemy import or_
 import logging
 from app import app, db
 from models import WeatherData, DisasterRecord, DisasterPrediction, ImageAnalysis
-from utils.weather_api import get_weather_data, get_forecast_data
-from utils.disaster_prediction import predict_disasters, get_historical_disasters
-from utils.image_analysis import analyze_image
-from utils.govt_strategies import get_disaster_strategies
+from utils.weather_api import get_all_weather_data, get_versioned_forecast_data, cache_ttl, WEATHER_CACHE_TTL
+from utils.cache import get_all_cache_stats
+from utils.metrics import render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.prediction_store import get_predictions, get_all_predictions, predictions_version
+from utils.live_updates import subscribe as subscribe_live_updates, TooManySubscribersError
+from utils.image_cache import analyze_image_cached
+from utils.image_preprocessing import read_upload, inspect_image, InvalidImageError
+from utils.image_jobs import submit_images, get_job, get_batch, QueueFullError, STATUS_DONE, STATUS_QUEUED
+from utils.govt_strategies import get_versioned_disaster_strategies, default_strategies_date
+from utils.historical_store import get_historical_snapshot, HISTORICAL_FRESH_TTL
+from utils.http_cache import json_response, seconds_until
+from utils.render_cache import render_cached
+from utils.weather_ingest import get_current_weather, get_weather_history
+from utils.upstream_fanout import gather_dashboard_data, gather_prediction_data
+from utils.reference_data import CITIES, CITY_COORDINATES, DISASTER_TYPES, DIGEST as REFERENCE_DIGEST
 
 logger = logging.getLogger(__name__)
 
-# List of major Indian cities
-INDIAN_CITIES = [
-    "Mumbai", "Delhi", "Bangalore", "Hyderabad", "Chennai", 
-    "Kolkata", "Pune", "Ahmedabad", "Jaipur", "Surat",
-    "Lucknow", "Kanpur", "Nagpur", "Indore", "Thane", 
-    "Bhopal", "Visakhapatnam", "Patna", "Vadodara", "Ghaziabad"
-]
-
-DISASTER_TYPES = [
-    "Flood", "Cyclone", "Drought", "Earthquake", "Landslide",
-    "Tsunami", "Heat Wave", "Cold Wave", "Urban Flooding", "Forest Fire"
-]
+# Supported Indian cities, in the order of data/reference.json
+INDIAN_CITIES = CITIES
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
+# Per-image limit matches MAX_CONTENT_LENGTH; a batch request may carry many
+MAX_IMAGE_SIZE = 5 * 1024 * 1024
+MAX_BATCH_IMAGES = int(os.environ.get("IMAGE_BATCH_MAX_IMAGES", "50"))
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -38,27 +45,39 @@ def index():
 def dashboard():
     # Get the selected city (default: Mumbai)
     selected_city = request.args.get('city', 'Mumbai')
-    
-    # Get weather data for the selected city
+    return render_cached(
+        'dashboard', selected_city, 'dashboard.html', lambda: _load_dashboard(selected_city),
+        store=selected_city in CITY_COORDINATES
+    )
+
+def _load_dashboard(selected_city):
+    # Fetch weather, forecast and disaster predictions concurrently
     try:
-        weather_data = get_weather_data(selected_city)
-        forecast_data = get_forecast_data(selected_city)
+        weather_data, forecast_data, disaster_predictions = gather_dashboard_data(selected_city, app)
     except Exception as e:
-        logger.error(f"Error fetching weather data: {str(e)}")
+        weather_data = forecast_data = disaster_predictions = e
+    
+    # Get weather data for the selected city
+    weather_error = next((r for r in (weather_data, forecast_data) if isinstance(r, Exception)), None)
+    if weather_error is not None:
+        logger.error("Error fetching weather data: %s", weather_error)
         weather_data = None
         forecast_data = None
-        flash(f"Could not fetch weather data: {str(e)}", "danger")
+        flash(f"Could not fetch weather data: {str(weather_error)}", "danger")
     
     # Get disaster predictions for the selected city
-    try:
-        disaster_predictions = predict_disasters(selected_city)
-    except Exception as e:
-        logger.error(f"Error fetching disaster predictions: {str(e)}")
+    if isinstance(disaster_predictions, Exception):
+        logger.error("Error fetching disaster predictions: %s", disaster_predictions)
+        flash(f"Could not fetch disaster predictions: {str(disaster_predictions)}", "danger")
         disaster_predictions = []
-        flash(f"Could not fetch disaster predictions: {str(e)}", "danger")
     
-    return render_template(
-        'dashboard.html',
+    # Weather and forecast are small enough to serve as their own version
+    version = (
+        tuple(weather_data.items()) if weather_data else None,
+        forecast_data,
+        predictions_version(disaster_predictions)
+    )
+    return version, dict(
         cities=INDIAN_CITIES,
         selected_city=selected_city,
         weather_data=weather_data,
@@ -68,27 +87,34 @@ def dashboard():
 
 @app.route('/prediction')
 def prediction():
-    # Get historical disaster data for India
+    return render_cached('prediction', None, 'prediction.html', _load_prediction)
+
+def _load_prediction():
+    # Fetch historical disasters and predictions for all cities concurrently
     try:
-        historical_disasters = get_historical_disasters()
+        historical, predictions_by_city = gather_prediction_data(INDIAN_CITIES, app)
     except Exception as e:
-        logger.error(f"Error fetching historical disaster data: {str(e)}")
-        historical_disasters = []
-        flash(f"Could not fetch historical disaster data: {str(e)}", "danger")
+        historical = predictions_by_city = e
+    
+    # Get historical disaster data for India
+    if isinstance(historical, Exception):
+        logger.error("Error fetching historical disaster data: %s", historical)
+        flash(f"Could not fetch historical disaster data: {str(historical)}", "danger")
+        historical = ([], None)
+    historical_disasters, historical_version = historical
     
     # Get current disaster predictions for all cities
-    try:
+    if isinstance(predictions_by_city, Exception):
+        logger.error("Error fetching disaster predictions: %s", predictions_by_city)
+        flash(f"Could not fetch disaster predictions: {str(predictions_by_city)}", "danger")
+        all_predictions, prediction_versions = [], None
+    else:
         all_predictions = []
         for city in INDIAN_CITIES:
-            city_predictions = predict_disasters(city)
-            all_predictions.extend(city_predictions)
-    except Exception as e:
-        logger.error(f"Error fetching disaster predictions: {str(e)}")
-        all_predictions = []
-        flash(f"Could not fetch disaster predictions: {str(e)}", "danger")
+            all_predictions.extend(predictions_by_city[city])
+        prediction_versions = [predictions_version(predictions_by_city[city]) for city in INDIAN_CITIES]
     
-    return render_template(
-        'prediction.html',
+    return (historical_version, prediction_versions), dict(
         cities=INDIAN_CITIES,
         disaster_types=DISASTER_TYPES,
         historical_disasters=historical_disasters,
@@ -119,11 +145,12 @@ def image_analysis():
                 # Process the uploaded image
                 filename = secure_filename(file.filename)
                 
-                # Get the file content
-                file_content = file.read()
+                # Read the upload and check its header before any analysis
+                file_content = read_upload(file.stream, MAX_IMAGE_SIZE)
+                inspect_image(file_content)
                 
-                # Analyze the image
-                analysis_result = analyze_image(file_content)
+                # Analyze the image; identical re-uploads reuse the stored result
+                analysis_result, image_hash, cached = analyze_image_cached(file_content)
                 
                 # Save analysis result to database
                 new_analysis = ImageAnalysis(
@@ -131,21 +158,33 @@ def image_analysis():
                     location=location,
                     analysis_result=analysis_result.get('description', ''),
                     disaster_type=analysis_result.get('disaster_type', ''),
-                    confidence_score=analysis_result.get('confidence', 0.0)
+                    confidence_score=analysis_result.get('confidence', 0.0),
+                    content_hash=image_hash
                 )
                 db.session.add(new_analysis)
                 db.session.commit()
                 
-                flash('Image analyzed successfully!', 'success')
+                if cached:
+                    flash('This image was analyzed before; showing the earlier result.', 'info')
+                else:
+                    flash('Image analyzed successfully!', 'success')
                 
+            except InvalidImageError as e:
+                flash(f'Invalid image: {str(e)}', 'danger')
             except Exception as e:
-                logger.error(f"Error analyzing image: {str(e)}")
+                logger.error("Error analyzing image: %s", e)
                 flash(f'Error analyzing image: {str(e)}', 'danger')
         else:
             flash('File type not allowed. Please upload JPG, JPEG or PNG files only.', 'danger')
     
-    # Get recent analyses from database
-    recent_analyses = ImageAnalysis.query.order_by(ImageAnalysis.upload_date.desc()).limit(5).all()
+    # Get recent completed analyses from database; single uploads have no status
+    recent_analyses = (
+        ImageAnalysis.query
+        .filter(or_(ImageAnalysis.status.is_(None), ImageAnalysis.status == STATUS_DONE))
+        .order_by(ImageAnalysis.upload_date.desc())
+        .limit(5)
+        .all()
+    )
     
     return render_template(
         'image_analysis.html',
@@ -159,65 +198,225 @@ def image_analysis():
 def strategies():
     # Get disaster type from query parameters (default: Flood)
     disaster_type = request.args.get('type', 'Flood')
-    
+    return render_cached(
+        'strategies', disaster_type, 'strategies.html', lambda: _load_strategies(disaster_type),
+        store=disaster_type in DISASTER_TYPES
+    )
+
+def _load_strategies(disaster_type):
     try:
         # Get government strategies for the selected disaster type
-        strategies = get_disaster_strategies(disaster_type)
+        strategies, expires_at = get_versioned_disaster_strategies(disaster_type)
     except Exception as e:
-        logger.error(f"Error fetching government strategies: {str(e)}")
-        strategies = []
+        logger.error("Error fetching government strategies: %s", e)
+        strategies, expires_at = [], None
         flash(f"Could not fetch government strategies: {str(e)}", "danger")
     
-    return render_template(
-        'strategies.html',
+    return (default_strategies_date(), expires_at), dict(
         disaster_types=DISASTER_TYPES,
         selected_type=disaster_type,
         strategies=strategies
     )
 
+@app.route('/api/cities')
+def api_cities():
+    # Changes only with the reference data, which a restart reloads
+    return json_response(dict(CITY_COORDINATES), version=REFERENCE_DIGEST, max_age=60 * 60)
+
+@app.route('/api/weather/all')
+def api_weather_all():
+    try:
+        all_weather_data = get_all_weather_data()
+        return jsonify(all_weather_data)
+    except Exception as e:
+        logger.error("API Error fetching weather data for all cities: %s", e)
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/weather/<city>')
 def api_weather(city):
     try:
-        weather_data = get_weather_data(city)
-        return jsonify(weather_data)
+        weather_data = get_current_weather(city)
+        # The payload is a handful of values, so it serves as its own version;
+        # its time is the GMT time of the observation
+        observed_at = datetime.strptime(weather_data["time"], "%Y-%m-%dT%H:%M") if weather_data.get("time") else None
+        return json_response(
+            weather_data,
+            version=tuple(weather_data.items()),
+            max_age=cache_ttl(WEATHER_CACHE_TTL),
+            last_modified=observed_at
+        )
     except Exception as e:
-        logger.error(f"API Error fetching weather data: {str(e)}")
+        logger.error("API Error fetching weather data: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/weather/<city>/history')
+def api_weather_history(city):
+    try:
+        hours = request.args.get('hours', 24, type=int)
+        history = get_weather_history(city, hours)
+        return jsonify(history)
+    except Exception as e:
+        logger.error("API Error fetching weather history: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/forecast/<city>')
 def api_forecast(city):
     try:
-        forecast_data = get_forecast_data(city)
-        return jsonify(forecast_data)
+        forecast_data, expires_at = get_versioned_forecast_data(city)
+        return json_response(forecast_data, version=expires_at, max_age=seconds_until(expires_at))
+    except Exception as e:
+        logger.error("API Error fetching forecast data: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/disasters/predictions')
+def api_all_disaster_predictions():
+    try:
+        predictions = get_all_predictions(INDIAN_CITIES)
+        return json_response(
+            predictions,
+            version=[predictions_version(city_predictions) for city_predictions in predictions.values()],
+            max_age=cache_ttl(WEATHER_CACHE_TTL)
+        )
     except Exception as e:
-        logger.error(f"API Error fetching forecast data: {str(e)}")
+        logger.error("API Error fetching disaster predictions for all cities: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/disasters/predictions/<city>')
 def api_disaster_predictions(city):
     try:
-        predictions = predict_disasters(city)
-        return jsonify(predictions)
+        predictions = get_predictions(city)
+        return json_response(
+            predictions,
+            version=predictions_version(predictions),
+            max_age=cache_ttl(WEATHER_CACHE_TTL)
+        )
     except Exception as e:
-        logger.error(f"API Error fetching disaster predictions: {str(e)}")
+        logger.error("API Error fetching disaster predictions: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/disasters/historical')
 def api_historical_disasters():
     try:
-        historical_disasters = get_historical_disasters()
-        return jsonify(historical_disasters)
+        historical_disasters, updated_at = get_historical_snapshot()
+        age = (datetime.utcnow() - updated_at).total_seconds()
+        return json_response(
+            historical_disasters,
+            version=updated_at,
+            max_age=HISTORICAL_FRESH_TTL - age,
+            last_modified=updated_at
+        )
     except Exception as e:
-        logger.error(f"API Error fetching historical disaster data: {str(e)}")
+        logger.error("API Error fetching historical disaster data: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/strategies/<disaster_type>')
 def api_strategies(disaster_type):
     try:
-        strategies = get_disaster_strategies(disaster_type)
-        return jsonify(strategies)
+        strategies, expires_at = get_versioned_disaster_strategies(disaster_type)
+        # Until ReliefWeb results are cached, have clients revalidate every time
+        return json_response(
+            strategies,
+            version=(default_strategies_date(), expires_at),
+            max_age=seconds_until(expires_at) if expires_at is not None else 0
+        )
+    except Exception as e:
+        logger.error("API Error fetching government strategies: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stream/<city>')
+def api_stream(city):
+    if city not in CITY_COORDINATES:
+        return jsonify({"error": f"City '{city}' is not supported"}), 404
+    
+    try:
+        stream = subscribe_live_updates(app, city, request.headers.get('Last-Event-ID', 0, type=int))
+    except TooManySubscribersError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "60"}
+    
+    return Response(stream, mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        # Stop nginx and similar proxies from buffering the stream
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route('/api/search')
+def api_search():
+    # Imported on first search, as it loads numpy
+    from utils.search_index import search_documents, SEARCH_KINDS
+    
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('kind')
+    disaster_type = request.args.get('type')
+    limit = request.args.get('limit', 20, type=int)
+    if not query:
+        return jsonify({"error": "Missing search query; pass it as ?q="}), 400
+    if kind is not None and kind not in SEARCH_KINDS:
+        return jsonify({"error": f"Unknown kind '{kind}'; use one of {', '.join(SEARCH_KINDS)}"}), 400
+    
+    try:
+        return jsonify(search_documents(query, kind=kind, disaster_type=disaster_type, limit=limit))
+    except Exception as e:
+        logger.error("API Error searching documents: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/image-analysis/batch', methods=['POST'])
+def api_image_analysis_batch():
+    # Allow a whole batch of images in one request
+    request.max_content_length = MAX_BATCH_IMAGES * MAX_IMAGE_SIZE
+    
+    files = request.files.getlist('files')
+    location = request.form.get('location', '')
+    if not files:
+        return jsonify({"error": "No files uploaded; send images in 'files' fields"}), 400
+    if len(files) > MAX_BATCH_IMAGES:
+        return jsonify({"error": f"At most {MAX_BATCH_IMAGES} images can be uploaded at once"}), 400
+    
+    uploads = []
+    for file in files:
+        if not allowed_file(file.filename):
+            return jsonify({"error": f"File type not allowed: {file.filename}"}), 400
+        try:
+            file_content = read_upload(file.stream, MAX_IMAGE_SIZE)
+            inspect_image(file_content)
+        except InvalidImageError as e:
+            return jsonify({"error": f"{file.filename}: {str(e)}"}), 400
+        uploads.append((secure_filename(file.filename), file_content))
+    
+    try:
+        batch_id, jobs = submit_images(app, uploads, location)
+        return jsonify({"batch_id": batch_id, "jobs": jobs}), 202
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+    except Exception as e:
+        logger.error("API Error queueing image batch: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/image-analysis/batch/<batch_id>')
+def api_image_analysis_batch_status(batch_id):
+    jobs = get_batch(batch_id)
+    if not jobs:
+        return jsonify({"error": f"Batch '{batch_id}' not found"}), 404
+    
+    pending = sum(1 for job in jobs if job["status"] == STATUS_QUEUED)
+    return jsonify({"batch_id": batch_id, "pending": pending, "jobs": jobs})
+
+@app.route('/api/image-analysis/<int:analysis_id>')
+def api_image_analysis(analysis_id):
+    job = get_job(analysis_id)
+    if job is None:
+        return jsonify({"error": f"Image analysis {analysis_id} not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    return jsonify(get_all_cache_stats())
+
+@app.route('/metrics')
+def metrics():
+    try:
+        return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
     except Exception as e:
-        logger.error(f"API Error fetching government strategies: {str(e)}")
+        logger.error("Error rendering metrics: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.errorhandler(404)
@@ -0,0 +1,89 @@
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Indexes dropped from the models, removed from existing databases by
+# upgrade_schema: table name -> index names
+RETIRED_INDEXES = {
+    # Redundant with the unique (location, disaster_type) index
+    "disaster_prediction": ["ix_disaster_prediction_location_type_valid_until"],
+}
+
+def init_db():
+    """
+    Create missing tables, then add the columns and indexes missing from
+    existing ones
+    """
+    db.create_all()
+    upgrade_schema()
+
+def upgrade_schema():
+    """
+    Bring an existing database up to date with the models
+    
+    db.create_all() only creates missing tables, so columns and indexes added
+    to a model after its table was created are added here, and indexes in
+    RETIRED_INDEXES are dropped. New columns must be nullable.
+    """
+    inspector = inspect(db.engine)
+    
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            logger.info("Adding column %s.%s", table.name, column.name)
+            db.session.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        
+        db.session.commit()
+        
+        existing_indexes = {index["name"] for index in inspect(db.engine).get_indexes(table.name)}
+        for name in RETIRED_INDEXES.get(table.name, ()):
+            if name in existing_indexes:
+                logger.info("Dropping index %s", name)
+                db.session.execute(text(f"DROP INDEX {name}"))
+        db.session.commit()
+        
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            
+            logger.info("Creating index %s", index.name)
+            try:
+                index.create(db.engine)
+            except IntegrityError as e:
+                # A unique index over rows that are already duplicated
+                logger.error("Could not create unique index %s; remove duplicate rows and rerun: %s", index.name, e)
+    
+    db.session.commit()
+
+def upsert_rows(model, rows, conflict_columns, update_columns, batch_size=100):
+    """
+    Insert rows into a model's table in batches, updating update_columns on
+    rows that collide on the unique index over conflict_columns
+    
+    Does not commit. Supports SQLite and PostgreSQL.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise Exception(f"Upserts are not supported on the {dialect} database")
+    
+    for start in range(0, len(rows), batch_size):
+        statement = insert(model).values(rows[start:start + batch_size])
+        statement = statement.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_={column: statement.excluded[column] for column in update_columns}
+        )
+        db.session.execute(statement)
@@ -152,33 +152,22 @@ function initPredictionDistributionChart() {
     // Show loading indicator
     document.getElementById('prediction-chart-loading').classList.remove('d-none');
     
-    // Create promises for fetching prediction data for each city
-    const predictionPromises = selectedCities.map(city => {
-        return fetch(`/api/disasters/predictions/${city}`)
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error(`Prediction data fetch failed for ${city}`);
-                }
-                return response.json();
-            })
-            .then(data => {
-                return {
-                    city: city,
-                    predictions: data
-                };
-            })
-            .catch(error => {
-                console.error(`Error fetching prediction data for ${city}:`, error);
+    // Fetch predictions for every city in a single request
+    fetch('/api/disasters/predictions')
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Prediction data fetch failed');
+            }
+            return response.json();
+        })
+        .then(data => {
+            const results = selectedCities.map(city => {
                 return {
                     city: city,
-                    predictions: []
+                    predictions: data[city] || []
                 };
             });
-    });
-    
-    // When all predictions are fetched
-    Promise.all(predictionPromises)
-        .then(results => {
+            
             // Hide loading indicator
             document.getElementById('prediction-chart-loading').classList.add('d-none');
             
@@ -10,10 +10,40 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize forecast chart
     initForecastChart();
     
-    // Set up refresh interval (every 15 minutes)
-    setInterval(updateWeatherData, 15 * 60 * 1000);
+    // Receive updates from the server as they happen; fall back to polling
+    // (every 15 minutes) in browsers without server-sent events
+    if (window.EventSource) {
+        subscribeToUpdates();
+    } else {
+        setInterval(updateWeatherData, 15 * 60 * 1000);
+    }
 });
 
+let liveUpdates = null;
+
+function subscribeToUpdates() {
+    const citySelector = document.getElementById('citySelector');
+    if (!citySelector) return;
+    
+    // One stream per page, for the selected city
+    if (liveUpdates) {
+        liveUpdates.close();
+    }
+    const selectedCity = citySelector.value;
+    liveUpdates = new EventSource(`/api/stream/${encodeURIComponent(selectedCity)}`);
+    
+    liveUpdates.addEventListener('weather', event => {
+        updateWeatherUI(JSON.parse(event.data));
+    });
+    liveUpdates.addEventListener('forecast', event => {
+        updateForecastChart(JSON.parse(event.data));
+    });
+    liveUpdates.addEventListener('predictions', event => {
+        renderDisasterPredictions(JSON.parse(event.data), selectedCity);
+    });
+    // EventSource reconnects by itself after errors
+}
+
 function initCitySelector() {
     const citySelector = document.getElementById('citySelector');
     if (!citySelector) return;
@@ -30,6 +60,9 @@ function initCitySelector() {
         // Update the weather data and forecast
         updateWeatherData();
         updateDisasterPredictions();
+        if (liveUpdates) {
+            subscribeToUpdates();
+        }
     });
 }
 
@@ -273,52 +306,7 @@ function updateDisasterPredictions() {
             return response.json();
         })
         .then(data => {
-            // Hide loading indicator
-            document.getElementById('predictions-loading').classList.add('d-none');
-            
-            // Clear previous disaster predictions
-            disasterContainer.innerHTML = '';
-            
-            if (data.length === 0) {
-                // Show no predictions message
-                disasterContainer.innerHTML = `
-                    <div class="alert alert-info">
-                        No disaster predictions for ${selectedCity} at this time.
-                    </div>
-                `;
-                return;
-            }
-            
-            // Add disaster predictions
-            data.forEach(prediction => {
-                // Create a card for each prediction
-                const cardColorClass = getDisasterSeverityClass(prediction.severity);
-                
-                const predictionCard = document.createElement('div');
-                predictionCard.className = `card mb-3 ${cardColorClass}`;
-                
-                predictionCard.innerHTML = `
-                    <div class="card-header d-flex justify-content-between align-items-center">
-                        <h5 class="m-0">${prediction.disaster_type}</h5>
-                        <span class="badge bg-${getSeverityBadgeColor(prediction.severity)}">
-                            Severity: ${prediction.severity}/5
-                        </span>
-                    </div>
-                    <div class="card-body">
-                        <p class="card-text">${prediction.description}</p>
-                        <p class="mb-0"><strong>Probability:</strong> ${Math.round(prediction.probability * 100)}%</p>
-                        <p class="mb-0"><strong>Valid until:</strong> ${prediction.valid_until}</p>
-                        <div class="mt-3">
-                            <strong>Precautions:</strong>
-                            <ul class="mb-0">
-                                ${prediction.precautions.map(p => `<li>${p}</li>`).join('')}
-                            </ul>
-                        </div>
-                    </div>
-                `;
-                
-                disasterContainer.appendChild(predictionCard);
-            });
+            renderDisasterPredictions(data, selectedCity);
         })
         .catch(error => {
             console.error('Error fetching disaster predictions:', error);
@@ -333,6 +321,58 @@ function updateDisasterPredictions() {
         });
 }
 
+function renderDisasterPredictions(data, selectedCity) {
+    const disasterContainer = document.getElementById('disaster-predictions');
+    if (!disasterContainer) return;
+    
+    // Hide loading indicator
+    document.getElementById('predictions-loading').classList.add('d-none');
+    
+    // Clear previous disaster predictions
+    disasterContainer.innerHTML = '';
+    
+    if (data.length === 0) {
+        // Show no predictions message
+        disasterContainer.innerHTML = `
+            <div class="alert alert-info">
+                No disaster predictions for ${selectedCity} at this time.
+            </div>
+        `;
+        return;
+    }
+    
+    // Add disaster predictions
+    data.forEach(prediction => {
+        // Create a card for each prediction
+        const cardColorClass = getDisasterSeverityClass(prediction.severity);
+        
+        const predictionCard = document.createElement('div');
+        predictionCard.className = `card mb-3 ${cardColorClass}`;
+        
+        predictionCard.innerHTML = `
+            <div class="card-header d-flex justify-content-between align-items-center">
+                <h5 class="m-0">${prediction.disaster_type}</h5>
+                <span class="badge bg-${getSeverityBadgeColor(prediction.severity)}">
+                    Severity: ${prediction.severity}/5
+                </span>
+            </div>
+            <div class="card-body">
+                <p class="card-text">${prediction.description}</p>
+                <p class="mb-0"><strong>Probability:</strong> ${Math.round(prediction.probability * 100)}%</p>
+                <p class="mb-0"><strong>Valid until:</strong> ${prediction.valid_until}</p>
+                <div class="mt-3">
+                    <strong>Precautions:</strong>
+                    <ul class="mb-0">
+                        ${prediction.precautions.map(p => `<li>${p}</li>`).join('')}
+                    </ul>
+                </div>
+            </div>
+        `;
+        
+        disasterContainer.appendChild(predictionCard);
+    });
+}
+
 function getDisasterSeverityClass(severity) {
     switch (severity) {
         case 5:
@@ -5,32 +5,9 @@ document.addEventListener('DOMContentLoaded', function() {
     initMap();
 });
 
-// City coordinates for major Indian cities
-const CITY_COORDINATES = {
-    "Mumbai": [19.0760, 72.8777],
-    "Delhi": [28.6139, 77.2090],
-    "Bangalore": [12.9716, 77.5946],
-    "Hyderabad": [17.3850, 78.4867],
-    "Chennai": [13.0827, 80.2707],
-    "Kolkata": [22.5726, 88.3639],
-    "Pune": [18.5204, 73.8567],
-    "Ahmedabad": [23.0225, 72.5714],
-    "Jaipur": [26.9124, 75.7873],
-    "Surat": [21.1702, 72.8311],
-    "Lucknow": [26.8467, 80.9462],
-    "Kanpur": [26.4499, 80.3319],
-    "Nagpur": [21.1458, 79.0882],
-    "Indore": [22.7196, 75.8577],
-    "Thane": [19.2183, 72.9781],
-    "Bhopal": [23.2599, 77.4126],
-    "Visakhapatnam": [17.6868, 83.2185],
-    "Patna": [25.5941, 85.1376],
-    "Vadodara": [22.3072, 73.1812],
-    "Ghaziabad": [28.6692, 77.4538]
-};
-
 // Map instance
 let map;
+let cityCoordinates = {};
 let cityMarkers = {};
 let weatherData = {};
 let disasterPredictions = {};
@@ -48,19 +25,32 @@ function initMap() {
         maxZoom: 18
     }).addTo(map);
     
-    // Add markers for major cities
-    addCityMarkers();
-    
-    // Fetch weather data for all cities
-    fetchAllCitiesWeatherData();
-    
-    // Fetch disaster predictions for all cities
-    fetchAllCitiesPredictions();
+    // Add markers for every supported city, then fill them in
+    fetch('/api/cities')
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('City list fetch failed');
+            }
+            return response.json();
+        })
+        .then(data => {
+            cityCoordinates = data;
+            addCityMarkers();
+            
+            // Fetch weather data for all cities
+            fetchAllCitiesWeatherData();
+            
+            // Fetch disaster predictions for all cities
+            fetchAllCitiesPredictions();
+        })
+        .catch(error => {
+            console.error('Error fetching city list:', error);
+        });
 }
 
 function addCityMarkers() {
-    for (const city in CITY_COORDINATES) {
-        const [lat, lng] = CITY_COORDINATES[city];
+    for (const city in cityCoordinates) {
+        const [lat, lng] = cityCoordinates[city];
         
         // Create a marker
         const marker = L.marker([lat, lng]).addTo(map);
@@ -129,40 +119,27 @@ function fetchAllCitiesWeatherData() {
         mapLoading.classList.remove('d-none');
     }
     
-    // Create promises for all city weather requests
-    const weatherPromises = Object.keys(CITY_COORDINATES).map(city => {
-        return fetch(`/api/weather/${city}`)
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error(`Weather data fetch failed for ${city}`);
-                }
-                return response.json();
-            })
-            .then(data => {
+    // Fetch current weather for every city in a single request
+    fetch('/api/weather/all')
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Weather data fetch failed');
+            }
+            return response.json();
+        })
+        .then(data => {
+            for (const city in data) {
                 // Store the weather data
-                weatherData[city] = data;
+                weatherData[city] = data[city].weather;
                 
                 // Update marker based on weather
-                updateMarkerStyle(city, data);
-                
-                return data;
-            })
-            .catch(error => {
-                console.error(`Error fetching weather data for ${city}:`, error);
-                return null;
-            });
-    });
-    
-    // When all weather data is fetched
-    Promise.all(weatherPromises)
-        .then(() => {
-            // Hide loading indicator
-            if (mapLoading) {
-                mapLoading.classList.add('d-none');
+                updateMarkerStyle(city, data[city].weather);
             }
         })
         .catch(error => {
             console.error('Error fetching all weather data:', error);
+        })
+        .finally(() => {
             // Hide loading indicator
             if (mapLoading) {
                 mapLoading.classList.add('d-none');
@@ -208,39 +185,30 @@ function createMarkerIcon(color) {
 }
 
 function fetchAllCitiesPredictions() {
-    // Create promises for all city prediction requests
-    const predictionPromises = Object.keys(CITY_COORDINATES).map(city => {
-        return fetch(`/api/disasters/predictions/${city}`)
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error(`Predictions fetch failed for ${city}`);
-                }
-                return response.json();
-            })
-            .then(data => {
+    // Fetch predictions for every city in a single request
+    fetch('/api/disasters/predictions')
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Predictions fetch failed');
+            }
+            return response.json();
+        })
+        .then(data => {
+            for (const city in data) {
+                const cityPredictions = data[city];
+                
                 // Store the predictions
-                disasterPredictions[city] = data;
+                disasterPredictions[city] = cityPredictions;
                 
                 // If there are high-severity predictions, update the marker
-                if (data && data.length > 0) {
-                    const highestSeverity = Math.max(...data.map(pred => pred.severity));
+                if (cityPredictions && cityPredictions.length > 0) {
+                    const highestSeverity = Math.max(...cityPredictions.map(pred => pred.severity));
                     if (highestSeverity >= 4) {
                         // High severity - highlight the marker
                         highlightCityWithRisk(city, highestSeverity);
                     }
                 }
-                
-                return data;
-            })
-            .catch(error => {
-                console.error(`Error fetching predictions for ${city}:`, error);
-                return null;
-            });
-    });
-    
-    // When all prediction data is fetched
-    Promise.all(predictionPromises)
-        .then(() => {
+            }
             console.log('All prediction data fetched');
         })
         .catch(error => {
@@ -266,7 +234,7 @@ function highlightCityWithRisk(city, severity) {
     }
     
     // Create a pulsing circle around the marker
-    L.circle([CITY_COORDINATES[city][0], CITY_COORDINATES[city][1]], {
+    L.circle([cityCoordinates[city][0], cityCoordinates[city][1]], {
         color: riskColor,
         fillColor: riskColor,
         fillOpacity: 0.3,
@@ -0,0 +1,45 @@
+"""
+Shared fixtures: the stub upstream from benchmarks/ and the app on a
+scratch database
+"""
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.stub_upstream import start_stub_server, stub_environ
+
+# The app reads its upstream URLs and database settings when first imported,
+# so the stub runs and the environment is set before any test imports it
+_server, _base_url = start_stub_server()
+_scratch = tempfile.mkdtemp()
+os.environ.update(stub_environ(_base_url))
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_scratch}/test.db",
+    "METRICS_DIR": os.path.join(_scratch, "metrics"),
+    "CACHE_SQLITE_PATH": os.path.join(_scratch, "cache.db"),
+    "MIGRATE_ON_STARTUP": "1",
+    "LOG_LEVEL": "WARNING"
+})
+
+
+@pytest.fixture(scope="session")
+def stub_upstream():
+    """
+    (server, base_url) of the stub upstream; server.RequestHandlerClass.counts
+    holds its request counts
+    """
+    return _server, _base_url
+
+
+@pytest.fixture(scope="session")
+def app():
+    from main import app
+
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
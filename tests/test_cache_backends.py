@@ -0,0 +1,18 @@
+import time
+
+from utils.cache_backends import SQLiteBackend
+
+
+def test_sqlite_backend_keeps_maxsize_entries(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+    backend.maxsizes["pages"] = 3
+
+    now = time.time()
+    for i in range(5):
+        backend.set("pages", f"page{i}", i, now + i)
+    backend.set("other", "page", "kept", now)
+
+    assert backend.size("pages") == 3
+    assert backend.get("pages", "page0") is None
+    assert backend.get("pages", "page4") == (4, now + 4)
+    assert backend.get("other", "page") == ("kept", now)
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+
+from utils import govt_strategies
+
+
+@pytest.fixture
+def today(monkeypatch):
+    """
+    Set the date the server believes it is
+    """
+    class Clock(datetime):
+        current = datetime(2025, 1, 1)
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.current
+
+    monkeypatch.setattr(govt_strategies, "datetime", Clock)
+    return Clock
+
+
+def test_default_strategies_carry_the_current_date(today):
+    assert {strategy["date"] for strategy in govt_strategies.get_default_strategies("Flood")} == {"2025-01-01"}
+
+    today.current = datetime(2025, 1, 2)
+    assert {strategy["date"] for strategy in govt_strategies.get_default_strategies("Flood")} == {"2025-01-02"}
+    assert {strategy["date"] for strategy in govt_strategies.get_default_strategies_by_phase("Flood", "Response")} \
+        == {"2025-01-02"}
+
+
+def test_shared_strategies_stay_undated_and_read_only():
+    strategies = govt_strategies.get_default_strategies("Flood")
+    with pytest.raises(TypeError):
+        strategies[0]["title"] = "Changed"
+    with pytest.raises(TypeError):
+        strategies[0] |= {"title": "Changed"}
+    strategies.append({"title": "Added"})
+
+    shared = govt_strategies.DEFAULT_STRATEGIES["Flood"][0]
+    assert "date" not in shared
+    with pytest.raises(TypeError):
+        shared["date"] = "2025-01-01"
+    assert len(govt_strategies.get_default_strategies("Flood")) == len(govt_strategies.DEFAULT_STRATEGIES["Flood"])
+
+
+def test_dated_strategies_are_built_once_per_day(today):
+    first = govt_strategies.get_default_strategies("Flood")
+    assert govt_strategies.get_default_strategies("Flood")[0] is first[0]
+
+    today.current = datetime(2025, 1, 2)
+    assert govt_strategies.get_default_strategies("Flood")[0] is not first[0]
+
+
+def test_unknown_types_do_not_start_refreshes(monkeypatch, stub_upstream):
+    def refresh(disaster_type_query):
+        raise AssertionError(f"refresh started for {disaster_type_query}")
+
+    monkeypatch.setattr(govt_strategies, "_start_background_refresh", refresh)
+
+    strategies, expires_at = govt_strategies.get_versioned_disaster_strategies("no such type")
+
+    assert expires_at is None
+    assert [strategy["title"] for strategy in strategies] == \
+        [strategy["title"] for strategy in govt_strategies.GENERIC_STRATEGIES]
+
+
+def test_known_types_are_fetched_from_reliefweb(stub_upstream):
+    server, _ = stub_upstream
+    govt_strategies.strategy_cache.clear()
+    before = server.RequestHandlerClass.counts.get("reliefweb", 0)
+
+    strategies, expires_at = govt_strategies.get_versioned_disaster_strategies("Cyclone")
+
+    assert expires_at is not None
+    assert any(strategy["from_api"] for strategy in strategies)
+    assert server.RequestHandlerClass.counts["reliefweb"] == before + 1
@@ -0,0 +1,207 @@
+import time
+
+import pytest
+import requests
+
+from benchmarks.stub_upstream import start_stub_server
+from utils import http_client
+from utils.http_client import CircuitBreaker, CircuitOpenError, UpstreamClient
+
+
+@pytest.fixture
+def upstream():
+    """
+    Start a stub upstream with the given latency and error rate; returns
+    (forecast URL, request counts)
+    """
+    servers = []
+
+    def start(latency=0.0, error_rate=0.0):
+        server, base_url = start_stub_server(latency=latency, error_rate=error_rate)
+        servers.append(server)
+        return f"{base_url}/v1/forecast?latitude=19.07&longitude=72.87", server.RequestHandlerClass.counts
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """
+    Retry attempts the client backed off for, without sleeping
+    """
+    attempts = []
+
+    def backoff_delay(attempt):
+        attempts.append(attempt)
+        return 0
+
+    monkeypatch.setattr(http_client, "_backoff_delay", backoff_delay)
+    return attempts
+
+
+def make_client(url, failure_threshold=2, reset_timeout=0.1):
+    client = UpstreamClient(requests.utils.urlparse(url).netloc)
+    client.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+    return client
+
+
+def test_success(upstream):
+    url, counts = upstream()
+    client = make_client(url)
+
+    response = client.request("GET", url)
+
+    assert response.status_code == 200
+    assert "current_weather" in response.json()
+    assert counts["open-meteo"] == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retries_with_backoff(upstream, delays):
+    url, counts = upstream(error_rate=1.0)
+    client = make_client(url, failure_threshold=10)
+
+    response = client.request("GET", url, retries=2)
+
+    assert response.status_code == 503
+    assert counts["open-meteo"] == 3
+    assert delays == [0, 1]
+    assert client.stats()["retries"] == 2
+    assert client.stats()["failures"] == 3
+
+
+def test_post_not_retried_by_default(upstream, delays):
+    url, counts = upstream(error_rate=1.0)
+    client = make_client(url, failure_threshold=10)
+
+    response = client.request("POST", url.replace("/v1/forecast", "/models/disaster_types"), data=b"image")
+
+    assert response.status_code == 503
+    assert delays == []
+
+
+def test_backoff_delay_is_bounded(monkeypatch):
+    monkeypatch.setattr(http_client, "BACKOFF_BASE", 0.25)
+    monkeypatch.setattr(http_client, "BACKOFF_MAX", 1.0)
+
+    for attempt in range(8):
+        for _ in range(50):
+            assert 0 <= http_client._backoff_delay(attempt) <= min(1.0, 0.25 * 2 ** attempt)
+
+
+def test_read_timeout(upstream, delays):
+    url, counts = upstream(latency=0.5)
+    client = make_client(url)
+
+    start = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        client.request("GET", url, timeout=(1, 0.1), retries=1)
+
+    assert time.monotonic() - start < 0.5
+    assert delays == [0]
+    assert client.stats()["failures"] == 2
+
+
+def test_breaker_opens_after_threshold_and_short_circuits(upstream, delays):
+    url, counts = upstream(error_rate=1.0)
+    client = make_client(url, failure_threshold=2, reset_timeout=60)
+
+    client.request("GET", url, retries=0)
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    client.request("GET", url, retries=0)
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        client.request("GET", url)
+    assert counts["open-meteo"] == 2
+    assert client.stats()["short_circuited"] == 1
+
+
+def test_success_resets_failure_count(upstream):
+    failing_url, _ = upstream(error_rate=1.0)
+    client = make_client(failing_url, failure_threshold=2)
+    client.request("GET", failing_url, retries=0)
+
+    healthy_url, _ = upstream()
+    client.request("GET", healthy_url)
+    client.request("GET", failing_url, retries=0)
+
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def open_breaker(client, url):
+    client.request("GET", url, retries=0)
+    client.request("GET", url, retries=0)
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_open_breaker_lets_one_trial_through_after_reset_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    time.sleep(0.15)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+
+def test_half_open_trial_success_closes(upstream):
+    failing_url, _ = upstream(error_rate=1.0)
+    healthy_url, _ = upstream()
+    client = make_client(failing_url)
+    open_breaker(client, failing_url)
+
+    time.sleep(0.15)
+    response = client.request("GET", healthy_url)
+
+    assert response.status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.breaker.failures == 0
+
+
+def test_half_open_trial_failure_reopens(upstream):
+    url, counts = upstream(error_rate=1.0)
+    client = make_client(url)
+    open_breaker(client, url)
+
+    time.sleep(0.15)
+    client.request("GET", url, retries=0)
+
+    assert client.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        client.request("GET", url)
+    assert counts["open-meteo"] == 3
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ChunkedEncodingError("truncated body"),
+    requests.exceptions.ContentDecodingError("bad gzip"),
+    requests.exceptions.InvalidURL("bad url"),
+    RuntimeError("unexpected")
+])
+def test_half_open_trial_other_error_reopens(upstream, monkeypatch, error):
+    url, _ = upstream(error_rate=1.0)
+    client = make_client(url)
+    open_breaker(client, url)
+    time.sleep(0.15)
+
+    def fail(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(client.session, "request", fail)
+    with pytest.raises(type(error)):
+        client.request("GET", url, retries=0)
+
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # After the reset timeout the next trial gets through rather than the
+    # breaker staying half open with its trial taken
+    monkeypatch.undo()
+    healthy_url, _ = upstream()
+    time.sleep(0.15)
+    assert client.request("GET", healthy_url).status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
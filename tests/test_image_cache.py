@@ -0,0 +1,51 @@
+import hashlib
+
+import pytest
+
+from utils import image_analysis, image_cache
+
+
+@pytest.fixture
+def fresh_key(monkeypatch):
+    """
+    Compute the key prefix again, under settings the test changes
+    """
+    monkeypatch.setattr(image_cache, "_key_prefix", None)
+
+    def key(image_data):
+        image_cache._key_prefix = None
+        return image_cache.analysis_key(image_data)
+    return key
+
+
+def test_key_is_stable_and_depends_on_the_bytes(fresh_key):
+    assert fresh_key(b"image") == fresh_key(b"image")
+    assert fresh_key(b"image") != fresh_key(b"other image")
+    assert fresh_key(b"image") != hashlib.sha256(b"image").hexdigest()
+
+
+@pytest.mark.parametrize("module, name, value", [
+    (image_cache, "IMAGE_CLASSIFIER_BACKEND", "local"),
+    (image_cache, "INFERENCE_IMAGE_SIZE", 512),
+    (image_analysis, "DISASTER_MODEL_URL", "https://example.org/models/other/disaster_types"),
+])
+def test_key_changes_with_backend_model_and_size(fresh_key, monkeypatch, module, name, value):
+    before = fresh_key(b"image")
+    monkeypatch.setattr(module, name, value)
+
+    assert fresh_key(b"image") != before
+
+
+def test_local_model_version_follows_the_model_file(monkeypatch, tmp_path):
+    from utils import local_classifier
+
+    model = tmp_path / "model.onnx"
+    model.write_bytes(b"weights")
+    monkeypatch.setattr(image_analysis, "IMAGE_CLASSIFIER_BACKEND", "local")
+    monkeypatch.setattr(local_classifier, "LOCAL_CLASSIFIER_MODEL", str(model))
+    before = image_analysis.get_model_version()
+
+    model.write_bytes(b"retrained weights")
+
+    assert image_analysis.get_model_version() != before
+    assert before.startswith("model.onnx:")
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import image_jobs
+
+
+@pytest.fixture
+def jobs(app):
+    """
+    A batch with a job queued by a worker that has since gone away, one
+    still within the deadline and one that finished
+    """
+    from app import db
+    from models import ImageAnalysis
+
+    now = datetime.utcnow()
+    deadline = timedelta(seconds=image_jobs.IMAGE_JOB_DEADLINE)
+    with app.app_context():
+        rows = [
+            ImageAnalysis(filename="lost.jpg", batch_id="stale", status=image_jobs.STATUS_QUEUED,
+                          upload_date=now - deadline - timedelta(minutes=1)),
+            ImageAnalysis(filename="running.jpg", batch_id="stale", status=image_jobs.STATUS_QUEUED,
+                          upload_date=now),
+            ImageAnalysis(filename="done.jpg", batch_id="stale", status=image_jobs.STATUS_DONE,
+                          upload_date=now - deadline * 2, analysis_result="Flooded street")
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+        ids = [row.id for row in rows]
+    yield ids
+    with app.app_context():
+        ImageAnalysis.query.filter(ImageAnalysis.id.in_(ids)).delete()
+        db.session.commit()
+
+
+def statuses(app, ids):
+    from app import db
+    from models import ImageAnalysis
+
+    with app.app_context():
+        return [db.session.get(ImageAnalysis, job_id).status for job_id in ids]
+
+
+def test_jobs_past_deadline_are_reported_failed(app, jobs):
+    with app.app_context():
+        batch = image_jobs.get_batch("stale")
+        lost = image_jobs.get_job(jobs[0])
+
+    assert [job["status"] for job in batch] == ["failed", "queued", "done"]
+    assert lost["status"] == "failed"
+    assert lost["description"] == image_jobs.EXPIRED_MESSAGE
+
+
+def test_expire_stale_jobs_marks_only_jobs_past_deadline(app, jobs):
+    with app.app_context():
+        assert image_jobs.expire_stale_jobs() == 1
+        assert image_jobs.expire_stale_jobs() == 0
+
+    assert statuses(app, jobs) == ["failed", "queued", "done"]
+
+
+def test_batch_status_endpoint(client, jobs):
+    body = client.get("/api/image-analysis/batch/stale").get_json()
+
+    assert [job["status"] for job in body["jobs"]] == ["failed", "queued", "done"]
+    assert body["pending"] == 1
+
+
+@pytest.fixture
+def photo():
+    from benchmarks.local_classifier import synthetic_photo
+
+    return synthetic_photo(1600, 1200, seed=7)
+
+
+def test_queue_is_bounded_by_downsampled_bytes(app, photo, monkeypatch):
+    from utils.image_preprocessing import prepare_for_inference
+
+    downsampled = len(prepare_for_inference(photo))
+    assert downsampled < len(photo)
+    monkeypatch.setattr(image_jobs, "IMAGE_ANALYSIS_QUEUE_BYTES", downsampled - 1)
+
+    with app.app_context(), pytest.raises(image_jobs.QueueFullError, match="bytes"):
+        image_jobs.submit_images(app, [("photo.jpg", photo)])
+    assert image_jobs.get_queue_stats()["pending_bytes"] == 0
+
+
+def test_expiry_errors_do_not_refuse_uploads(app, photo, monkeypatch):
+    def fail():
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(image_jobs, "expire_stale_jobs", fail)
+    monkeypatch.setattr(image_jobs, "_next_expiry_at", 0.0)
+    monkeypatch.setattr(image_jobs, "IMAGE_ANALYSIS_QUEUE_SIZE", 0)
+
+    # Gets past the expiry to the queue bound, without starting the pool
+    with app.app_context(), pytest.raises(image_jobs.QueueFullError):
+        image_jobs.submit_images(app, [("photo.jpg", photo)])
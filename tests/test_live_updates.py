@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from utils import live_updates, weather_api, weather_ingest, prediction_store
+
+
+@pytest.fixture
+def live(monkeypatch):
+    """
+    Snapshot streams over a fresh hub, refreshed every 0.1 s from values the
+    test controls
+    """
+    values = {"temperature": 30}
+    monkeypatch.setattr(live_updates, "hub", live_updates.UpdateHub())
+    monkeypatch.setattr(live_updates, "LIVE_STREAM_MODE", "snapshot")
+    monkeypatch.setattr(live_updates, "LIVE_UPDATE_INTERVAL", 0.1)
+    monkeypatch.setattr(live_updates, "LIVE_RECENT_WINDOW", 2.0)
+    monkeypatch.setattr(weather_ingest, "get_current_weather",
+                        lambda city: {"city": city, "temperature": values["temperature"]})
+    monkeypatch.setattr(weather_api, "get_versioned_forecast_data", lambda city: ([], "forecast-v1"))
+    monkeypatch.setattr(prediction_store, "get_all_predictions", lambda cities: {city: [] for city in cities})
+    return values
+
+
+def read_stream(client, last_event_id=None):
+    headers = {"Last-Event-ID": str(last_event_id)} if last_event_id else {}
+    response = client.get("/api/stream/Mumbai", headers=headers)
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    ids = [int(line[4:]) for line in body.splitlines() if line.startswith("id: ")]
+    return body, max(ids, default=last_event_id)
+
+
+def test_snapshot_stream_sends_current_values(client, live):
+    body, last_event_id = read_stream(client)
+
+    assert "event: weather" in body
+    assert '"temperature":30' in body
+    assert "event: forecast" in body
+    assert "event: predictions" in body
+    assert last_event_id
+
+
+def test_reconnect_receives_new_values(client, live):
+    body, last_event_id = read_stream(client)
+    assert '"temperature":30' in body
+
+    # The stream has closed; the city must still be refreshed for the
+    # reconnect to see the change
+    live["temperature"] = 31
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        body, last_event_id = read_stream(client, last_event_id)
+        if "event: weather" in body:
+            break
+        time.sleep(0.1)
+
+    assert '"temperature":31' in body
+    assert "event: forecast" not in body
+
+
+def test_unsubscribed_city_stops_being_refreshed(monkeypatch):
+    monkeypatch.setattr(live_updates, "LIVE_RECENT_WINDOW", 60)
+    monkeypatch.setattr(live_updates, "_last_subscribed", {
+        "Mumbai": time.monotonic(),
+        "Delhi": time.monotonic() - 120
+    })
+
+    assert live_updates._recent_cities() == {"Mumbai"}
+    assert "Delhi" not in live_updates._last_subscribed
@@ -0,0 +1,31 @@
+import logging
+
+import pytest
+
+from utils import logging_setup
+
+
+def test_caller_is_still_looked_up(app):
+    records = []
+
+    class Keep(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+
+    logger = logging.getLogger("tests.caller")
+    logger.addHandler(Keep())
+    try:
+        logger.warning("where am I")
+    finally:
+        logger.handlers.clear()
+
+    assert records[0].funcName == "test_caller_is_still_looked_up"
+    assert records[0].pathname == __file__
+
+
+def test_parse_levels():
+    assert logging_setup.parse_levels(" werkzeug=warning, utils.http_client=DEBUG,") == {
+        "werkzeug": "WARNING", "utils.http_client": "DEBUG"
+    }
+    with pytest.raises(ValueError):
+        logging_setup.parse_levels("werkzeug")
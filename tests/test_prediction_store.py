@@ -0,0 +1,142 @@
+import pytest
+
+from utils import prediction_store
+
+
+@pytest.fixture
+def weather_loads(monkeypatch):
+    """
+    Count the weather loads predictions make, with a version the test sets
+    """
+    from utils.disaster_prediction import load_weather_inputs
+
+    loads = {"count": 0, "version": None}
+
+    def load():
+        loads["count"] += 1
+        weather = load_weather_inputs()
+        if loads["version"] is not None:
+            weather = dict(weather, version=loads["version"])
+        return weather
+
+    monkeypatch.setattr(prediction_store, "load_weather_inputs", load)
+    return loads
+
+
+@pytest.fixture
+def empty_predictions(app):
+    from app import db
+    from models import DisasterPrediction
+
+    with app.app_context():
+        DisasterPrediction.query.delete()
+        db.session.commit()
+        yield
+
+
+@pytest.fixture
+def cached_weather(monkeypatch):
+    """
+    Serve the weather arrays as the cached batch, with a version the test sets
+    """
+    from utils.disaster_prediction import load_weather_inputs
+
+    weather = load_weather_inputs()
+    cached = {"weather": weather}
+    monkeypatch.setattr(prediction_store, "get_cached_weather_arrays", lambda: cached["weather"])
+    return cached
+
+
+def test_reads_do_not_load_weather_once_stored(empty_predictions, cached_weather, weather_loads):
+    first = prediction_store.get_all_predictions(["Mumbai", "Delhi"])
+
+    for _ in range(3):
+        assert prediction_store.get_all_predictions(["Mumbai", "Delhi"]) == first
+    assert prediction_store.get_predictions("Mumbai") == first["Mumbai"]
+    assert weather_loads["count"] == 0
+
+
+def test_reads_rescore_when_cached_weather_changes(empty_predictions, cached_weather, weather_loads):
+    from models import DisasterPrediction
+
+    prediction_store.get_all_predictions(["Mumbai"])
+    cached_weather["weather"] = dict(cached_weather["weather"], version="newer")
+    prediction_store.get_all_predictions(["Mumbai"])
+
+    assert weather_loads["count"] == 0
+    assert {row.inputs_key for row in DisasterPrediction.query.filter_by(location="Mumbai")} == \
+        {prediction_store.get_prediction_inputs_key(None, {"version": "newer"})}
+
+
+def test_new_weather_batch_rescores_through_risk_model(empty_predictions):
+    from utils.risk_scoring import HEAVY_RAIN_24H
+    from utils.weather_api import CITY_COORDINATES, batch_cache, get_all_weather_arrays
+
+    def flood_probability():
+        predictions = prediction_store.get_all_predictions(["Mumbai"])["Mumbai"]
+        return next((p["probability"] for p in predictions if p["disaster_type"] == "Flood"), 0)
+
+    weather = get_all_weather_arrays()
+    before = flood_probability()
+
+    mumbai = weather["cities"]["Mumbai"]
+    hourly = dict(mumbai["hourly"], precipitation=[2 * HEAVY_RAIN_24H / 24] * len(mumbai["hourly"]["precipitation"]))
+    arrays = {
+        "version": "rain",
+        "cities": dict(weather["cities"], Mumbai=dict(mumbai, hourly=hourly))
+    }
+    key = tuple(CITY_COORDINATES)
+    batch_cache.set(key, dict(batch_cache.peek(key)[0], arrays=arrays), ttl=60)
+    try:
+        assert flood_probability() > before
+    finally:
+        batch_cache.clear()
+
+
+def test_reads_refresh_in_background_without_cached_weather(empty_predictions, cached_weather, monkeypatch):
+    started = []
+    prediction_store.get_all_predictions(["Mumbai"])
+    cached_weather["weather"] = None
+    monkeypatch.setattr(prediction_store, "_start_background_refresh", lambda: started.append(True))
+
+    prediction_store.get_all_predictions(["Mumbai"])
+
+    assert started == [True]
+
+
+def test_predictions_without_weather_expire_with_the_weather_cache(empty_predictions, monkeypatch):
+    from models import DisasterPrediction
+
+    monkeypatch.setattr(prediction_store, "get_cached_weather_arrays", lambda: None)
+    monkeypatch.setattr(prediction_store, "load_weather_inputs", lambda: None)
+    monkeypatch.setattr("utils.disaster_prediction.load_weather_inputs", lambda: None)
+    prediction_store.get_all_predictions(["Mumbai"])
+
+    for row in DisasterPrediction.query.filter_by(location="Mumbai"):
+        assert row.valid_until - row.prediction_date <= prediction_store.PRIORS_ONLY_VALID
+
+
+def test_refresh_replaces_predictions_from_older_weather(empty_predictions, weather_loads):
+    from models import DisasterPrediction
+
+    prediction_store.get_all_predictions(["Mumbai"])
+    assert prediction_store.refresh_predictions(["Mumbai"]) == 0
+
+    weather_loads["version"] = "newer"
+    stored = prediction_store.refresh_predictions(["Mumbai"])
+
+    assert stored > 0
+    assert {row.inputs_key for row in DisasterPrediction.query.filter_by(location="Mumbai")} == \
+        {prediction_store.get_prediction_inputs_key(None, {"version": "newer"})}
+
+
+def test_refresh_keeps_predictions_without_weather(empty_predictions, monkeypatch):
+    prediction_store.get_all_predictions(["Mumbai"])
+    monkeypatch.setattr(prediction_store, "load_weather_inputs", lambda: None)
+
+    assert prediction_store.refresh_predictions(["Mumbai"]) == 0
+
+
+def test_unsupported_city(empty_predictions):
+    with pytest.raises(ValueError):
+        prediction_store.get_all_predictions(["Atlantis"])
@@ -0,0 +1,11 @@
+from utils.render_cache import page_cache
+
+
+def test_pages_are_stored_only_for_supported_values(client):
+    page_cache.clear()
+
+    assert client.get("/strategies?type=Flood").status_code == 200
+    assert client.get("/strategies?type=Bogus").status_code == 200
+
+    assert page_cache.peek("strategies|Flood") is not None
+    assert page_cache.peek("strategies|Bogus") is None
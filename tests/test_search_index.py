@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+
+import pytest
+
+from utils import search_index
+
+
+@pytest.fixture
+def unbuilt(monkeypatch):
+    """
+    No index in this process, as in a worker that did not inherit one
+    """
+    monkeypatch.setattr(search_index, "_index", None)
+    monkeypatch.setattr(search_index, "_build_thread", None)
+
+
+def test_search_falls_back_to_database_while_building(app, unbuilt, monkeypatch):
+    release = threading.Event()
+    build_index = search_index.build_index
+    monkeypatch.setattr(search_index, "build_index", lambda: release.wait(5) and build_index())
+
+    with app.app_context():
+        search_index.store_documents([search_index.guideline_document("Flood", {
+            "title": "Flood relief camps", "body": "Relief camps for displaced families.",
+            "url": "https://example.org/flood-relief", "source": "NDMA", "date": "2024-07-01"
+        })])
+        from app import db
+        db.session.commit()
+
+        results = search_index.search_documents("flood relief")
+        assert search_index._index is None
+        assert results["total"] >= 1
+        assert "Flood relief camps" in [result["title"] for result in results["results"]]
+
+        release.set()
+        deadline = time.monotonic() + 5
+        while search_index._index is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        results = search_index.search_documents("flood relief")
+        assert search_index._index is not None
+        assert "Flood relief camps" in [result["title"] for result in results["results"]]
+        assert results["results"][0]["score"] > 0
+
+
+def test_fallback_filters_match_the_index(app):
+    with app.app_context():
+        search_index.build_index()
+        for kind, disaster_type in [(None, None), ("strategy", None), ("strategy", "flood"), ("guideline", "Flood")]:
+            indexed, _ = search_index._get_index().search("evacuation", kind=kind, disaster_type=disaster_type)
+            unranked, _ = search_index._search_database("evacuation", kind=kind, disaster_type=disaster_type)
+            assert indexed == unranked
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_index_built_before_fork_is_kept(app):
+    with app.app_context():
+        search_index.build_index()
+    index = search_index._index
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            with app.app_context():
+                kept = search_index._get_index() is index
+                found = search_index.search_documents("flood")["total"] > 0
+            os.write(write, b"1" if kept and found else b"0")
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b"1"
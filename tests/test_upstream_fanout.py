@@ -0,0 +1,47 @@
+import time
+
+from utils import upstream_fanout
+from utils.logging_setup import request_id
+
+
+def test_calls_run_concurrently():
+    start = time.monotonic()
+    results = upstream_fanout.gather([(time.sleep, 0.2), (time.sleep, 0.2), (time.sleep, 0.2)])
+
+    assert results == [None, None, None]
+    assert time.monotonic() - start < 0.5
+
+
+def test_failures_are_returned_in_order():
+    def fail():
+        raise ValueError("upstream down")
+
+    results = upstream_fanout.gather([(str, 1), (fail,), (str, 3)])
+
+    assert results[0] == "1" and results[2] == "3"
+    assert isinstance(results[1], ValueError)
+
+
+def test_unfinished_calls_time_out():
+    start = time.monotonic()
+    results = upstream_fanout.gather([(time.sleep, 1), (str, 2)], timeout=0.1)
+
+    assert time.monotonic() - start < 0.5
+    assert isinstance(results[0], TimeoutError)
+    assert results[1] == "2"
+
+
+def test_calls_see_the_request_id():
+    token = request_id.set("test-request")
+    try:
+        assert upstream_fanout.gather([(request_id.get,)]) == ["test-request"]
+    finally:
+        request_id.reset(token)
+
+
+def test_dashboard_data(app):
+    weather, forecast, predictions = upstream_fanout.gather_dashboard_data("Mumbai", app)
+
+    for result in (weather, forecast, predictions):
+        assert not isinstance(result, Exception), result
+    assert forecast
@@ -0,0 +1,25 @@
+from benchmarks.stub_upstream import open_meteo_location
+from utils.weather_api import _parse_current_weather
+
+
+def test_current_weather_time_is_gmt_for_local_time_responses():
+    location = open_meteo_location(19.076, 72.8777)
+    gmt = _parse_current_weather("Mumbai", location)
+
+    # The same observation, as Open-Meteo returns it for "timezone": "auto"
+    local = open_meteo_location(19.076, 72.8777)
+    local["utc_offset_seconds"] = 19800
+    local["current_weather"]["time"] = "2026-10-18T12:30"
+    local["hourly"]["time"][0] = "2026-10-18T12:30"
+
+    assert _parse_current_weather("Mumbai", local)["time"] == "2026-10-18T07:00"
+    assert _parse_current_weather("Mumbai", local)["humidity"] == local["hourly"]["relativehumidity_2m"][0]
+    assert gmt["time"] == location["current_weather"]["time"]
+
+
+def test_weather_api_sends_observation_time_as_last_modified(client):
+    response = client.get("/api/weather/Mumbai")
+    observed_at = response.get_json()["time"]
+
+    assert response.last_modified.strftime("%Y-%m-%dT%H:%M") == observed_at
+    assert client.get("/api/weather/Mumbai", headers={"If-Modified-Since": response.headers["Last-Modified"]}).status_code == 304
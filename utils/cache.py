@@ -0,0 +1,273 @@
+import json
+import threading
+import time
+import logging
+
+from utils.cache_backends import create_backend
+
+logger = logging.getLogger(__name__)
+
+# Every cache created in this process, for get_all_cache_stats()
+_caches = []
+
+# How long one worker may hold the reload of a key in a shared backend, and
+# how long other workers with nothing to serve wait for its result
+LEASE_SECONDS = 30
+LEASE_WAIT = 5.0
+LEASE_POLL_INTERVAL = 0.05
+
+
+class _Flight:
+    """
+    A load in progress for one cache key, shared by every caller waiting on it
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.entry = None  # (value, expires_at)
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe cache with per-entry expiry and single-flight loading
+
+    Entries are kept in the backend chosen with
+    utils.cache_backends.configure(): by default an LRU dict in this process
+    that evicts the least recently used entry once maxsize is reached, or a
+    store shared by all workers. Concurrent misses for the same key share one
+    call to the loader instead of each hitting upstream: within a process
+    through a shared in-flight load, across workers through a lease in the
+    shared backend.
+    If a reload fails and an expired value is still held, the expired value
+    is served rather than raising. A shared backend that cannot be reached
+    behaves as a miss.
+    """
+
+    def __init__(self, name, maxsize=256, default_ttl=300):
+        self.name = name
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._backend = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.errors = 0
+        self.backend_errors = 0
+
+        _caches.append(self)
+
+    @property
+    def backend(self):
+        # Created on first use, so app.py can configure the backend after
+        # the modules defining caches are imported
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_backend(self.maxsize, self.name)
+        return self._backend
+
+    def _read(self, key):
+        try:
+            return self.backend.get(self.name, _key_string(key))
+        except Exception as e:
+            self._backend_error("read", e)
+            return None
+
+    def _backend_error(self, action, error):
+        with self._lock:
+            self.backend_errors += 1
+        logger.warning("Could not %s '%s' cache in %s backend: %s", action, self.name, self.backend.name, error)
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None if it is missing or expired
+        """
+        entry = self._read(key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def peek(self, key):
+        """
+        Return the entry (value, expires_at) for key even when it has
+        expired, or None if nothing is stored
+
+        A fresh entry counts as a hit; misses and stale reads are counted by
+        the get_or_load() that reloads them.
+        """
+        entry = self._read(key)
+        if entry is not None and entry[1] > time.time():
+            with self._lock:
+                self.hits += 1
+        return entry
+
+    def record_miss(self):
+        """
+        Count a miss for a caller that reloads with set() after peek()
+        """
+        with self._lock:
+            self.misses += 1
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value for key for ttl seconds
+
+        Returns:
+            float: The entry's expiry time
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+
+        expires_at = time.time() + ttl
+        try:
+            self.backend.set(self.name, _key_string(key), value, expires_at)
+        except Exception as e:
+            self._backend_error("write", e)
+        return expires_at
+
+    def delete(self, key):
+        try:
+            self.backend.delete(self.name, _key_string(key))
+        except Exception as e:
+            self._backend_error("delete from", e)
+
+    def clear(self):
+        try:
+            self.backend.clear(self.name)
+        except Exception as e:
+            self._backend_error("clear", e)
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Return the cached value for key, calling loader() to fill it on a miss
+
+        Only one thread per process runs the loader for a given key at a time;
+        the others wait for its result.
+        """
+        return self.get_or_load_entry(key, loader, ttl)[0]
+
+    def get_or_load_entry(self, key, loader, ttl=None):
+        """
+        Like get_or_load(), but return the entry (value, expires_at); the
+        expiry changes whenever the value is reloaded, so it doubles as the
+        value's version
+        """
+        entry = self._read(key)
+        with self._lock:
+            if entry is not None and entry[1] > time.time():
+                self.hits += 1
+                return entry
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.stale += 1
+
+            flight = self._inflight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+
+        if not is_leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.entry
+
+        leased = self._acquire_lease(key)
+        try:
+            if not leased:
+                # Another worker is reloading this key: serve the value it is
+                # replacing, or wait briefly for the new one
+                peer_entry = entry if entry is not None else self._wait_for_peer(key)
+                if peer_entry is not None:
+                    flight.entry = peer_entry
+                    return peer_entry
+
+            value = loader()
+            flight.entry = (value, self.set(key, value, ttl))
+            return flight.entry
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            if entry is not None:
+                logger.warning("Serving stale '%s' cache entry for %s: %s", self.name, key, e)
+                flight.entry = entry
+                return entry
+            flight.error = e
+            raise
+        finally:
+            if leased:
+                self._release_lease(key)
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def _acquire_lease(self, key):
+        try:
+            return self.backend.acquire_lease(self.name, _key_string(key), LEASE_SECONDS)
+        except Exception as e:
+            self._backend_error("lease a key in", e)
+            return True
+
+    def _release_lease(self, key):
+        try:
+            self.backend.release_lease(self.name, _key_string(key))
+        except Exception as e:
+            self._backend_error("release a key in", e)
+
+    def _wait_for_peer(self, key):
+        """
+        Poll for a fresh entry stored by the worker holding the lease
+        """
+        deadline = time.monotonic() + LEASE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LEASE_POLL_INTERVAL)
+            entry = self._read(key)
+            if entry is not None and entry[1] > time.time():
+                return entry
+        return None
+
+    def stats(self):
+        """
+        Return hit/miss/stale counters of this process and the current size
+        of the cache, when the backend can count it
+        """
+        try:
+            backend_name = self.backend.name
+            size = self.backend.size(self.name)
+        except Exception:
+            backend_name = self._backend.name if self._backend is not None else None
+            size = None
+
+        with self._lock:
+            return {
+                "name": self.name,
+                "backend": backend_name,
+                "size": size,
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": getattr(self._backend, "evictions", 0),
+                "errors": self.errors,
+                "backend_errors": self.backend_errors
+            }
+
+
+def _key_string(key):
+    """
+    Cache keys are strings or JSON-serializable values such as tuples
+    """
+    return key if isinstance(key, str) else json.dumps(key)
+
+
+def get_all_cache_stats():
+    """
+    Get stats for every cache in this process, keyed by cache name
+    """
+    return {cache.name: cache.stats() for cache in _caches}
@@ -0,0 +1,302 @@
+"""
+Storage backends for utils.cache.TTLCache
+
+- memory: an LRU dict in this process; every worker warms its own copy
+- sqlite: a WAL-mode SQLite file shared by every worker on the host
+- redis: any server speaking the Redis protocol, shared across hosts
+
+Shared backends serialize values as JSON and keep each entry for
+STALE_RETENTION seconds past its expiry, so a failed reload can still serve
+the last value. Like the memory backend, they hold about a cache's
+maxsize entries, evicting those that expire first. They also hand out short
+leases, so that when an entry is missing or expired only one worker reloads
+it. Backends are selected with configure() from app.py.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Seconds an expired entry is kept in a shared backend for stale serving
+STALE_RETENTION = 24 * 60 * 60
+
+# Prune expired rows from the SQLite backend once every this many writes
+SQLITE_PRUNE_INTERVAL = 500
+
+# Trim a namespace of the SQLite backend to its maxsize once every this
+# fraction of maxsize writes to it, so it overshoots by at most that much
+SQLITE_TRIM_FRACTION = 0.125
+
+# Backend settings, replaced by configure()
+_config = {
+    "CACHE_BACKEND": "memory",
+    "CACHE_SQLITE_PATH": "/tmp/climate_app_cache.db",
+    "CACHE_REDIS_URL": "redis://localhost:6379/0"
+}
+_shared_backend = None
+_shared_lock = threading.Lock()
+
+
+class MemoryBackend:
+    """
+    Per-process LRU storage; values are stored as they are, not copied
+    """
+    name = "memory"
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._data = OrderedDict()  # (namespace, key) -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is not None:
+                self._data.move_to_end((namespace, key))
+            return entry
+
+    def set(self, namespace, key, value, expires_at):
+        with self._lock:
+            self._data[(namespace, key)] = (value, expires_at)
+            self._data.move_to_end((namespace, key))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def clear(self, namespace):
+        with self._lock:
+            for entry_key in [entry_key for entry_key in self._data if entry_key[0] == namespace]:
+                del self._data[entry_key]
+
+    def size(self, namespace):
+        with self._lock:
+            return sum(1 for entry_key in self._data if entry_key[0] == namespace)
+
+    def acquire_lease(self, namespace, key, seconds):
+        # Only this process uses the data, and TTLCache already loads once per process
+        return True
+
+    def release_lease(self, namespace, key):
+        pass
+
+
+class SQLiteBackend:
+    """
+    Storage in a SQLite file shared by the worker processes of one host
+
+    Each thread opens its own connection; reads go through a memory map of
+    the file, and WAL mode lets readers proceed while a worker writes.
+    """
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self.maxsizes = {}  # namespace -> most entries kept
+        self._local = threading.local()
+        self._writes = 0
+        self._namespace_writes = {}
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA mmap_size=67108864")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, keep_until REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_leases ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, held_until REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, namespace, key):
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ? AND keep_until > ?",
+            (namespace, key, time.time())
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row is not None else None
+
+    def set(self, namespace, key, value, expires_at):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), expires_at, expires_at + STALE_RETENTION)
+        )
+        maxsize = self.maxsizes.get(namespace)
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % SQLITE_PRUNE_INTERVAL == 0
+            namespace_writes = self._namespace_writes[namespace] = self._namespace_writes.get(namespace, 0) + 1
+
+        if maxsize is not None and namespace_writes % max(int(maxsize * SQLITE_TRIM_FRACTION), 1) == 0:
+            connection.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                "SELECT key FROM cache_entries WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (namespace, namespace, maxsize)
+            )
+        if prune:
+            connection.execute("DELETE FROM cache_entries WHERE keep_until <= ?", (time.time(),))
+
+    def delete(self, namespace, key):
+        self._connection().execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace):
+        self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+    def size(self, namespace):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ? AND keep_until > ?",
+            (namespace, time.time())
+        ).fetchone()[0]
+
+    def acquire_lease(self, namespace, key, seconds):
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND held_until <= ?",
+            (namespace, key, now)
+        )
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO cache_leases VALUES (?, ?, ?)",
+            (namespace, key, now + seconds)
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, namespace, key):
+        self._connection().execute("DELETE FROM cache_leases WHERE namespace = ? AND key = ?", (namespace, key))
+
+
+class RedisBackend:
+    """
+    Storage on a Redis-protocol server, shared by every worker and host
+
+    Needs the optional `redis` package. Entries are stored as JSON under
+    "climate_app:<namespace>:<key>" and expire on the server. Each namespace
+    also has a sorted set of its keys by expiry, "climate_app:<namespace>#keys",
+    used to trim it to its maxsize. Run the server with a maxmemory and
+    maxmemory-policy volatile-lru as well, so other data sharing it cannot
+    push out more than the cache's own entries.
+    """
+    name = "redis"
+    prefix = "climate_app:"
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("The redis cache backend needs the redis package")
+
+        # Short timeouts: an unreachable cache must not stall requests. RESP2
+        # is spoken by every Redis-compatible server.
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5, protocol=2)
+        self.maxsizes = {}  # namespace -> most entries kept
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}{namespace}:{key}"
+
+    def _index_key(self, namespace):
+        return f"{self.prefix}{namespace}#keys"
+
+    def get(self, namespace, key):
+        raw = self.client.get(self._key(namespace, key))
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry["value"], entry["expires_at"]
+
+    def set(self, namespace, key, value, expires_at):
+        keep_for = max(expires_at - time.time(), 0) + STALE_RETENTION
+        entry_key = self._key(namespace, key)
+        index_key = self._index_key(namespace)
+
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.set(entry_key, json.dumps({"value": value, "expires_at": expires_at}), px=int(keep_for * 1000))
+        pipeline.zadd(index_key, {entry_key: expires_at})
+        # Keys past their retention have already expired on the server
+        pipeline.zremrangebyscore(index_key, "-inf", time.time() - STALE_RETENTION)
+        pipeline.zcard(index_key)
+        size = pipeline.execute()[-1]
+
+        maxsize = self.maxsizes.get(namespace)
+        if maxsize is not None and size > maxsize:
+            evicted = [member for member, _ in self.client.zpopmin(index_key, size - maxsize)]
+            if evicted:
+                self.client.delete(*evicted)
+
+    def delete(self, namespace, key):
+        entry_key = self._key(namespace, key)
+        self.client.delete(entry_key)
+        self.client.zrem(self._index_key(namespace), entry_key)
+
+    def clear(self, namespace):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}{namespace}:*", count=500))
+        keys.append(self._index_key(namespace))
+        self.client.delete(*keys)
+
+    def size(self, namespace):
+        return self.client.zcount(self._index_key(namespace), time.time() - STALE_RETENTION, "+inf")
+
+    def acquire_lease(self, namespace, key, seconds):
+        return bool(self.client.set(f"{self._key(namespace, key)}#lease", b"1", nx=True, px=int(seconds * 1000)))
+
+    def release_lease(self, namespace, key):
+        self.client.delete(f"{self._key(namespace, key)}#lease")
+
+
+def configure(config):
+    """
+    Select the backend for caches created from now on, from a mapping with
+    CACHE_BACKEND and the CACHE_SQLITE_PATH / CACHE_REDIS_URL it needs
+    """
+    global _shared_backend
+
+    if config.get("CACHE_BACKEND", "memory") not in ("memory", "sqlite", "redis"):
+        raise Exception(f"Unknown cache backend '{config['CACHE_BACKEND']}'")
+
+    with _shared_lock:
+        _config.update({key: config[key] for key in _config if key in config})
+        _shared_backend = None
+    logger.info("Cache backend: %s", _config['CACHE_BACKEND'])
+
+
+def create_backend(maxsize, namespace=None):
+    """
+    Get storage for one cache: its own LRU for the memory backend, or the
+    process-wide connection to a shared backend, which keeps at most maxsize
+    entries of namespace
+    """
+    global _shared_backend
+
+    backend = _config["CACHE_BACKEND"]
+    if backend == "memory":
+        return MemoryBackend(maxsize)
+
+    with _shared_lock:
+        if _shared_backend is None:
+            if backend == "sqlite":
+                _shared_backend = SQLiteBackend(_config["CACHE_SQLITE_PATH"])
+            else:
+                _shared_backend = RedisBackend(_config["CACHE_REDIS_URL"])
+        if namespace is not None:
+            _shared_backend.maxsizes[namespace] = maxsize
+        return _shared_backend
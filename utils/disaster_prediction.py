@@ -1,55 +1,38 @@
 import requests
 import logging
-import random
+import os
 from datetime import datetime, timedelta
+from utils import http_client
+from utils.metrics import timed
+from utils.weather_api import get_all_weather_arrays
+# Seasons of India by month, the seasons each disaster type is more likely in,
+# each city's susceptibility, and descriptions and precautions by disaster type
+from utils.reference_data import (
+    SEASONS, HAZARD_SEASONS as SEASONAL_DISASTERS, CITY_HAZARDS as REGIONAL_DISASTERS,
+    DISASTER_DESCRIPTIONS, DISASTER_PRECAUTIONS, SEVERITY_LEVELS
+)
 
 logger = logging.getLogger(__name__)
 
-# Mapping of seasons to months in India
-SEASONS = {
-    "Winter": [1, 2],
-    "Summer": [3, 4, 5],
-    "Monsoon": [6, 7, 8, 9],
-    "Post-Monsoon": [10, 11],
-    "Pre-Winter": [12]
-}
+# ReliefWeb API root; overridable to point at a local stub upstream
+RELIEFWEB_API_URL = os.environ.get("RELIEFWEB_API_URL", "https://api.reliefweb.int/v1")
 
-# Mapping of disaster types to seasons when they're more likely
-SEASONAL_DISASTERS = {
-    "Flood": ["Monsoon"],
-    "Cyclone": ["Monsoon", "Post-Monsoon"],
-    "Drought": ["Summer"],
-    "Heat Wave": ["Summer"],
-    "Cold Wave": ["Winter"],
-    "Landslide": ["Monsoon"],
-    "Forest Fire": ["Summer"],
-    "Urban Flooding": ["Monsoon"]
-}
+# Month number -> season, built once from SEASONS
+SEASON_BY_MONTH = {month: season for season, months in SEASONS.items() for month in months}
 
-# Regional disaster susceptibility
-REGIONAL_DISASTERS = {
-    "Mumbai": ["Flood", "Urban Flooding", "Cyclone"],
-    "Delhi": ["Heat Wave", "Cold Wave", "Urban Flooding"],
-    "Bangalore": ["Drought", "Urban Flooding"],
-    "Hyderabad": ["Flood", "Heat Wave"],
-    "Chennai": ["Flood", "Cyclone", "Urban Flooding"],
-    "Kolkata": ["Flood", "Cyclone"],
-    "Pune": ["Landslide", "Flood"],
-    "Ahmedabad": ["Heat Wave", "Flood"],
-    "Jaipur": ["Heat Wave", "Drought"],
-    "Surat": ["Flood", "Cyclone"],
-    "Lucknow": ["Flood", "Heat Wave", "Cold Wave"],
-    "Kanpur": ["Flood", "Heat Wave", "Cold Wave"],
-    "Nagpur": ["Heat Wave", "Drought"],
-    "Indore": ["Heat Wave"],
-    "Thane": ["Flood", "Landslide"],
-    "Bhopal": ["Flood"],
-    "Visakhapatnam": ["Cyclone", "Flood"],
-    "Patna": ["Flood"],
-    "Vadodara": ["Flood"],
-    "Ghaziabad": ["Urban Flooding", "Heat Wave", "Cold Wave"]
+# Disaster type -> seasons it is more likely in, as sets for constant-time checks
+SEASONAL_DISASTER_SETS = {
+    disaster_type: frozenset(seasons) for disaster_type, seasons in SEASONAL_DISASTERS.items()
 }
 
+# Used for disaster types without descriptions or precautions of their own
+_UNKNOWN_DESCRIPTIONS = ("Unknown disaster type",) * SEVERITY_LEVELS
+_GENERAL_PRECAUTIONS = ("Follow general safety instructions",)
+
+# Predictions at or below this probability are not reported
+MIN_REPORTED_PROBABILITY = 0.3
+
+@timed("predict_disasters")
 def predict_disasters(city):
     """
     Predict potential disasters for a city based on historical patterns,
@@ -58,69 +41,138 @@ def predict_disasters(city):
     if city not in REGIONAL_DISASTERS:
         raise ValueError(f"City '{city}' is not supported")
     
-    # Get current month to determine season
-    current_month = datetime.now().month
-    current_season = None
-    for season, months in SEASONS.items():
-        if current_month in months:
-            current_season = season
-            break
+    return predict_all_disasters([city])[city]
+
+def predict_all_disasters(cities=None):
+    """
+    Predict potential disasters for several cities in one pass
     
-    predictions = []
+    Args:
+        cities: City names to predict for (default: every supported city)
+        
+    Returns:
+        dict: City name mapped to its list of predictions
+    """
+    now = datetime.now()
+    scores = score_disasters(cities, now)
     
-    # Get disasters that the city is susceptible to
-    susceptible_disasters = REGIONAL_DISASTERS.get(city, [])
+    all_predictions = {}
+    for city, city_scores in scores.items():
+        all_predictions[city] = [
+            build_prediction(city, score["disaster_type"], score["probability"], score["severity"],
+                             now, now + timedelta(days=score["valid_days"]))
+            for score in city_scores
+            if score["probability"] > MIN_REPORTED_PROBABILITY
+        ]
     
-    for disaster_type in susceptible_disasters:
-        # Check if the disaster is seasonal and more likely in the current season
-        is_seasonal = False
-        for season in SEASONAL_DISASTERS.get(disaster_type, []):
-            if season == current_season:
-                is_seasonal = True
-                break
-        
-        # Calculate probability based on seasonality
-        if is_seasonal:
-            probability = random.uniform(0.6, 0.9)  # Higher probability in appropriate season
-            severity = random.randint(3, 5)
-        else:
-            probability = random.uniform(0.1, 0.4)  # Lower probability out of season
-            severity = random.randint(1, 3)
-        
-        # For demonstration purposes, adjust some probabilities based on known patterns
-        # In a real application, this would be based on actual prediction models
-        if disaster_type == "Flood" and current_season == "Monsoon":
-            probability = random.uniform(0.7, 0.95)
-            severity = random.randint(4, 5)
-        elif disaster_type == "Heat Wave" and current_season == "Summer":
-            probability = random.uniform(0.8, 0.95)
-            severity = random.randint(3, 5)
-        elif disaster_type == "Cyclone" and current_season in ["Monsoon", "Post-Monsoon"]:
-            probability = random.uniform(0.6, 0.85)
-            severity = random.randint(3, 5)
+    return all_predictions
+
+# Risk model over every supported city, built from the tables above on first
+# use, so that starting the app does not import numpy
+_risk_model = None
+
+def get_risk_model():
+    """
+    Get the risk model, building it on first use
+    """
+    global _risk_model
+    if _risk_model is None:
+        from utils.risk_scoring import RiskModel
+        _risk_model = RiskModel(REGIONAL_DISASTERS.keys(), REGIONAL_DISASTERS, SEASONAL_DISASTERS, SEASON_BY_MONTH)
+    return _risk_model
+
+def load_weather_inputs():
+    """
+    Get the Open-Meteo arrays predictions are scored from, or None if they
+    cannot be fetched, in which case only seasonal and regional priors apply
+    """
+    try:
+        return get_all_weather_arrays()
+    except Exception as e:
+        logger.warning("Scoring disasters without weather data: %s", e)
+        return None
+
+def get_prediction_inputs_key(now=None, weather=None):
+    """
+    Identify the inputs predictions are computed from; a stored prediction
+    computed under a different key is out of date
+    """
+    now = now or datetime.now()
+    weather_version = weather.get("version") if weather else "none"
+    return f"season={SEASON_BY_MONTH.get(now.month)};weather={weather_version}"
+
+@timed("score_disasters")
+def score_disasters(cities=None, now=None, weather=None):
+    """
+    Score every disaster type for each city from the weather forecast,
+    current season, and regional susceptibility, including types too
+    unlikely to report
+    
+    Args:
+        cities: City names to score (default: every supported city)
+        now: Time to score at (default: now)
+        weather: Arrays from get_all_weather_arrays (default: fetched)
         
-        # Add prediction if probability is significant
-        if probability > 0.3:
-            valid_days = random.randint(5, 14)  # Prediction valid for 5-14 days
-            predictions.append({
-                "disaster_type": disaster_type,
-                "location": city,
-                "probability": round(probability, 2),
-                "severity": severity,
-                "prediction_date": datetime.now().strftime("%Y-%m-%d"),
-                "valid_until": (datetime.now() + timedelta(days=valid_days)).strftime("%Y-%m-%d"),
-                "description": get_disaster_description(disaster_type, severity),
-                "precautions": get_disaster_precautions(disaster_type)
-            })
+    Returns:
+        dict: City name mapped to a list of dicts with disaster_type,
+        probability, severity and valid_days
+    """
+    if cities is None:
+        cities = REGIONAL_DISASTERS.keys()
+    for city in cities:
+        if city not in REGIONAL_DISASTERS:
+            raise ValueError(f"City '{city}' is not supported")
+    
+    now = now or datetime.now()
+    if weather is None:
+        weather = load_weather_inputs()
+    
+    from utils.risk_scoring import HAZARDS
     
-    return predictions
+    # Every city and hazard is scored in one vectorized pass
+    risk_model = get_risk_model()
+    signals = risk_model.signals_for(weather)
+    probabilities, severities = risk_model.score(signals, now.month)
+    probabilities = probabilities.round(2).tolist()
+    severities = severities.tolist()
+    valid_days = risk_model.valid_days.tolist()
+    
+    scores = {}
+    for city in cities:
+        row = risk_model.city_index[city]
+        scores[city] = [
+            {
+                "disaster_type": hazard,
+                "probability": probabilities[row][column],
+                "severity": severities[row][column],
+                "valid_days": valid_days[column]
+            }
+            for column, hazard in enumerate(HAZARDS)
+        ]
+    
+    return scores
+
+def build_prediction(city, disaster_type, probability, severity, prediction_date, valid_until):
+    """
+    Build the prediction dict returned to callers from a scored disaster
+    """
+    return {
+        "disaster_type": disaster_type,
+        "location": city,
+        "probability": probability,
+        "severity": severity,
+        "prediction_date": prediction_date.strftime("%Y-%m-%d"),
+        "valid_until": valid_until.strftime("%Y-%m-%d"),
+        "description": get_disaster_description(disaster_type, severity),
+        "precautions": get_disaster_precautions(disaster_type)
+    }
 
 def get_historical_disasters():
     """
     Fetch historical disaster data from ReliefWeb API
     Focusing on India's past disasters
     """
-    url = "https://api.reliefweb.int/v1/disasters"
+    url = f"{RELIEFWEB_API_URL}/disasters"
     params = {
         "appname": "climate-disaster-app",
         "profile": "list",
@@ -131,7 +183,7 @@ def get_historical_disasters():
     }
     
     try:
-        response = requests.get(url, params=params)
+        response = http_client.get(url, params=params)
         response.raise_for_status()
         data = response.json()
         
@@ -155,152 +207,22 @@ def get_historical_disasters():
         return disasters
     
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching historical disaster data: {str(e)}")
+        logger.error("Error fetching historical disaster data: %s", e)
         raise Exception(f"Failed to fetch historical disaster data: {str(e)}")
 
 def get_disaster_description(disaster_type, severity):
     """
     Get a description of the predicted disaster based on type and severity
     """
-    descriptions = {
-        "Flood": [
-            "Minor flooding possible in low-lying areas",
-            "Moderate flooding expected in vulnerable areas",
-            "Significant flooding likely, affecting residential areas",
-            "Major flooding expected, potential for evacuations",
-            "Severe flooding predicted, high risk to life and property"
-        ],
-        "Cyclone": [
-            "Mild cyclonic conditions possible",
-            "Moderate cyclonic activity expected",
-            "Strong cyclone likely, prepare for heavy rain and winds",
-            "Severe cyclone expected, significant damage possible",
-            "Catastrophic cyclone predicted, extreme danger to life and property"
-        ],
-        "Drought": [
-            "Mild water scarcity possible",
-            "Moderate drought conditions expected",
-            "Significant drought likely, affecting agriculture",
-            "Severe drought expected, water rationing possible",
-            "Extreme drought predicted, widespread crop failure likely"
-        ],
-        "Earthquake": [
-            "Minor tremors possible",
-            "Moderate seismic activity expected",
-            "Significant earthquake likely, prepare for aftershocks",
-            "Major earthquake expected, significant damage possible",
-            "Catastrophic earthquake predicted, extreme damage likely"
-        ],
-        "Landslide": [
-            "Minor soil movement possible in hilly areas",
-            "Moderate landslide risk in vulnerable areas",
-            "Significant landslides likely in multiple locations",
-            "Major landslides expected, evacuations may be necessary",
-            "Catastrophic landslides predicted, extreme danger in hilly regions"
-        ],
-        "Heat Wave": [
-            "Slightly above average temperatures expected",
-            "Moderate heat wave conditions likely",
-            "Significant heat wave expected, take precautions",
-            "Severe heat wave predicted, high risk to vulnerable populations",
-            "Extreme heat wave, life-threatening conditions likely"
-        ],
-        "Cold Wave": [
-            "Slightly below average temperatures expected",
-            "Moderate cold wave conditions likely",
-            "Significant cold wave expected, take precautions",
-            "Severe cold wave predicted, high risk to vulnerable populations",
-            "Extreme cold wave, life-threatening conditions likely"
-        ],
-        "Urban Flooding": [
-            "Minor urban flooding possible in low-lying areas",
-            "Moderate urban flooding expected, traffic disruptions likely",
-            "Significant urban flooding likely, affecting residential areas",
-            "Major urban flooding expected, potential for evacuations",
-            "Severe urban flooding predicted, high risk in metropolitan areas"
-        ],
-        "Forest Fire": [
-            "Low risk of isolated forest fires",
-            "Moderate forest fire conditions developing",
-            "Significant forest fire risk, multiple outbreaks possible",
-            "High forest fire danger, large-scale fires possible",
-            "Extreme forest fire conditions, catastrophic spread likely"
-        ]
-    }
-    
     # Adjust severity to 0-4 index for the descriptions list
-    severity_index = min(severity - 1, 4)
+    severity_index = min(severity - 1, SEVERITY_LEVELS - 1)
     
-    return descriptions.get(disaster_type, ["Unknown disaster type"])[severity_index]
+    return DISASTER_DESCRIPTIONS.get(disaster_type, _UNKNOWN_DESCRIPTIONS)[severity_index]
 
 def get_disaster_precautions(disaster_type):
     """
     Get precautionary measures for different disaster types
-    """
-    precautions = {
-        "Flood": [
-            "Move to higher ground immediately if instructed",
-            "Avoid walking or driving through flood waters",
-            "Prepare an emergency kit with essential items",
-            "Follow evacuation orders from local authorities",
-            "Turn off utilities at the main switches before evacuating"
-        ],
-        "Cyclone": [
-            "Secure loose items around your home",
-            "Stay indoors during the cyclone",
-            "Keep emergency supplies ready",
-            "Listen to radio or TV for updates",
-            "Evacuate if instructed by authorities"
-        ],
-        "Drought": [
-            "Conserve water at home and work",
-            "Follow water usage restrictions",
-            "Use drought-resistant plants in landscaping",
-            "Harvest rainwater if possible",
-            "Report water leaks to authorities"
-        ],
-        "Earthquake": [
-            "Drop, cover, and hold on during shaking",
-            "Stay away from windows and exterior walls",
-            "If outdoors, move to an open area away from buildings",
-            "Be prepared for aftershocks",
-            "Check for injuries and damage after the earthquake"
-        ],
-        "Landslide": [
-            "Be alert for unusual sounds that might indicate moving debris",
-            "Evacuate if instructed by authorities",
-            "Avoid areas prone to landslides",
-            "Watch for flooding which may accompany landslides",
-            "Contact local officials if you notice land movement"
-        ],
-        "Heat Wave": [
-            "Stay in air-conditioned areas when possible",
-            "Drink plenty of fluids, especially water",
-            "Avoid strenuous activities during peak heat",
-            "Wear lightweight, light-colored clothing",
-            "Check on elderly neighbors and relatives"
-        ],
-        "Cold Wave": [
-            "Stay indoors during extreme cold",
-            "Layer clothing to stay warm",
-            "Keep emergency heating equipment and supplies",
-            "Protect pipes from freezing",
-            "Check on elderly neighbors and relatives"
-        ],
-        "Urban Flooding": [
-            "Move to higher floors in buildings",
-            "Avoid driving or walking through flooded streets",
-            "Be cautious around electrical equipment in flooded areas",
-            "Follow evacuation orders",
-            "Be aware of contaminated water"
-        ],
-        "Forest Fire": [
-            "Evacuate immediately if instructed",
-            "Create defensible space around your home",
-            "Have an emergency kit ready",
-            "Monitor local news for updates",
-            "Keep windows and doors closed to prevent smoke inhalation"
-        ]
-    }
     
-    return precautions.get(disaster_type, ["Follow general safety instructions"])
+    Returns a shared, read-only tuple.
+    """
+    return DISASTER_PRECAUTIONS.get(disaster_type, _GENERAL_PRECAUTIONS)
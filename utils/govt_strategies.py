@@ -1,10 +1,39 @@
 import requests
 import logging
 import os
+import time
+import threading
+import contextvars
 from datetime import datetime
+from types import MappingProxyType
+from utils import http_client
+from utils.cache import TTLCache
+# Default strategy texts by disaster type, and for types without specific ones
+from utils.reference_data import STRATEGY_TEXTS, GENERIC_STRATEGY_TEXTS
 
 logger = logging.getLogger(__name__)
 
+# ReliefWeb API root; overridable to point at a local stub upstream
+RELIEFWEB_API_URL = os.environ.get("RELIEFWEB_API_URL", "https://api.reliefweb.int/v1")
+
+# ReliefWeb guideline documents change rarely; cache them per disaster type
+STRATEGY_CACHE_TTL = int(os.environ.get("STRATEGY_CACHE_TTL", str(6 * 60 * 60)))
+strategy_cache = TTLCache("strategies", maxsize=64, default_ttl=STRATEGY_CACHE_TTL)
+
+# Longest a request waits for ReliefWeb when nothing is cached for a disaster
+# type; after that the defaults are returned and the fetch finishes in the
+# background
+STRATEGY_FETCH_BUDGET = float(os.environ.get("STRATEGY_FETCH_BUDGET", "1.5"))
+
+# Lowercased disaster types with built-in strategies; only these have their
+# ReliefWeb guidelines fetched, so arbitrary types in requests cannot start
+# background threads and upstream calls
+KNOWN_TYPE_QUERIES = frozenset(disaster_type.lower() for disaster_type in STRATEGY_TEXTS)
+
+# Disaster type query -> Event set when its background refresh finishes
+_refreshing = {}
+_refresh_lock = threading.Lock()
+
 def get_disaster_strategies(disaster_type):
     """
     Get government strategies and response guidelines for a specific disaster type
@@ -16,31 +45,100 @@ def get_disaster_strategies(disaster_type):
     Returns:
         list: Strategies and guidelines for the disaster type
     """
+    return get_versioned_disaster_strategies(disaster_type)[0]
+
+def get_versioned_disaster_strategies(disaster_type):
+    """
+    Get strategies like get_disaster_strategies, with the expiry of the
+    cached ReliefWeb results they include
+    
+    Returns:
+        tuple: (strategies, expires_at), where expires_at is None when only
+        default strategies could be served; it changes whenever the ReliefWeb
+        results are reloaded
+    """
     # Normalize disaster type for API query
     disaster_type_query = disaster_type.lower()
+    default_strategies = get_default_strategies(disaster_type)
+    if disaster_type_query not in KNOWN_TYPE_QUERIES:
+        return default_strategies, None
     
-    # First try to get strategies from ReliefWeb API
-    try:
-        reliefweb_strategies = get_reliefweb_strategies(disaster_type_query)
-        
-        # If we got meaningful strategies, return them
-        if reliefweb_strategies and len(reliefweb_strategies) > 0:
-            # Add default strategies to the beginning
-            return get_default_strategies(disaster_type) + reliefweb_strategies
-        
-        # If no strategies found from API, fall back to default strategies
-        return get_default_strategies(disaster_type)
+    # Serve cached ReliefWeb strategies, reloading expired ones in the background
+    cached = strategy_cache.peek(disaster_type_query)
+    if cached is None or cached[1] <= time.time():
+        refresh_done = _start_background_refresh(disaster_type_query)
+        if cached is None:
+            # Nothing to serve yet: wait for ReliefWeb, but only up to the budget
+            if not refresh_done.wait(STRATEGY_FETCH_BUDGET):
+                logger.warning("ReliefWeb strategies for %s not ready within %ss, serving defaults", disaster_type, STRATEGY_FETCH_BUDGET)
+            cached = strategy_cache.peek(disaster_type_query)
+    
+    if cached is None:
+        return default_strategies, None
+    
+    # Add default strategies to the beginning
+    return default_strategies + cached[0], cached[1]
+
+def _start_background_refresh(disaster_type_query):
+    """
+    Reload the ReliefWeb strategies for a disaster type in a daemon thread,
+    unless a reload is already running
+    
+    Returns:
+        threading.Event: Set when the reload finishes
+    """
+    from flask import current_app, has_app_context
+    
+    with _refresh_lock:
+        refresh_done = _refreshing.get(disaster_type_query)
+        if refresh_done is not None:
+            return refresh_done
+        refresh_done = _refreshing[disaster_type_query] = threading.Event()
+    
+    # Fetched guidelines are added to the search index when the database is at hand
+    app = current_app._get_current_object() if has_app_context() else None
+    
+    def refresh():
+        try:
+            strategy_cache.get_or_load(
+                disaster_type_query,
+                lambda: _load_reliefweb_strategies(disaster_type_query, app)
+            )
+        except Exception as e:
+            logger.error("Error fetching government strategies: %s", e)
+        finally:
+            with _refresh_lock:
+                _refreshing.pop(disaster_type_query, None)
+            refresh_done.set()
+    
+    # Logged with the ID of the request that triggered the reload
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(refresh,), name="strategy-refresh", daemon=True).start()
+    return refresh_done
+
+def _load_reliefweb_strategies(disaster_type_query, app):
+    """
+    Fetch ReliefWeb strategies and, given the Flask app, store them for search
+    """
+    strategies = get_reliefweb_strategies(disaster_type_query)
     
-    except Exception as e:
-        logger.error(f"Error fetching government strategies: {str(e)}")
-        # Fall back to default strategies on error
-        return get_default_strategies(disaster_type)
+    if app is not None and strategies:
+        from app import db
+        from utils.search_index import store_documents, guideline_document
+        try:
+            with app.app_context():
+                store_documents([guideline_document(disaster_type_query.title(), strategy) for strategy in strategies])
+                db.session.commit()
+        except Exception as e:
+            logger.error("Error indexing ReliefWeb strategies for search: %s", e)
+    
+    return strategies
 
 def get_reliefweb_strategies(disaster_type_query):
     """
     Fetch disaster response strategies from ReliefWeb API
     """
-    url = "https://api.reliefweb.int/v1/reports"
+    url = f"{RELIEFWEB_API_URL}/reports"
     params = {
         "appname": "climate-disaster-app",
         "profile": "list",
@@ -51,7 +149,7 @@ def get_reliefweb_strategies(disaster_type_query):
     }
     
     try:
-        response = requests.get(url, params=params)
+        response = http_client.get(url, params=params)
         response.raise_for_status()
         data = response.json()
         
@@ -76,289 +174,104 @@ def get_reliefweb_strategies(disaster_type_query):
         return strategies
     
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching strategies from ReliefWeb API: {str(e)}")
+        logger.error("Error fetching strategies from ReliefWeb API: %s", e)
         raise Exception(f"Failed to fetch strategies from ReliefWeb: {str(e)}")
 
-def get_default_strategies(disaster_type):
+class FrozenDict(dict):
     """
-    Provide default government strategies for different disaster types
-    Used as fallback when API data is unavailable
+    A dict that cannot be modified, so shared default strategies stay intact;
+    still serializes and renders like a plain dict
     """
-    # Common phases of disaster management
-    phases = ["Preparedness", "Response", "Recovery", "Mitigation"]
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Default strategies are read-only; copy them with dict() first")
     
-    # Default strategies for different disaster types
-    strategies = {
-        "Flood": [
-            {
-                "title": "National Flood Response Protocol",
-                "body": "The National Disaster Management Authority (NDMA) recommends immediate evacuation of low-lying areas, deployment of NDRF teams, and establishment of relief camps with essential supplies. State governments should activate District Disaster Management Authorities (DDMAs) to coordinate local response.",
-                "phase": "Response",
-                "authority": "National Disaster Management Authority (NDMA)"
-            },
-            {
-                "title": "Flood Early Warning System Protocol",
-                "body": "The Central Water Commission (CWC) provides flood forecasting services. State governments should monitor water levels, issue timely warnings through multiple channels, and prepare for evacuations in vulnerable areas.",
-                "phase": "Preparedness",
-                "authority": "Central Water Commission (CWC)"
-            },
-            {
-                "title": "Post-Flood Recovery Guidelines",
-                "body": "After floodwaters recede, authorities should conduct damage assessment, provide compensation to affected families, restore infrastructure, and implement disease prevention measures to prevent waterborne illnesses.",
-                "phase": "Recovery",
-                "authority": "Ministry of Home Affairs"
-            },
-            {
-                "title": "Flood Mitigation Framework",
-                "body": "Long-term flood mitigation includes construction of embankments and levees, improvement of drainage systems, watershed management, and implementation of flood plain zoning regulations to prevent encroachment.",
-                "phase": "Mitigation",
-                "authority": "National Disaster Management Authority (NDMA)"
-            }
-        ],
-        "Cyclone": [
-            {
-                "title": "National Cyclone Risk Mitigation Project",
-                "body": "This project aims to reduce vulnerability of coastal communities to cyclones through early warning systems, evacuation shelters, and coastal embankments. States should ensure regular drills and awareness programs.",
-                "phase": "Preparedness",
-                "authority": "National Disaster Management Authority (NDMA)"
-            },
-            {
-                "title": "Cyclone Evacuation Protocol",
-                "body": "Upon cyclone warning, authorities should evacuate vulnerable coastal populations to designated cyclone shelters, deploy emergency response teams, and ensure essential supplies for at least 72 hours.",
-                "phase": "Response",
-                "authority": "State Disaster Management Authorities"
-            },
-            {
-                "title": "Post-Cyclone Damage Assessment Guidelines",
-                "body": "After cyclone passage, conduct immediate aerial surveys, restore communication networks, clear debris, and provide emergency medical assistance to affected populations.",
-                "phase": "Recovery",
-                "authority": "Ministry of Home Affairs"
-            },
-            {
-                "title": "Cyclone Resistant Infrastructure Standards",
-                "body": "All coastal structures should comply with BIS standards for wind resistance. Government buildings in cyclone-prone areas must be constructed as multi-purpose cyclone shelters.",
-                "phase": "Mitigation",
-                "authority": "Bureau of Indian Standards (BIS)"
-            }
-        ],
-        "Drought": [
-            {
-                "title": "Manual for Drought Management",
-                "body": "This comprehensive manual outlines procedures for declaration of drought, implementation of relief measures, and coordination mechanisms between central and state authorities.",
-                "phase": "Response",
-                "authority": "Ministry of Agriculture & Farmers Welfare"
-            },
-            {
-                "title": "National Water Conservation Strategy",
-                "body": "States should implement watershed development programs, rainwater harvesting, and promote drought-resistant crops. The Mahatma Gandhi National Rural Employment Guarantee Act (MGNREGA) should be leveraged for water conservation works.",
-                "phase": "Mitigation",
-                "authority": "Ministry of Jal Shakti"
-            },
-            {
-                "title": "Drought Monitoring Framework",
-                "body": "The India Meteorological Department (IMD) and state agriculture departments should monitor rainfall deficiency, reservoir levels, groundwater status, and crop conditions to provide early warnings of drought conditions.",
-                "phase": "Preparedness",
-                "authority": "India Meteorological Department (IMD)"
-            },
-            {
-                "title": "Drought Relief Implementation Guidelines",
-                "body": "During declared droughts, authorities should ensure drinking water supply through tankers, provide fodder for livestock, implement food security measures, and offer employment through MGNREGA.",
-                "phase": "Response",
-                "authority": "State Relief Commissioners"
-            }
-        ],
-        "Earthquake": [
-            {
-                "title": "National Earthquake Response Protocol",
-                "body": "Immediate deployment of Urban Search and Rescue Teams, establishment of Emergency Operations Centers, and activation of medical response teams. The protocol includes building damage assessment and categorization procedures.",
-                "phase": "Response",
-                "authority": "National Disaster Management Authority (NDMA)"
-            },
-            {
-                "title": "Earthquake Preparedness Guidelines",
-                "body": "Conducts regular mock drills, structural assessments of critical infrastructure, and public awareness campaigns on earthquake safety. Maintain emergency supplies and develop family emergency plans.",
-                "phase": "Preparedness",
-                "authority": "NDMA and State Disaster Management Authorities"
-            },
-            {
-                "title": "Post-Earthquake Reconstruction Policy",
-                "body": "Framework for reconstruction with earthquake-resistant designs, financial assistance schemes for affected families, and guidelines for transitional shelter arrangements.",
-                "phase": "Recovery",
-                "authority": "Ministry of Housing and Urban Affairs"
-            },
-            {
-                "title": "National Building Code - Seismic Provisions",
-                "body": "Mandatory implementation of seismic codes in construction, seismic microzonation of urban areas, and retrofitting of existing critical infrastructure in high-risk zones.",
-                "phase": "Mitigation",
-                "authority": "Bureau of Indian Standards (BIS)"
-            }
-        ],
-        "Landslide": [
-            {
-                "title": "National Landslide Risk Management Strategy",
-                "body": "Comprehensive approach to landslide risk assessment, early warning systems in vulnerable hill areas, and regulation of construction activities on steep slopes.",
-                "phase": "Preparedness",
-                "authority": "Geological Survey of India (GSI)"
-            },
-            {
-                "title": "Landslide Response Guidelines",
-                "body": "Protocols for immediate search and rescue operations, temporary relocation of affected communities, and restoration of critical infrastructure like roads and communication networks.",
-                "phase": "Response",
-                "authority": "National Disaster Response Force (NDRF)"
-            },
-            {
-                "title": "Hill Area Development Program",
-                "body": "Long-term strategy for sustainable development in landslide-prone regions, including afforestation, proper drainage systems, and slope stabilization measures.",
-                "phase": "Mitigation",
-                "authority": "Ministry of Environment, Forest and Climate Change"
-            },
-            {
-                "title": "Guidelines for Reconstruction in Landslide Affected Areas",
-                "body": "Technical specifications for rebuilding in affected areas, relocation policies for highly vulnerable settlements, and land-use planning to minimize future risks.",
-                "phase": "Recovery",
-                "authority": "State Disaster Management Authorities"
-            }
-        ],
-        "Heat Wave": [
-            {
-                "title": "National Action Plan on Heat Related Illnesses",
-                "body": "Comprehensive strategy for prevention and management of heat-related illnesses, including public cooling centers, emergency medical protocols, and vulnerable population identification.",
-                "phase": "Response",
-                "authority": "Ministry of Health and Family Welfare"
-            },
-            {
-                "title": "Heat Wave Guidelines for States",
-                "body": "Framework for declaring heat waves, color-coded alert system, and standard operating procedures for different departments during extreme heat events.",
-                "phase": "Preparedness",
-                "authority": "National Disaster Management Authority (NDMA)"
-            },
-            {
-                "title": "Cool Roof Program",
-                "body": "Implementation of cool roofs in public buildings, incentives for private adoption, and urban planning guidelines to reduce urban heat island effect.",
-                "phase": "Mitigation",
-                "authority": "Ministry of Housing and Urban Affairs"
-            },
-            {
-                "title": "Heat Action Plan for Vulnerable Groups",
-                "body": "Special provisions for outdoor workers, elderly, children, and pregnant women during heat waves, including work hour adjustments and targeted outreach.",
-                "phase": "Response",
-                "authority": "Ministry of Labour and Employment"
-            }
-        ],
-        "Cold Wave": [
-            {
-                "title": "Cold Wave Management Plan",
-                "body": "Guidelines for establishing warming shelters, distribution of blankets and warm clothing, and monitoring of vulnerable populations including homeless individuals.",
-                "phase": "Response",
-                "authority": "State Disaster Management Authorities"
-            },
-            {
-                "title": "Winter Preparedness Advisory",
-                "body": "Early warnings for cold wave conditions, public education on preventing cold-related illnesses, and preparation of emergency services for increased demand.",
-                "phase": "Preparedness",
-                "authority": "India Meteorological Department (IMD)"
-            },
-            {
-                "title": "Guidelines for Schools During Cold Waves",
-                "body": "Protocol for school closures, adjustment of school hours, and ensuring adequate heating in educational institutions during extreme cold conditions.",
-                "phase": "Response",
-                "authority": "Ministry of Education"
-            },
-            {
-                "title": "Cold Wave Relief Fund Utilization Guidelines",
-                "body": "Framework for allocation and utilization of funds for cold wave relief, including procurement of essential supplies and compensation for affected families.",
-                "phase": "Recovery",
-                "authority": "Ministry of Home Affairs"
-            }
-        ],
-        "Forest Fire": [
-            {
-                "title": "National Action Plan on Forest Fires",
-                "body": "Comprehensive strategy for prevention, detection, and suppression of forest fires, including use of satellite monitoring, rapid response teams, and community involvement.",
-                "phase": "Preparedness",
-                "authority": "Ministry of Environment, Forest and Climate Change"
-            },
-            {
-                "title": "Forest Fire Crisis Management Plan",
-                "body": "Standard operating procedures for various agencies during forest fire emergencies, coordination mechanisms, and resource mobilization protocols.",
-                "phase": "Response",
-                "authority": "Forest Survey of India (FSI)"
-            },
-            {
-                "title": "Forest Fire Prevention Guidelines",
-                "body": "Implementation of fire lines, controlled burning techniques, and community awareness programs in vulnerable forest areas before fire season.",
-                "phase": "Mitigation",
-                "authority": "State Forest Departments"
-            },
-            {
-                "title": "Post-Fire Ecosystem Restoration Plan",
-                "body": "Framework for assessment of ecological damage, reforestation strategies, soil conservation measures, and monitoring of recovery progress.",
-                "phase": "Recovery",
-                "authority": "Ministry of Environment, Forest and Climate Change"
-            }
-        ],
-        "Urban Flooding": [
-            {
-                "title": "Urban Flooding Standard Operating Procedure",
-                "body": "Guidelines for urban local bodies on pump deployment, drainage clearance, traffic management, and evacuation of low-lying urban areas during flooding events.",
-                "phase": "Response",
-                "authority": "Ministry of Housing and Urban Affairs"
-            },
-            {
-                "title": "Urban Drainage Design Manual",
-                "body": "Technical specifications for urban drainage systems, integration of blue-green infrastructure, and implementation of stormwater management practices.",
-                "phase": "Mitigation",
-                "authority": "Central Public Works Department (CPWD)"
-            },
-            {
-                "title": "Guidelines for Urban Flood Early Warning Systems",
-                "body": "Implementation of automated rain gauges, flood sensors, and citizen reporting systems to provide localized flood warnings in urban areas.",
-                "phase": "Preparedness",
-                "authority": "National Disaster Management Authority (NDMA)"
-            },
-            {
-                "title": "Post-Urban Flooding Disease Prevention Protocol",
-                "body": "Measures to prevent waterborne diseases after urban flooding, including water purification, vector control, and public health surveillance.",
-                "phase": "Recovery",
-                "authority": "Ministry of Health and Family Welfare"
-            }
-        ]
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+# Common phases of disaster management
+PHASES = ("Preparedness", "Response", "Recovery", "Mitigation")
+
+def _freeze_strategy(text):
+    """
+    Format a built-in strategy like an API result, as a read-only dict
+    without its date, which is added per call
+    """
+    return FrozenDict(
+        title=text.get("title"),
+        body=text.get("body"),
+        source=text.get("authority"),
+        phase=text.get("phase"),
+        type="guideline",
+        from_api=False
+    )
+
+def _build_default_strategies():
+    """
+    Build the read-only default strategy index, keyed by disaster type, and
+    the same strategies grouped by phase
+    """
+    by_type = {
+        disaster_type: tuple(_freeze_strategy(text) for text in texts)
+        for disaster_type, texts in STRATEGY_TEXTS.items()
     }
+    generic = tuple(_freeze_strategy(text) for text in GENERIC_STRATEGY_TEXTS)
+    by_phase = {
+        disaster_type: MappingProxyType({
+            phase: tuple(strategy for strategy in strategies if strategy["phase"] == phase)
+            for phase in PHASES
+        })
+        for disaster_type, strategies in by_type.items()
+    }
+    return MappingProxyType(by_type), generic, MappingProxyType(by_phase)
+
+# Built once at import; requests share these objects instead of rebuilding them
+DEFAULT_STRATEGIES, GENERIC_STRATEGIES, DEFAULT_STRATEGIES_BY_PHASE = _build_default_strategies()
+
+def default_strategies_date():
+    """
+    Date the default strategies are served with: today, in the server's time zone
+    """
+    return datetime.now().strftime("%Y-%m-%d")
+
+# (date, {key: read-only dated strategies}) for the day they were dated on;
+# keys are known disaster types and phases only, or None for generic ones
+_dated_strategies = (None, {})
+
+def _dated(key, strategies):
+    """
+    The strategies with today's date, dated once per day and shared by
+    every call on that day
+    """
+    global _dated_strategies
     
-    # If disaster type is not in our predefined list, return generic strategies
-    if disaster_type not in strategies:
-        return [
-            {
-                "title": "Generic Disaster Response Protocol",
-                "body": "The National Disaster Response Force (NDRF) should be deployed for search and rescue operations. State authorities should establish relief camps and provide essential supplies to affected populations.",
-                "phase": "Response",
-                "authority": "National Disaster Management Authority (NDMA)",
-                "type": "guideline",
-                "from_api": False,
-                "date": datetime.now().strftime("%Y-%m-%d")
-            },
-            {
-                "title": "Community-Based Disaster Management",
-                "body": "Local authorities should establish Community Disaster Response Teams, conduct regular drills, and maintain emergency supply stocks at the community level.",
-                "phase": "Preparedness",
-                "authority": "State Disaster Management Authorities",
-                "type": "guideline",
-                "from_api": False,
-                "date": datetime.now().strftime("%Y-%m-%d")
-            }
-        ]
+    date = default_strategies_date()
+    day, dated_lists = _dated_strategies
+    if day != date:
+        day, dated_lists = _dated_strategies = (date, {})
     
-    # Format the default strategies to match API response format
-    formatted_strategies = []
-    for strategy in strategies.get(disaster_type, []):
-        formatted_strategies.append({
-            "title": strategy.get("title"),
-            "body": strategy.get("body"),
-            "source": strategy.get("authority"),
-            "phase": strategy.get("phase"),
-            "type": "guideline",
-            "from_api": False,
-            "date": datetime.now().strftime("%Y-%m-%d")
-        })
+    dated = dated_lists.get(key)
+    if dated is None:
+        dated = dated_lists[key] = tuple(FrozenDict(strategy, date=date) for strategy in strategies)
+    return list(dated)
+
+def get_default_strategies(disaster_type):
+    """
+    Provide default government strategies for different disaster types
+    Used as fallback when API data is unavailable
     
-    return formatted_strategies
+    Returns a new list of shared, read-only strategy dicts with today's date.
+    """
+    # If disaster type is not in our predefined list, return generic strategies
+    if disaster_type not in DEFAULT_STRATEGIES:
+        return _dated(None, GENERIC_STRATEGIES)
+    return _dated(disaster_type, DEFAULT_STRATEGIES[disaster_type])
+
+def get_default_strategies_by_phase(disaster_type, phase):
+    """
+    Default strategies for one disaster type and management phase
+    """
+    if phase not in PHASES:
+        return []
+    phases = DEFAULT_STRATEGIES_BY_PHASE.get(disaster_type)
+    if phases is None:
+        return _dated((None, phase), [strategy for strategy in GENERIC_STRATEGIES if strategy["phase"] == phase])
+    return _dated((disaster_type, phase), phases.get(phase, ()))
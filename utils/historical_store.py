@@ -0,0 +1,239 @@
+import os
+import threading
+import contextvars
+import time
+import logging
+from datetime import datetime, timezone
+
+from utils.cache import TTLCache
+from utils.disaster_prediction import get_historical_disasters
+
+logger = logging.getLogger(__name__)
+
+# ReliefWeb's India disaster list changes a few times a day; serve the stored
+# snapshot for this long before revalidating it in the background
+HISTORICAL_FRESH_TTL = int(os.environ.get("HISTORICAL_FRESH_TTL", str(60 * 60)))
+
+# After a failed refresh, wait this long before trying ReliefWeb again
+HISTORICAL_RETRY_INTERVAL = int(os.environ.get("HISTORICAL_RETRY_INTERVAL", str(5 * 60)))
+
+# Number of records in a snapshot, matching the ReliefWeb query limit
+HISTORICAL_SNAPSHOT_SIZE = 20
+
+# The current snapshot while it is fresh, shared by every worker when the
+# cache backend is, so one worker's refresh serves them all
+snapshot_cache = TTLCache("historical_disasters", maxsize=1, default_ttl=HISTORICAL_FRESH_TTL)
+
+_snapshot = None  # list of disaster dicts, most recent first
+_snapshot_updated_at = None  # datetime of the last successful refresh
+_next_attempt_at = 0.0
+_refresh_lock = threading.Lock()
+_refreshing = False
+
+
+def get_stored_historical_disasters():
+    """
+    Get India's historical disasters from local storage; see
+    get_historical_snapshot
+    """
+    return get_historical_snapshot()[0]
+
+
+def get_historical_snapshot():
+    """
+    Get India's historical disasters from local storage
+
+    Serves the last stored snapshot immediately and, once it is older than
+    HISTORICAL_FRESH_TTL, refreshes it from ReliefWeb in a background thread
+    (stale-while-revalidate). Only an empty store makes the caller wait on
+    ReliefWeb. When ReliefWeb is down the last good snapshot keeps serving.
+
+    Must be called inside an application context.
+
+    Returns:
+        tuple: (disasters, updated_at), updated_at being the UTC datetime of
+        the refresh that produced them
+    """
+    global _snapshot, _snapshot_updated_at
+
+    fresh = snapshot_cache.get("snapshot")
+    if fresh is not None:
+        # Keep this worker's fallback copy as recent as the shared one
+        updated_at = datetime.fromisoformat(fresh["updated_at"])
+        _snapshot, _snapshot_updated_at = fresh["disasters"], updated_at
+        return fresh["disasters"], updated_at
+
+    if _snapshot is None:
+        _snapshot, _snapshot_updated_at = _load_snapshot()
+        if _snapshot is not None and not _is_stale():
+            _share_snapshot()
+
+    if _snapshot is None:
+        # Nothing stored yet, so there is nothing to serve while refreshing
+        refresh_historical_disasters()
+        return _snapshot, _snapshot_updated_at
+
+    if _is_stale():
+        _start_background_refresh()
+
+    return _snapshot, _snapshot_updated_at
+
+
+def refresh_historical_disasters():
+    """
+    Fetch the latest records from ReliefWeb and store them in DisasterRecord
+
+    Must be called inside an application context. Raises if ReliefWeb cannot
+    be reached; the stored snapshot is left untouched in that case.
+    """
+    global _snapshot, _snapshot_updated_at, _next_attempt_at
+
+    try:
+        disasters = get_historical_disasters()
+    except Exception:
+        _next_attempt_at = time.monotonic() + HISTORICAL_RETRY_INTERVAL
+        raise
+
+    updated_at = datetime.utcnow()
+    _store_disasters(disasters, updated_at)
+    _snapshot, _snapshot_updated_at = disasters, updated_at
+    _share_snapshot()
+    return disasters
+
+
+def _share_snapshot():
+    """
+    Put this worker's snapshot in snapshot_cache until it goes stale
+    """
+    age = (datetime.utcnow() - _snapshot_updated_at).total_seconds()
+    snapshot_cache.set(
+        "snapshot",
+        {"disasters": _snapshot, "updated_at": _snapshot_updated_at.isoformat()},
+        HISTORICAL_FRESH_TTL - age
+    )
+
+
+def _is_stale():
+    if time.monotonic() < _next_attempt_at:
+        return False
+    age = (datetime.utcnow() - _snapshot_updated_at).total_seconds()
+    return age > HISTORICAL_FRESH_TTL
+
+
+def _start_background_refresh():
+    """
+    Refresh the snapshot in a daemon thread, unless a refresh is already running
+    """
+    global _refreshing
+    from flask import current_app
+
+    with _refresh_lock:
+        if _refreshing:
+            return
+        _refreshing = True
+
+    app = current_app._get_current_object()
+
+    def refresh():
+        global _refreshing
+        try:
+            with app.app_context():
+                refresh_historical_disasters()
+        except Exception as e:
+            logger.warning("Background refresh of historical disasters failed, serving stored snapshot: %s", e)
+        finally:
+            with _refresh_lock:
+                _refreshing = False
+
+    # Logged with the ID of the request that found the snapshot stale
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(refresh,), name="historical-refresh", daemon=True).start()
+
+
+def _store_disasters(disasters, updated_at):
+    """
+    Upsert ReliefWeb disasters into DisasterRecord keyed on their ReliefWeb id
+    """
+    from app import db
+    from models import DisasterRecord
+    from utils.search_index import store_documents, disaster_document
+
+    source_ids = [disaster["id"] for disaster in disasters if disaster.get("id") is not None]
+    existing = {
+        record.source_id: record
+        for record in DisasterRecord.query.filter(DisasterRecord.source_id.in_(source_ids))
+    }
+
+    stored = []
+    for disaster in disasters:
+        if disaster.get("id") is None:
+            continue
+
+        record = existing.get(disaster["id"])
+        if record is None:
+            record = DisasterRecord(source_id=disaster["id"], location=disaster.get("country") or "India", severity=0)
+            db.session.add(record)
+
+        record.disaster_type = disaster.get("type") or "Unknown"
+        record.name = disaster.get("name")
+        record.description = disaster.get("description")
+        record.status = disaster.get("status")
+        record.url = disaster.get("url")
+        record.date = _parse_date(disaster.get("date")) or updated_at
+        record.updated_at = updated_at
+        stored.append(record)
+
+    store_documents([disaster_document(record) for record in stored])
+    db.session.commit()
+
+
+def _load_snapshot():
+    """
+    Load the most recent stored ReliefWeb records
+
+    Returns:
+        tuple: (disasters, updated_at), or (None, None) if nothing is stored
+    """
+    from app import db
+    from models import DisasterRecord
+
+    records = (
+        DisasterRecord.query
+        .filter(DisasterRecord.source_id.isnot(None))
+        .order_by(DisasterRecord.date.desc())
+        .limit(HISTORICAL_SNAPSHOT_SIZE)
+        .all()
+    )
+    if not records:
+        return None, None
+
+    updated_at = db.session.query(db.func.max(DisasterRecord.updated_at)).scalar()
+    return [_record_to_dict(record) for record in records], updated_at
+
+
+def _record_to_dict(record):
+    return {
+        "id": record.source_id,
+        "name": record.name,
+        "description": record.description or "",
+        "status": record.status,
+        "date": record.date.strftime("%Y-%m-%dT%H:%M:%S+00:00") if record.date else None,
+        "type": None if record.disaster_type == "Unknown" else record.disaster_type,
+        "country": record.location,
+        "url": record.url
+    }
+
+
+def _parse_date(value):
+    """
+    Parse a ReliefWeb ISO 8601 date into a naive UTC datetime
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
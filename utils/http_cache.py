@@ -0,0 +1,70 @@
+"""
+Conditional GET support for the JSON API
+
+Each endpoint passes the version of the payload it serves: the expiry of
+the cache entry it came from, the time of the refresh that produced it, or
+for small payloads built from database rows, the payload itself. The ETag
+is derived from that version, so a client whose copy is current gets a 304
+without the payload being encoded as JSON again.
+"""
+import time
+import hashlib
+from datetime import timezone
+
+from flask import request, jsonify, current_app
+
+# Changing this invalidates every ETag handed out so far, e.g. when the
+# shape of an API payload changes
+ETAG_FORMAT_VERSION = "1"
+
+
+def make_etag(version):
+    """
+    Strong ETag for a payload version of the current request's URL
+    """
+    key = f"{ETAG_FORMAT_VERSION}|{request.full_path}|{version!r}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def json_response(payload, version, max_age, last_modified=None):
+    """
+    Respond with payload as JSON, or with 304 Not Modified when the client's
+    If-None-Match (or, without it, If-Modified-Since) shows its copy is current
+
+    Args:
+        payload: The JSON-serializable response body
+        version: Anything whose repr changes whenever the payload does
+        max_age: Seconds clients may reuse the response without revalidating
+        last_modified: Optional naive UTC datetime of the payload's last change
+    """
+    etag = make_etag(version)
+    if last_modified is not None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = (
+            last_modified is not None
+            and request.if_modified_since is not None
+            and last_modified <= request.if_modified_since
+        )
+
+    if not_modified:
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max(int(max_age), 0)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def seconds_until(expires_at):
+    """
+    Seconds from now until a cache entry's expiry (a time.time() value)
+    """
+    return max(expires_at - time.time(), 0)
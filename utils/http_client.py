@@ -0,0 +1,233 @@
+import os
+import random
+import threading
+import time
+import logging
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.metrics import upstream_request_duration, upstream_errors
+
+logger = logging.getLogger(__name__)
+
+# Timeouts in seconds; the connect timeout sits just above a TCP retransmit window
+CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("UPSTREAM_READ_TIMEOUT", "10"))
+
+# Retries after the first attempt, with full-jitter exponential backoff
+MAX_RETRIES = int(os.environ.get("UPSTREAM_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.environ.get("UPSTREAM_BACKOFF_BASE", "0.25"))
+BACKOFF_MAX = float(os.environ.get("UPSTREAM_BACKOFF_MAX", "4"))
+
+# Keep-alive connections held per upstream host
+POOL_MAXSIZE = int(os.environ.get("UPSTREAM_POOL_MAXSIZE", "10"))
+
+# Consecutive failures before an upstream is short-circuited, and for how long
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("UPSTREAM_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.environ.get("UPSTREAM_BREAKER_RESET", "30"))
+
+# Status codes worth retrying: rate limiting and transient gateway errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Methods that are safe to retry without the caller opting in
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of calling an upstream whose circuit breaker is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker
+
+    After failure_threshold consecutive failures the breaker opens and calls
+    fail fast for reset_timeout seconds. One trial call is then let through;
+    success closes the breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Circuit breaker opened after %s failures", self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """
+    Pooled keep-alive session and circuit breaker for one upstream host
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.breaker = CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, pool_block=False)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.short_circuited = 0
+
+    def request(self, method, url, timeout=None, retries=None, **kwargs):
+        """
+        Send a request with timeouts, bounded retries and the circuit breaker
+
+        Non-idempotent methods are only retried when retries is given
+        explicitly. Returns the final requests.Response; callers still call
+        raise_for_status() on it.
+        """
+        if timeout is None:
+            timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+        if retries is None:
+            retries = MAX_RETRIES if method.upper() in IDEMPOTENT_METHODS else 0
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow_request():
+                self.short_circuited += 1
+                upstream_errors.inc(self.host, "circuit_open")
+                raise CircuitOpenError(f"Circuit open for upstream {self.host}")
+
+            self.requests += 1
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                upstream_request_duration.observe(time.perf_counter() - start, self.host, "error")
+                upstream_errors.inc(self.host, "timeout" if isinstance(e, requests.exceptions.Timeout) else "connection")
+                self.failures += 1
+                self.breaker.record_failure()
+                if attempt >= retries:
+                    raise
+                logger.warning("%s %s failed (%s), retrying", method, self.host, e)
+            except BaseException:
+                # Any other failure (an invalid URL, a truncated or undecodable
+                # body, an interrupt) still counts, so a half-open trial is
+                # always resolved and the breaker never stays stuck half open
+                upstream_request_duration.observe(time.perf_counter() - start, self.host, "error")
+                upstream_errors.inc(self.host, "other")
+                self.failures += 1
+                self.breaker.record_failure()
+                raise
+            else:
+                elapsed = time.perf_counter() - start
+                upstream_request_duration.observe(elapsed, self.host, f"{response.status_code // 100}xx")
+                logger.debug("%s %s returned %s in %.1f ms", method, self.host, response.status_code, elapsed * 1000)
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                else:
+                    upstream_errors.inc(self.host, "status")
+                    self.failures += 1
+                    self.breaker.record_failure()
+
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                    return response
+                logger.warning("%s %s returned %s, retrying", method, self.host, response.status_code)
+                response.close()
+
+            self.retries += 1
+            time.sleep(_backoff_delay(attempt))
+            attempt += 1
+
+    def stats(self):
+        return {
+            "host": self.host,
+            "breaker_state": self.breaker.state,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited
+        }
+
+
+_clients = {}
+_clients_pid = os.getpid()
+_clients_lock = threading.Lock()
+
+
+def get_client(url):
+    """
+    Get the shared client for the host of url, creating it on first use
+
+    Clients are dropped after a fork so worker processes never share
+    sockets inherited from the parent.
+    """
+    global _clients, _clients_pid
+
+    host = urlsplit(url).netloc
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients = {}
+            _clients_pid = os.getpid()
+
+        client = _clients.get(host)
+        if client is None:
+            client = UpstreamClient(host)
+            _clients[host] = client
+        return client
+
+
+def get(url, **kwargs):
+    """
+    Send a GET request through the pooled client for url's host
+    """
+    return get_client(url).request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """
+    Send a POST request through the pooled client for url's host
+    """
+    return get_client(url).request("POST", url, **kwargs)
+
+
+def get_upstream_stats():
+    """
+    Get request, retry and circuit breaker counters for every upstream host
+    """
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.host: client.stats() for client in clients}
+
+
+def _backoff_delay(attempt):
+    """
+    Full-jitter exponential backoff delay for the given retry attempt
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
@@ -4,18 +4,109 @@ import json
 import os
 import base64
 from io import BytesIO
-import traceback
+import threading
+from utils import http_client
+from utils.image_preprocessing import prepare_for_inference
 
 logger = logging.getLogger(__name__)
 
 # Hugging Face API token from environment variable
 HUGGINGFACE_API_TOKEN = os.environ.get("HUGGINGFACE_API_TOKEN", "")
 
+# Hugging Face inference API root; overridable to point at a local stub upstream
+HUGGINGFACE_API_URL = os.environ.get("HUGGINGFACE_API_URL", "https://api-inference.huggingface.co")
+
+# Inference can take a while on a cold model, so allow a longer read timeout
+INFERENCE_TIMEOUT = (
+    http_client.CONNECT_TIMEOUT,
+    float(os.environ.get("HUGGINGFACE_READ_TIMEOUT", "30"))
+)
+
 # Image classification model for disaster detection
-DISASTER_MODEL_URL = "https://api-inference.huggingface.co/models/davanstrien/disaster_types"
+DISASTER_MODEL_URL = f"{HUGGINGFACE_API_URL}/models/davanstrien/disaster_types"
 
 # General image captioning model as fallback
-CAPTION_MODEL_URL = "https://api-inference.huggingface.co/models/Salesforce/blip-image-captioning-base"
+CAPTION_MODEL_URL = f"{HUGGINGFACE_API_URL}/models/Salesforce/blip-image-captioning-base"
+
+# Where images are classified: "remote" for the Hugging Face inference API,
+# "local" for an ONNX model run on this machine's CPU (see utils.local_classifier)
+IMAGE_CLASSIFIER_BACKEND = os.environ.get("IMAGE_CLASSIFIER_BACKEND", "remote")
+
+# Classifier labels mapped to the app's disaster types, shared by all backends
+DISASTER_TYPE_MAP = {
+    "fire": "Forest Fire",
+    "flood": "Flood",
+    "earthquake": "Earthquake",
+    "cyclone": "Cyclone",
+    "landslide": "Landslide",
+    "non_disaster": "No Disaster"
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+class RemoteClassifier:
+    """
+    Classifier backend calling the Hugging Face inference API
+    """
+    name = "remote"
+    can_caption = True
+    
+    def classify(self, image_data):
+        return classify_disaster(image_data)
+    
+    def caption(self, image_data):
+        return generate_image_caption(image_data)
+
+def get_classifier_backend():
+    """
+    Get this process's classifier backend, creating it on first use so a
+    local model is loaded once per worker
+    """
+    global _backend
+    
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if IMAGE_CLASSIFIER_BACKEND == "remote":
+                    _backend = RemoteClassifier()
+                elif IMAGE_CLASSIFIER_BACKEND == "local":
+                    from utils.local_classifier import LocalClassifier
+                    _backend = LocalClassifier()
+                else:
+                    raise Exception(f"Unknown image classifier backend '{IMAGE_CLASSIFIER_BACKEND}'")
+    
+    return _backend
+
+def get_model_version():
+    """
+    Identify the models the configured backend analyzes images with, without
+    loading them: the remote model names, or the local model file's name,
+    size and modification time
+    """
+    if IMAGE_CLASSIFIER_BACKEND == "local":
+        from utils.local_classifier import LOCAL_CLASSIFIER_MODEL
+        
+        try:
+            stat = os.stat(LOCAL_CLASSIFIER_MODEL)
+        except OSError:
+            return os.path.basename(LOCAL_CLASSIFIER_MODEL)
+        return f"{os.path.basename(LOCAL_CLASSIFIER_MODEL)}:{stat.st_size}:{int(stat.st_mtime)}"
+    
+    return ",".join(url.split("/models/", 1)[-1] for url in (DISASTER_MODEL_URL, CAPTION_MODEL_URL))
+
+def build_classification(label, score, analysis_method="classification"):
+    """
+    Build an analysis result from a classifier's top label and score
+    """
+    disaster_type = DISASTER_TYPE_MAP.get(label.lower(), "Unknown")
+    
+    return {
+        "disaster_type": disaster_type,
+        "confidence": score,
+        "description": f"The image shows signs of a {disaster_type.lower()}.",
+        "analysis_method": analysis_method
+    }
 
 def analyze_image(image_data):
     """
@@ -28,12 +119,17 @@ def analyze_image(image_data):
         dict: Analysis results including disaster type, description, etc.
     """
     try:
+        # Send the models a copy at their own resolution rather than the full upload
+        image_data = prepare_for_inference(image_data)
+        
         # First try disaster-specific classifier
-        disaster_results = classify_disaster(image_data)
+        backend = get_classifier_backend()
+        disaster_results = backend.classify(image_data)
         
-        # If classification confidence is low, use general image captioning as fallback
-        if disaster_results.get("confidence", 0) < 0.5:
-            caption_results = generate_image_caption(image_data)
+        # If classification confidence is low, use general image captioning as
+        # fallback when the backend has a captioning model
+        if disaster_results.get("confidence", 0) < 0.5 and backend.can_caption:
+            caption_results = backend.caption(image_data)
             
             # Try to infer disaster type from caption
             disaster_type = infer_disaster_from_caption(caption_results.get("caption", ""))
@@ -48,8 +144,7 @@ def analyze_image(image_data):
         return disaster_results
     
     except Exception as e:
-        logger.error(f"Error in image analysis: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.error("Error in image analysis: %s", e, exc_info=True)
         
         # Return a fallback response
         return {
@@ -68,10 +163,13 @@ def classify_disaster(image_data):
     }
     
     try:
-        response = requests.post(
+        # Inference is idempotent, so retry through cold-start 503s
+        response = http_client.post(
             DISASTER_MODEL_URL,
             headers=headers,
-            data=image_data
+            data=image_data,
+            timeout=INFERENCE_TIMEOUT,
+            retries=http_client.MAX_RETRIES
         )
         response.raise_for_status()
         
@@ -83,23 +181,7 @@ def classify_disaster(image_data):
             sorted_results = sorted(results, key=lambda x: x.get("score", 0), reverse=True)
             top_result = sorted_results[0]
             
-            disaster_type_map = {
-                "fire": "Forest Fire",
-                "flood": "Flood",
-                "earthquake": "Earthquake",
-                "cyclone": "Cyclone",
-                "landslide": "Landslide",
-                "non_disaster": "No Disaster"
-            }
-            
-            disaster_type = disaster_type_map.get(top_result.get("label", "").lower(), "Unknown")
-            
-            return {
-                "disaster_type": disaster_type,
-                "confidence": top_result.get("score", 0),
-                "description": f"The image shows signs of a {disaster_type.lower()}.",
-                "analysis_method": "classification"
-            }
+            return build_classification(top_result.get("label", ""), top_result.get("score", 0))
         
         # If results are empty or not in expected format
         return {
@@ -110,7 +192,7 @@ def classify_disaster(image_data):
         }
     
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error in disaster classification API call: {str(e)}")
+        logger.error("Error in disaster classification API call: %s", e)
         raise Exception(f"Failed to classify image: {str(e)}")
 
 def generate_image_caption(image_data):
@@ -122,10 +204,13 @@ def generate_image_caption(image_data):
     }
     
     try:
-        response = requests.post(
+        # Inference is idempotent, so retry through cold-start 503s
+        response = http_client.post(
             CAPTION_MODEL_URL,
             headers=headers,
-            data=image_data
+            data=image_data,
+            timeout=INFERENCE_TIMEOUT,
+            retries=http_client.MAX_RETRIES
         )
         response.raise_for_status()
         
@@ -147,7 +232,7 @@ def generate_image_caption(image_data):
         }
     
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error in image captioning API call: {str(e)}")
+        logger.error("Error in image captioning API call: %s", e)
         raise Exception(f"Failed to generate image caption: {str(e)}")
 
 def infer_disaster_from_caption(caption):
@@ -0,0 +1,121 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+
+from utils.cache import TTLCache
+from utils.image_analysis import analyze_image, get_model_version, IMAGE_CLASSIFIER_BACKEND
+from utils.image_preprocessing import INFERENCE_IMAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Results of recent uploads are also kept in the configured cache backend, so
+# repeats skip the database; ImageAnalysisCache remains the durable store
+IMAGE_RESULT_CACHE_TTL = int(os.environ.get("IMAGE_RESULT_CACHE_TTL", str(24 * 60 * 60)))
+result_cache = TTLCache("image_analysis", maxsize=1024, default_ttl=IMAGE_RESULT_CACHE_TTL)
+
+# What besides the bytes determines a result; set on first use
+_key_prefix = None
+
+
+def analysis_key(image_data):
+    """
+    SHA-256 hex digest identifying the analysis of an uploaded image: its
+    bytes, the classifier backend and model version, and the size images
+    are scaled to for inference, so that a result is never reused after
+    any of these change
+    """
+    global _key_prefix
+
+    if _key_prefix is None:
+        _key_prefix = f"{IMAGE_CLASSIFIER_BACKEND}\n{get_model_version()}\n{INFERENCE_IMAGE_SIZE}\n".encode("utf-8")
+    digest = hashlib.sha256(_key_prefix)
+    digest.update(image_data)
+    return digest.hexdigest()
+
+
+def get_cached_analysis(image_hash):
+    """
+    Get the stored analysis for an analysis_key
+
+    Returns:
+        dict: analyze_image result, or None if the image has not been analyzed
+    """
+    from models import ImageAnalysisCache
+
+    result = result_cache.get(image_hash)
+    if result is not None:
+        return result
+
+    entry = ImageAnalysisCache.query.filter_by(content_hash=image_hash).first()
+    if entry is None:
+        return None
+
+    try:
+        result = json.loads(entry.result)
+    except ValueError:
+        logger.warning("Ignoring unreadable cached analysis for image %s", image_hash[:12])
+        return None
+
+    result_cache.set(image_hash, result)
+    return result
+
+
+def store_analysis(image_hash, result):
+    """
+    Store an analysis result under its analysis_key, replacing any earlier one
+
+    Does not commit.
+    """
+    from models import ImageAnalysisCache
+    from schema import upsert_rows
+
+    upsert_rows(
+        ImageAnalysisCache,
+        [{"content_hash": image_hash, "result": json.dumps(result), "created_at": datetime.utcnow()}],
+        ["content_hash"],
+        ["result", "created_at"]
+    )
+    result_cache.set(image_hash, result)
+
+
+def analyze_image_cached(image_data):
+    """
+    Analyze an uploaded image, reusing the stored result for identical bytes
+
+    A re-upload of an image that was analyzed before by the same backend,
+    model and inference size is answered from ImageAnalysisCache without
+    calling the inference API. Failed analyses
+    are not cached, so the next upload of that image is retried.
+    Must be called inside an application context.
+
+    Returns:
+        tuple: (result, image_hash, cached) where result has the shape of
+        utils.image_analysis.analyze_image and cached is True on a hit
+    """
+    from app import db
+
+    image_hash = analysis_key(image_data)
+
+    try:
+        cached = get_cached_analysis(image_hash)
+    except Exception as e:
+        logger.warning("Could not read cached analysis for image %s: %s", image_hash[:12], e)
+        db.session.rollback()
+        cached = None
+
+    if cached is not None:
+        logger.debug("Image analysis cache hit for %s", image_hash[:12])
+        return cached, image_hash, True
+
+    result = analyze_image(image_data)
+    if "error" not in result:
+        try:
+            store_analysis(image_hash, result)
+            db.session.commit()
+        except Exception as e:
+            logger.warning("Could not cache analysis for image %s: %s", image_hash[:12], e)
+            db.session.rollback()
+
+    return result, image_hash, False
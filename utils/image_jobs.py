@@ -0,0 +1,332 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import contextvars
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.image_analysis import analyze_image
+from utils.image_cache import analysis_key, get_cached_analysis, store_analysis
+from utils.image_preprocessing import prepare_for_inference, InvalidImageError
+
+logger = logging.getLogger(__name__)
+
+# Processes analyzing queued images, per web worker
+IMAGE_ANALYSIS_WORKERS = int(os.environ.get("IMAGE_ANALYSIS_WORKERS", "2"))
+
+# Images that may be queued or in progress at once, per web worker; batches
+# that would exceed it are refused rather than buffered in memory
+IMAGE_ANALYSIS_QUEUE_SIZE = int(os.environ.get("IMAGE_ANALYSIS_QUEUE_SIZE", "100"))
+
+# Bytes of queued images held at once, per web worker. Images are queued
+# downsampled to INFERENCE_IMAGE_SIZE, typically under 100 KB each
+IMAGE_ANALYSIS_QUEUE_BYTES = int(os.environ.get("IMAGE_ANALYSIS_QUEUE_BYTES", str(32 * 1024 * 1024)))
+
+# Seconds after which a job still queued is given up on. Jobs live in the pool
+# of the web worker that queued them, so a worker that is recycled or killed
+# leaves its rows queued; past the deadline they are reported and marked as
+# failed, since the image bytes are not kept to queue them again
+IMAGE_JOB_DEADLINE = float(os.environ.get("IMAGE_JOB_DEADLINE", "600"))
+
+EXPIRED_MESSAGE = "Could not analyze the image: the analysis did not finish in time; please upload it again"
+
+# ImageAnalysis.status values
+STATUS_QUEUED = "queued"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_bytes = 0
+_next_expiry_at = 0.0
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a batch does not fit in the image analysis queue
+    """
+
+
+def _get_executor():
+    """
+    Get this process's analysis pool, creating it on first use
+
+    Workers are spawned rather than forked, so they never inherit the web
+    worker's threads, sockets or database connections. Each keeps its
+    classifier backend loaded between jobs.
+    """
+    global _executor, _executor_pid
+
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ProcessPoolExecutor(
+            max_workers=IMAGE_ANALYSIS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def submit_images(app, uploads, location=""):
+    """
+    Queue uploaded images for analysis
+
+    Each image gets an ImageAnalysis row, whose id is its job id, in the
+    queued state. Images analyzed before are completed from the result cache
+    straight away; the rest are downsampled for inference, so the queue holds
+    small copies rather than the uploads, then analyzed in the process pool
+    and their rows updated when done. Must be called inside an application
+    context.
+
+    Args:
+        app: Flask app, used to write results from the pool's callback thread
+        uploads: List of (filename, image bytes) tuples
+        location: City the images were taken in, if known
+
+    Returns:
+        tuple: (batch_id, list of job dicts as returned by analysis_to_dict)
+    """
+    global _pending, _pending_bytes, _next_expiry_at
+    from app import db
+    from models import ImageAnalysis
+
+    # Jobs of workers that have gone away are found here at most once per
+    # deadline, besides at startup; failing to mark them does not stop new uploads
+    if time.monotonic() >= _next_expiry_at:
+        _next_expiry_at = time.monotonic() + IMAGE_JOB_DEADLINE
+        try:
+            expire_stale_jobs()
+        except Exception as e:
+            logger.error("Could not expire stale image analysis jobs: %s", e)
+
+    hashes = [analysis_key(image_data) for _, image_data in uploads]
+    cached = {image_hash: get_cached_analysis(image_hash) for image_hash in set(hashes)}
+
+    # Identical images in a batch are analyzed once
+    images = {}
+    invalid = {}
+    for (_, image_data), image_hash in zip(uploads, hashes):
+        if cached[image_hash] is not None or image_hash in images or image_hash in invalid:
+            continue
+        try:
+            images[image_hash] = prepare_for_inference(image_data)
+        except InvalidImageError as e:
+            invalid[image_hash] = e
+    queued = len(images)
+    queued_bytes = sum(len(image_data) for image_data in images.values())
+
+    with _executor_lock:
+        if _pending + queued > IMAGE_ANALYSIS_QUEUE_SIZE:
+            raise QueueFullError(
+                f"Image analysis queue is full ({_pending} of {IMAGE_ANALYSIS_QUEUE_SIZE} images pending)"
+            )
+        if _pending_bytes + queued_bytes > IMAGE_ANALYSIS_QUEUE_BYTES:
+            raise QueueFullError(
+                f"Image analysis queue is full ({_pending_bytes} of {IMAGE_ANALYSIS_QUEUE_BYTES} bytes pending)"
+            )
+        _pending += queued
+        _pending_bytes += queued_bytes
+
+    batch_id = uuid.uuid4().hex
+    rows = []
+    try:
+        for (filename, _), image_hash in zip(uploads, hashes):
+            row = ImageAnalysis(
+                filename=filename,
+                location=location,
+                content_hash=image_hash,
+                batch_id=batch_id,
+                status=STATUS_QUEUED
+            )
+            if cached[image_hash] is not None:
+                _apply_result(row, cached[image_hash])
+            elif image_hash in invalid:
+                row.status = STATUS_FAILED
+                row.analysis_result = f"Could not analyze the image: {str(invalid[image_hash])}"
+            rows.append(row)
+        db.session.add_all(rows)
+        db.session.commit()
+    except Exception:
+        with _executor_lock:
+            _pending -= queued
+            _pending_bytes -= queued_bytes
+        raise
+
+    jobs = {}
+    for row in rows:
+        if row.status == STATUS_QUEUED:
+            jobs.setdefault(row.content_hash, []).append(row.id)
+
+    for image_hash, job_ids in jobs.items():
+        image_data = images[image_hash]
+        try:
+            with _executor_lock:
+                future = _get_executor().submit(analyze_image, image_data)
+        except Exception as e:
+            _finish_jobs(app, job_ids, image_hash, len(image_data), error=e)
+            continue
+        # Results are logged with the ID of the request that queued the batch
+        context = contextvars.copy_context()
+        future.add_done_callback(
+            lambda future, job_ids=job_ids, image_hash=image_hash, size=len(image_data), context=context:
+                context.run(_on_done, app, job_ids, image_hash, size, future)
+        )
+
+    logger.info("Queued image batch %s: %s images, %s to analyze", batch_id, len(rows), queued)
+    return batch_id, [analysis_to_dict(row) for row in rows]
+
+
+def _on_done(app, job_ids, image_hash, size, future):
+    global _executor
+
+    try:
+        result = future.result()
+    except BrokenProcessPool as e:
+        # A worker died; start a fresh pool for later jobs
+        with _executor_lock:
+            _executor = None
+        _finish_jobs(app, job_ids, image_hash, size, error=e)
+    except Exception as e:
+        _finish_jobs(app, job_ids, image_hash, size, error=e)
+    else:
+        _finish_jobs(app, job_ids, image_hash, size, result=result)
+
+
+def _finish_jobs(app, job_ids, image_hash, size, result=None, error=None):
+    """
+    Write the result for one image of size bytes to its ImageAnalysis rows
+    and the result cache
+    """
+    global _pending, _pending_bytes
+    from app import db
+    from models import ImageAnalysis
+
+    with _executor_lock:
+        _pending -= 1
+        _pending_bytes -= size
+
+    if error is None and "error" in result:
+        error = result["error"]
+
+    with app.app_context():
+        try:
+            for row in ImageAnalysis.query.filter(ImageAnalysis.id.in_(job_ids)):
+                if error is not None:
+                    row.status = STATUS_FAILED
+                    row.analysis_result = f"Could not analyze the image: {str(error)}"
+                else:
+                    _apply_result(row, result)
+            if error is not None:
+                logger.error("Image analysis jobs %s failed: %s", job_ids, error)
+            else:
+                store_analysis(image_hash, result)
+            db.session.commit()
+        except Exception as e:
+            logger.error("Could not store result of image analysis jobs %s: %s", job_ids, e)
+            db.session.rollback()
+
+
+def _apply_result(row, result):
+    row.status = STATUS_DONE
+    row.analysis_result = result.get("description", "")
+    row.disaster_type = result.get("disaster_type", "")
+    row.confidence_score = result.get("confidence", 0.0)
+
+
+def expire_stale_jobs():
+    """
+    Mark jobs queued longer than IMAGE_JOB_DEADLINE as failed
+
+    Must be called inside an application context.
+
+    Returns:
+        int: The number of jobs marked as failed
+    """
+    from app import db
+    from models import ImageAnalysis
+
+    cutoff = datetime.utcnow() - timedelta(seconds=IMAGE_JOB_DEADLINE)
+    try:
+        count = ImageAnalysis.query.filter(
+            ImageAnalysis.status == STATUS_QUEUED, ImageAnalysis.upload_date < cutoff
+        ).update({"status": STATUS_FAILED, "analysis_result": EXPIRED_MESSAGE}, synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if count:
+        logger.warning("Marked %s image analysis jobs queued for over %ss as failed", count, IMAGE_JOB_DEADLINE)
+    return count
+
+
+def get_job(job_id):
+    """
+    Get an image analysis job by id
+
+    Returns:
+        dict: As returned by analysis_to_dict, or None if there is no such job
+    """
+    from app import db
+    from models import ImageAnalysis
+
+    row = db.session.get(ImageAnalysis, job_id)
+    return analysis_to_dict(row) if row is not None else None
+
+
+def get_batch(batch_id):
+    """
+    Get every job of an uploaded batch, in upload order
+    """
+    from models import ImageAnalysis
+
+    rows = ImageAnalysis.query.filter_by(batch_id=batch_id).order_by(ImageAnalysis.id).all()
+    return [analysis_to_dict(row) for row in rows]
+
+
+def analysis_to_dict(row):
+    """
+    Serialize an ImageAnalysis row; rows from single uploads have no status
+    and count as done, and queued rows past IMAGE_JOB_DEADLINE as failed
+    even before expire_stale_jobs() has marked them
+    """
+    status = row.status or STATUS_DONE
+    description = row.analysis_result
+    if status == STATUS_QUEUED and _is_expired(row):
+        status = STATUS_FAILED
+        description = EXPIRED_MESSAGE
+
+    return {
+        "id": row.id,
+        "batch_id": row.batch_id,
+        "status": status,
+        "filename": row.filename,
+        "location": row.location,
+        "upload_date": row.upload_date.isoformat() if row.upload_date else None,
+        "disaster_type": row.disaster_type,
+        "confidence": row.confidence_score,
+        "description": description
+    }
+
+
+def _is_expired(row):
+    return row.upload_date is not None and \
+        datetime.utcnow() - row.upload_date > timedelta(seconds=IMAGE_JOB_DEADLINE)
+
+
+def get_queue_stats():
+    """
+    Pending image count and bytes, and pool size of this process
+    """
+    return {
+        "pending": _pending,
+        "capacity": IMAGE_ANALYSIS_QUEUE_SIZE,
+        "pending_bytes": _pending_bytes,
+        "capacity_bytes": IMAGE_ANALYSIS_QUEUE_BYTES,
+        "workers": IMAGE_ANALYSIS_WORKERS
+    }
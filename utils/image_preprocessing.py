@@ -0,0 +1,116 @@
+import os
+import logging
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+# Longest side, in pixels, of the image sent for inference. The classifier
+# works at 224x224 and the captioning model at 384x384, so anything larger
+# is scaled away by the model anyway. 0 sends uploads unchanged.
+INFERENCE_IMAGE_SIZE = int(os.environ.get("INFERENCE_IMAGE_SIZE", "384"))
+
+# JPEG quality of the re-encoded image
+INFERENCE_JPEG_QUALITY = int(os.environ.get("INFERENCE_JPEG_QUALITY", "90"))
+
+# Refuse images whose header claims more pixels than this (decompression bombs)
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", str(50 * 1000 * 1000)))
+
+ALLOWED_FORMATS = {"JPEG", "PNG"}
+
+# Chunk size when reading an upload stream
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class InvalidImageError(Exception):
+    """
+    Raised for uploads that are not a readable JPEG or PNG within the limits
+    """
+
+
+def read_upload(stream, max_bytes):
+    """
+    Read an upload stream in chunks, stopping as soon as it exceeds max_bytes
+
+    This does not stream the upload off the network: by the time a view
+    reads request.files, werkzeug has received the whole request, bounded by
+    MAX_CONTENT_LENGTH, and spooled each file to memory or a temporary file.
+    What it bounds is the copy made in the worker's memory. The size of a
+    spooled file is checked before any of it is read.
+
+    Returns:
+        bytes: The upload's content
+    """
+    if stream.seekable():
+        start = stream.tell()
+        size = stream.seek(0, 2) - start
+        stream.seek(start)
+        if size > max_bytes:
+            raise InvalidImageError(f"Image exceeds {max_bytes // (1024 * 1024)}MB")
+
+    chunks = []
+    size = 0
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise InvalidImageError(f"Image exceeds {max_bytes // (1024 * 1024)}MB")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def inspect_image(image_data):
+    """
+    Validate an image from its header alone, without decoding the pixels
+
+    Returns:
+        PIL.Image.Image: The lazily opened image
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        image = Image.open(BytesIO(image_data))
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidImageError(f"Not a readable image: {str(e)}")
+
+    if image.format not in ALLOWED_FORMATS:
+        raise InvalidImageError(f"Unsupported image format {image.format}; upload JPG or PNG")
+
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise InvalidImageError(f"Image is too large ({width}x{height} pixels)")
+
+    return image
+
+
+def prepare_for_inference(image_data, size=INFERENCE_IMAGE_SIZE):
+    """
+    Downsample and re-encode an upload to the resolution the models use
+
+    JPEGs are decoded directly at a reduced scale, so a full-size photo is
+    never held in memory as pixels. Images already within size are returned
+    unchanged when they are JPEGs.
+
+    Returns:
+        bytes: JPEG image whose longest side is at most size
+    """
+    from PIL import Image, ImageOps
+
+    image = inspect_image(image_data)
+    if not size or (image.format == "JPEG" and max(image.size) <= size):
+        return image_data
+
+    try:
+        # Let the JPEG decoder scale down by up to 8x while decoding
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGB")
+        image.thumbnail((size, size), Image.BILINEAR)
+
+        output = BytesIO()
+        image.save(output, format="JPEG", quality=INFERENCE_JPEG_QUALITY)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(f"Could not decode image: {str(e)}")
+
+    return output.getvalue()
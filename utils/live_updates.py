@@ -0,0 +1,277 @@
+"""
+Live weather, forecast and prediction updates over server-sent events
+
+One refresher thread per worker reads the current weather, forecast and
+disaster predictions of every city that has subscribers, through the same
+cached functions the JSON API uses, and publishes whatever changed to an
+UpdateHub. Each message is encoded once and shared by all subscribers.
+
+The hub keeps only the latest message per (city, kind). A subscriber keeps
+nothing but the ids of the messages it has sent, so a slow client is never
+backlogged; it skips straight to the latest values. Subscriber memory stays
+constant no matter how many updates are published.
+
+Holding thousands of streams open needs a cooperative server, e.g.
+`gunicorn -k gevent --worker-connections 5000 main:app` (the optional
+live-updates dependencies). Under thread or sync workers a held stream
+would tie up a worker thread, so streams there send the latest messages and
+close. EventSource then reconnects after LIVE_UPDATE_INTERVAL with its
+Last-Event-ID, which makes the stream a cheap conditional poll.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds between refresher runs, and between reconnects of non-held streams
+LIVE_UPDATE_INTERVAL = int(os.environ.get("LIVE_UPDATE_INTERVAL", "60"))
+
+# Seconds between keepalive comments on an idle stream, so that proxies do
+# not close it
+LIVE_HEARTBEAT_INTERVAL = int(os.environ.get("LIVE_HEARTBEAT_INTERVAL", "25"))
+
+# Open streams allowed per worker
+LIVE_MAX_SUBSCRIBERS = int(os.environ.get("LIVE_MAX_SUBSCRIBERS", "5000"))
+
+# "auto" holds streams open only under gevent; "hold" or "snapshot" force a mode
+LIVE_STREAM_MODE = os.environ.get("LIVE_STREAM_MODE", "auto")
+
+# Longest a non-held stream waits for a city's first messages
+SNAPSHOT_WAIT = 5.0
+
+# Cities keep being refreshed for this many seconds after their last
+# subscribe, so that non-held streams, which close straight after their
+# snapshot and reconnect every LIVE_UPDATE_INTERVAL, find new values
+LIVE_RECENT_WINDOW = 3 * LIVE_UPDATE_INTERVAL
+
+EVENT_KINDS = ("weather", "forecast", "predictions")
+
+
+class TooManySubscribersError(Exception):
+    """
+    Raised when a worker already serves LIVE_MAX_SUBSCRIBERS streams
+    """
+
+
+class UpdateHub:
+    """
+    Latest message per (city, kind), and the subscribers waiting for changes
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._messages = {}  # (city, kind) -> (event id, encoded message)
+        self._versions = {}  # (city, kind) -> version of the published payload
+        self._subscribers = {}  # city -> number of open streams
+        self._last_id = 0
+        self.published = 0
+
+    @property
+    def subscriber_count(self):
+        with self._condition:
+            return sum(self._subscribers.values())
+
+    def active_cities(self):
+        with self._condition:
+            return [city for city, count in self._subscribers.items() if count > 0]
+
+    def has_messages(self, city):
+        with self._condition:
+            return self._has_messages(city)
+
+    def _has_messages(self, city):
+        return any((city, kind) in self._messages for kind in EVENT_KINDS)
+
+    def publish(self, updates):
+        """
+        Publish (city, kind, payload, version) updates, skipping those whose
+        version matches the last one published, and wake the subscribers once
+        """
+        with self._condition:
+            changed = False
+            for city, kind, payload, version in updates:
+                if self._versions.get((city, kind)) == version:
+                    continue
+
+                # Event ids are wall-clock milliseconds, so a Last-Event-ID
+                # from another worker still orders roughly right
+                event_id = max(int(time.time() * 1000), self._last_id + 1)
+                self._last_id = event_id
+                data = json.dumps(payload, separators=(",", ":"))
+                message = f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n".encode("utf-8")
+
+                self._messages[(city, kind)] = (event_id, message)
+                self._versions[(city, kind)] = version
+                self.published += 1
+                changed = True
+
+            if changed:
+                self._condition.notify_all()
+
+    def _pending(self, city, after):
+        """
+        Messages for city newer than the event ids in after, which is updated
+        """
+        chunks = []
+        for kind in EVENT_KINDS:
+            entry = self._messages.get((city, kind))
+            if entry is not None and entry[0] > after.get(kind, 0):
+                after[kind] = entry[0]
+                chunks.append(entry[1])
+        return chunks
+
+    def stream(self, city, last_event_id=0, hold=True):
+        """
+        Generate the event stream of one subscriber
+
+        Args:
+            city: City to send updates for
+            last_event_id: Id of the last event the client received
+            hold: Keep the stream open, or close it after sending what is new
+        """
+        after = dict.fromkeys(EVENT_KINDS, last_event_id)
+        retry = (LIVE_HEARTBEAT_INTERVAL if hold else LIVE_UPDATE_INTERVAL) * 1000
+
+        with self._condition:
+            self._subscribers[city] = self._subscribers.get(city, 0) + 1
+        try:
+            yield f"retry: {retry}\n\n".encode("utf-8")
+
+            if not hold:
+                with self._condition:
+                    if not self._has_messages(city):
+                        self._condition.wait_for(lambda: self._has_messages(city), SNAPSHOT_WAIT)
+                    chunks = self._pending(city, after)
+                if chunks:
+                    yield b"".join(chunks)
+                return
+
+            while True:
+                with self._condition:
+                    chunks = self._pending(city, after)
+                    if not chunks:
+                        self._condition.wait(LIVE_HEARTBEAT_INTERVAL)
+                        chunks = self._pending(city, after)
+                yield b"".join(chunks) if chunks else b": keepalive\n\n"
+        finally:
+            with self._condition:
+                self._subscribers[city] -= 1
+                if not self._subscribers[city]:
+                    del self._subscribers[city]
+
+
+hub = UpdateHub()
+
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+_refresh_now = threading.Event()
+_requested_cities = set()  # cities to refresh before their first subscriber's stream starts
+_last_subscribed = {}  # city -> time.monotonic() of its latest subscribe
+
+
+def holds_streams():
+    """
+    Whether streams are kept open: under gevent, or when configured to
+    """
+    if LIVE_STREAM_MODE != "auto":
+        return LIVE_STREAM_MODE == "hold"
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("socket")
+
+
+def subscribe(app, city, last_event_id=0):
+    """
+    Open a stream of updates for city, starting the worker's refresher if
+    needed
+
+    Returns:
+        generator: Encoded server-sent events
+    """
+    if hub.subscriber_count >= LIVE_MAX_SUBSCRIBERS:
+        raise TooManySubscribersError(f"This worker already serves {LIVE_MAX_SUBSCRIBERS} live update streams")
+
+    _start_refresher(app)
+    with _refresher_lock:
+        _last_subscribed[city] = time.monotonic()
+    if not hub.has_messages(city):
+        # Publish the city's current values now rather than at the next run
+        with _refresher_lock:
+            _requested_cities.add(city)
+        _refresh_now.set()
+
+    return hub.stream(city, last_event_id, hold=holds_streams())
+
+
+def _start_refresher(app):
+    global _refresher_pid
+
+    with _refresher_lock:
+        if _refresher_pid == os.getpid():
+            return
+        _refresher_pid = os.getpid()
+
+    threading.Thread(target=_run_refresher, args=(app,), name="live-updates", daemon=True).start()
+
+
+def _run_refresher(app):
+    while True:
+        _refresh_now.clear()
+        with _refresher_lock:
+            cities = set(hub.active_cities()) | _requested_cities | _recent_cities()
+            _requested_cities.clear()
+        try:
+            with app.app_context():
+                refresh_updates(sorted(cities))
+        except Exception as e:
+            logger.error("Error refreshing live updates: %s", e)
+        _refresh_now.wait(LIVE_UPDATE_INTERVAL)
+
+
+def _recent_cities():
+    """
+    Cities subscribed to within LIVE_RECENT_WINDOW, forgetting older ones;
+    call with _refresher_lock held
+    """
+    cutoff = time.monotonic() - LIVE_RECENT_WINDOW
+    for city, subscribed in list(_last_subscribed.items()):
+        if subscribed < cutoff:
+            del _last_subscribed[city]
+    return set(_last_subscribed)
+
+
+def refresh_updates(cities):
+    """
+    Publish the current weather, forecast and predictions of cities to the
+    hub. Must be called inside an application context.
+    """
+    from utils.weather_api import get_versioned_forecast_data
+    from utils.weather_ingest import get_current_weather
+    from utils.prediction_store import get_all_predictions, predictions_version
+
+    if not cities:
+        return
+
+    updates = []
+    for city in cities:
+        try:
+            weather = get_current_weather(city)
+            updates.append((city, "weather", weather, tuple(weather.items())))
+        except Exception as e:
+            logger.error("Error refreshing live weather for %s: %s", city, e)
+
+        try:
+            forecast, expires_at = get_versioned_forecast_data(city)
+            updates.append((city, "forecast", forecast, expires_at))
+        except Exception as e:
+            logger.error("Error refreshing live forecast for %s: %s", city, e)
+
+    try:
+        for city, predictions in get_all_predictions(cities).items():
+            updates.append((city, "predictions", predictions, predictions_version(predictions)))
+    except Exception as e:
+        logger.error("Error refreshing live predictions: %s", e)
+
+    hub.publish(updates)
@@ -0,0 +1,113 @@
+"""
+Disaster image classification on the local CPU with ONNX Runtime
+
+Needs the optional `onnxruntime` package and an ONNX export of
+an image classifier over the labels in DEFAULT_LABELS, for example the
+davanstrien/disaster_types model exported with `optimum-cli export onnx`.
+No network access is needed once the model file is on disk.
+"""
+import os
+import logging
+import threading
+from io import BytesIO
+
+import numpy as np
+
+from utils.image_analysis import build_classification
+
+logger = logging.getLogger(__name__)
+
+# Path to the ONNX model file
+LOCAL_CLASSIFIER_MODEL = os.environ.get("LOCAL_CLASSIFIER_MODEL", "instance/disaster_types.onnx")
+
+# Threads ONNX Runtime uses per inference; one per worker by default so
+# throughput scales with gunicorn workers rather than contending for cores
+LOCAL_CLASSIFIER_THREADS = int(os.environ.get("LOCAL_CLASSIFIER_THREADS", "1"))
+
+# Output order of the model's classes, unless the model's metadata has a
+# comma-separated "labels" entry
+DEFAULT_LABELS = ["cyclone", "earthquake", "fire", "flood", "landslide", "non_disaster"]
+
+# Input resolution and ImageNet normalization used by the exported model
+INPUT_SIZE = 224
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+
+
+class LocalClassifier:
+    """
+    Classifier backend running an ONNX model in this process
+
+    The model is loaded once, on creation; utils.image_analysis creates one
+    instance per worker. There is no local captioning model, so low
+    confidence results are returned as they are.
+    """
+    name = "local"
+    can_caption = False
+
+    def __init__(self, model_path=LOCAL_CLASSIFIER_MODEL, threads=LOCAL_CLASSIFIER_THREADS):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise Exception("The local image classifier needs the onnxruntime package")
+
+        if not os.path.exists(model_path):
+            raise Exception(f"Local classifier model not found at {model_path}")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+        labels = self.session.get_modelmeta().custom_metadata_map.get("labels")
+        self.labels = [label.strip() for label in labels.split(",")] if labels else DEFAULT_LABELS
+
+        # ONNX Runtime sessions are safe to share, but serialize runs so one
+        # worker never uses more than `threads` cores
+        self._lock = threading.Lock()
+        logger.info("Loaded local image classifier %s with %s labels", model_path, len(self.labels))
+
+    def classify(self, image_data):
+        return self.classify_batch([image_data])[0]
+
+    def classify_batch(self, images):
+        """
+        Classify several images in one model run
+
+        Returns:
+            list: One result per image, in the shape of build_classification
+        """
+        batch = np.stack([preprocess(image_data) for image_data in images])
+        with self._lock:
+            logits = self.session.run(None, {self.input_name: batch})[0]
+
+        probabilities = _softmax(logits)
+        top = probabilities.argmax(axis=1)
+        return [
+            build_classification(self.labels[index], float(probabilities[i, index]), "local_classification")
+            for i, index in enumerate(top)
+        ]
+
+    def caption(self, image_data):
+        raise Exception("The local image classifier has no captioning model")
+
+
+def preprocess(image_data):
+    """
+    Decode an image into the model's normalized (3 x INPUT_SIZE x INPUT_SIZE) input
+    """
+    from PIL import Image
+
+    image = Image.open(BytesIO(image_data))
+    # Let the JPEG decoder downscale by a power of two while decoding
+    image.draft("RGB", (INPUT_SIZE, INPUT_SIZE))
+    image = image.convert("RGB").resize((INPUT_SIZE, INPUT_SIZE), Image.BILINEAR)
+
+    pixels = np.asarray(image, dtype=np.float32).transpose(2, 0, 1) / 255.0
+    return (pixels - MEAN) / STD
+
+
+def _softmax(logits):
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
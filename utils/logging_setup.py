@@ -0,0 +1,257 @@
+"""
+Queued, structured logging with per-logger levels and request IDs
+
+configure() from app.py replaces the root logger's handlers with one that
+puts records on a bounded in-memory queue. A listener thread takes them off
+the queue, formats them (one JSON object per line, or plain text) and writes
+them to stderr, so a request thread that logs pays for a level check, a
+filter and a queue put, and never for formatting or a blocking write. When
+the queue is full, records are dropped and counted in
+climate_app_log_records_dropped_total rather than stalling the request.
+
+Messages are formatted lazily: log with %-style arguments, e.g.
+logger.info("Stored %d rows", count), and the arguments are only merged into
+the message on the listener thread, and only for records that pass the
+level of their logger. Arguments are formatted after the call returns, so
+log values rather than objects that are modified straight afterwards.
+
+init_app() gives every request an ID, taken from its X-Request-ID header
+when it has a usable one, and echoes it in the response. The ID is kept in a
+context variable and added to each record logged while the request is
+handled, including by the upstream threads of utils.upstream_fanout,
+the background refreshes it starts and the image analysis callbacks of the
+batches it queued.
+"""
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+from utils.metrics import log_records_dropped
+
+# ID of the request being handled, None outside of requests
+request_id = contextvars.ContextVar("request_id", default=None)
+
+# Loggers that are too chatty at the root level by default; LOG_LEVELS
+# entries take precedence
+DEFAULT_LOGGER_LEVELS = {
+    "urllib3": "WARNING",
+    "sqlalchemy": "WARNING",
+    "PIL": "INFO"
+}
+
+# Records waiting for the listener thread before new ones are dropped
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+# Incoming X-Request-ID values are used only when they look like an ID
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+# Attributes every LogRecord has; anything else was passed in extra= and is
+# written as a field of its own
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_handler = None
+_listener = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Add the current request ID to each record, on the thread that logged it
+    """
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record, with extra= fields alongside the standard ones
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._encoder = json.JSONEncoder(default=str, check_circular=False)
+        self._second = None
+        self._second_text = ""
+
+    def format(self, record):
+        # Records mostly arrive several per second; format each second once
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        entry = {
+            "time": f"{self._second_text}.{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "process": record.process,
+            "thread": record.threadName
+        }
+        for key in record.__dict__.keys() - _RECORD_ATTRIBUTES:
+            entry[key] = record.__dict__[key]
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return self._encoder.encode(entry)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Human-readable lines for local development, with the request ID
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread unformatted, dropping them when the
+    queue is full
+    """
+
+    def prepare(self, record):
+        # The base class formats the message here, on the logging thread;
+        # the listener's handler does it instead
+        return record
+
+    def enqueue(self, record):
+        if _listener_pid != os.getpid():
+            # The listener thread of a master process does not survive a fork
+            _start_listener()
+        # SimpleQueue has no bound of its own, but puts without taking a lock
+        if self.queue.qsize() >= LOG_QUEUE_SIZE:
+            log_records_dropped.inc(record.levelname)
+        else:
+            self.queue.put_nowait(record)
+
+
+def parse_levels(value):
+    """
+    Parse a LOG_LEVELS value such as "werkzeug=WARNING,utils.http_client=DEBUG"
+    into a dict of logger name to level name
+    """
+    levels = {}
+    for entry in (value or "").split(","):
+        if not entry.strip():
+            continue
+        name, _, level = entry.partition("=")
+        if not level.strip():
+            raise ValueError(f"Invalid LOG_LEVELS entry '{entry}', expected logger=LEVEL")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(config):
+    """
+    Set up logging from the LOG_LEVEL, LOG_LEVELS, LOG_FORMAT and LOG_QUEUE
+    settings in config, replacing any handlers on the root logger
+    """
+    global _handler, _listener_pid
+
+    if config.get("LOG_FORMAT", "json") == "text":
+        formatter = TextFormatter()
+    else:
+        formatter = JsonFormatter()
+
+    # Neither format shows which multiprocessing process or asyncio task a
+    # record was logged by, so skip looking them up
+    logging.logMultiprocessing = False
+    logging.logAsyncioTasks = False
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(config.get("LOG_LEVEL", "INFO").upper())
+
+    levels = dict(DEFAULT_LOGGER_LEVELS)
+    levels.update(parse_levels(config.get("LOG_LEVELS", "")))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    with _listener_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener_pid = None
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+
+    if config.get("LOG_QUEUE", True):
+        _handler = _DroppingQueueHandler(queue.SimpleQueue())
+        _handler.output = output
+        _start_listener()
+    else:
+        # Write on the logging thread, e.g. to see output interleaved with a debugger
+        _handler = output
+    _handler.addFilter(RequestIdFilter())
+    root.addHandler(_handler)
+
+
+def _start_listener():
+    """
+    Start this process's listener thread, with a fresh queue after a fork
+    """
+    global _listener, _listener_pid
+
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        if _listener_pid is not None:
+            # The inherited queue may hold the parent's records or a lock
+            # held at the time of the fork
+            _handler.queue = queue.SimpleQueue()
+        _listener = QueueListener(_handler.queue, _handler.output, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+
+@atexit.register
+def _flush_at_exit():
+    """
+    Write the records still queued when the process exits
+    """
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+
+
+def init_app(app):
+    """
+    Give every request of app an ID for its log records and its response
+    """
+    from flask import request
+
+    @app.before_request
+    def _set_request_id():
+        incoming = request.environ.get("HTTP_X_REQUEST_ID", "")
+        request_id.set(incoming if REQUEST_ID_PATTERN.fullmatch(incoming) else os.urandom(16).hex())
+
+    @app.after_request
+    def _add_request_id_header(response):
+        current = request_id.get()
+        if current is not None:
+            response.headers["X-Request-ID"] = current
+        return response
+
+    @app.teardown_request
+    def _clear_request_id(exc):
+        # Sync workers handle every request on the same thread
+        request_id.set(None)
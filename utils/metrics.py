@@ -0,0 +1,484 @@
+"""
+Prometheus metrics for routes, upstream calls, database queries, template
+rendering and caches
+
+Each worker process keeps its counters and histograms in memory; recording a
+value is a dict lookup and a few additions under an uncontended lock, about
+a microsecond. A background thread writes the process's values to
+METRICS_DIR/<pid>.json every METRICS_FLUSH_INTERVAL seconds. /metrics,
+served by any worker, sums the files of every worker on the host and renders
+the Prometheus text format, so a scrape sees the whole host rather than the
+one worker that answered it.
+
+Values of workers that have exited are folded into METRICS_DIR/retired.json,
+so counters never go backwards when gunicorn replaces a worker. Clear
+METRICS_DIR when deploying to start the counters from zero.
+"""
+import os
+import json
+import time
+import bisect
+import atexit
+import fcntl
+import logging
+import threading
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Set METRICS=0 to record nothing and serve an empty /metrics
+METRICS_ENABLED = os.environ.get("METRICS", "1") != "0"
+
+# Where each worker's values are written; shared by the workers of one host
+METRICS_DIR = os.environ.get("METRICS_DIR", "/tmp/climate_app_metrics")
+
+# Seconds between writes of a worker's values, so at most this much of a
+# worker's activity is missing from a scrape served by another worker
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+
+NAMESPACE = "climate_app"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds for request, upstream and function timings
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Finer bounds for database queries and template rendering
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+RETIRED_FILE = "retired.json"
+
+_metrics = {}  # full name -> metric, in definition order
+
+
+class Counter:
+    """
+    Monotonic count per combination of label values
+    """
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = f"{NAMESPACE}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values -> count
+        self._lock = threading.Lock()
+        _metrics[self.name] = self
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set_total(self, total, *labels):
+        """
+        Set the count from a counter kept elsewhere, e.g. a cache's hits
+        """
+        with self._lock:
+            self._values[labels] = total
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, merged, values):
+        for labels, value in values:
+            labels = tuple(labels)
+            merged[labels] = merged.get(labels, 0) + value
+
+    def expose(self, merged):
+        for labels, value in sorted(merged.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """
+    Distribution of observed values per combination of label values
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = f"{NAMESPACE}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [count per bucket..., count above the last, sum]
+        self._lock = threading.Lock()
+        _metrics[self.name] = self
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def time(self, *labels):
+        """
+        Context manager observing the duration of its block
+        """
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(entry)] for labels, entry in self._values.items()]
+
+    def merge(self, merged, values):
+        for labels, entry in values:
+            # Skip values written with different buckets by older code
+            if len(entry) != len(self.buckets) + 2:
+                continue
+            labels = tuple(labels)
+            total = merged.get(labels)
+            if total is None:
+                merged[labels] = list(entry)
+            else:
+                for i, value in enumerate(entry):
+                    total[i] += value
+
+    def expose(self, merged):
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, entry in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, entry):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), labels + (bound,))} {cumulative}"
+            formatted = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{formatted} {_format_value(entry[-1])}"
+            yield f"{self.name}_count{formatted} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to produce a response, by route pattern, method and status",
+    ("route", "method", "status")
+)
+upstream_request_duration = Histogram(
+    "upstream_request_duration_seconds",
+    "Time of each attempt of an upstream HTTP call, by host and outcome: the status class or error",
+    ("upstream", "outcome")
+)
+upstream_errors = Counter(
+    "upstream_errors_total",
+    "Failed upstream attempts by host and reason: connection, timeout, status (5xx), other or circuit_open",
+    ("upstream", "reason")
+)
+db_query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Time to execute a database statement, by operation and table",
+    ("operation", "table"),
+    buckets=FAST_BUCKETS
+)
+template_render_duration = Histogram(
+    "template_render_duration_seconds",
+    "Time to render a Jinja template",
+    ("template",),
+    buckets=FAST_BUCKETS
+)
+function_duration = Histogram(
+    "function_duration_seconds",
+    "Time spent in instrumented hot-path functions",
+    ("function",)
+)
+cache_requests = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result: hit, miss or stale",
+    ("cache", "result")
+)
+log_records_dropped = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full, by level",
+    ("level",)
+)
+
+
+def timed(name):
+    """
+    Decorator observing the duration of every call in function_duration
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                function_duration.observe(time.perf_counter() - start, name)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """
+    Time every request and template render of app, and every database
+    statement; each process starts writing its values to METRICS_DIR on its
+    first request, so a gunicorn master that preloads the app runs no
+    thread its workers could be forked from under
+    """
+    if not METRICS_ENABLED:
+        return
+
+    from flask import g, request, before_render_template, template_rendered
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            http_request_duration.observe(time.perf_counter() - start, route, request.method, response.status_code)
+        if _flusher_pid != os.getpid():
+            start_flusher()
+        return response
+
+    def _start_render_timer(sender, template, context, **extra):
+        g._metrics_render_start = time.perf_counter()
+
+    def _observe_render(sender, template, context, **extra):
+        start = g.pop("_metrics_render_start", None)
+        if start is not None:
+            template_render_duration.observe(time.perf_counter() - start, template.name)
+
+    before_render_template.connect(_start_render_timer, app, weak=False)
+    template_rendered.connect(_observe_render, app, weak=False)
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_query_start"] = time.perf_counter()
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _observe_query(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("metrics_query_start", None)
+        if start is not None:
+            db_query_duration.observe(time.perf_counter() - start, *_statement_labels(statement))
+
+
+_statement_label_cache = {}
+
+
+def _statement_labels(statement):
+    """
+    (operation, table) of a SQL statement; statements repeat, so each
+    distinct one is parsed once
+    """
+    labels = _statement_label_cache.get(statement)
+    if labels is None:
+        words = statement.replace("(", " ").replace(",", " ").split()
+        operation = words[0].lower() if words else "other"
+        keyword = {"select": "from", "delete": "from", "insert": "into", "update": "update"}.get(operation)
+        table = ""
+        if keyword is not None:
+            upper = [word.lower() for word in words]
+            if keyword in upper and upper.index(keyword) + 1 < len(words):
+                table = words[upper.index(keyword) + 1].strip('"`')
+        labels = (operation, table)
+        if len(_statement_label_cache) < 1000:
+            _statement_label_cache[statement] = labels
+    return labels
+
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def start_flusher():
+    """
+    Write this process's values to METRICS_DIR every METRICS_FLUSH_INTERVAL
+    seconds from a background thread, once per process; processes that
+    serve no requests, e.g. `flask ingest-weather --loop`, call it themselves
+    """
+    global _flusher_pid
+
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+    threading.Thread(target=_run_flusher, name="metrics-flush", daemon=True).start()
+
+
+def _reset_locks():
+    """
+    Replace the metric locks in a forked child, where one a parent thread
+    held at the fork would stay held; the values recorded so far are kept
+    """
+    global _flusher_lock
+
+    _flusher_lock = threading.Lock()
+    for metric in _metrics.values():
+        metric._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks)
+
+
+def _run_flusher():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.error("Error writing metrics: %s", e)
+
+
+def _collect_cache_stats():
+    from utils.cache import get_all_cache_stats
+
+    for name, stats in get_all_cache_stats().items():
+        cache_requests.set_total(stats["hits"], name, "hit")
+        cache_requests.set_total(stats["misses"], name, "miss")
+        cache_requests.set_total(stats["stale"], name, "stale")
+
+
+def snapshot():
+    """
+    This process's values of every metric, as written to its file
+    """
+    _collect_cache_stats()
+    return {name: metric.snapshot() for name, metric in _metrics.items()}
+
+
+def flush():
+    """
+    Write this process's values to METRICS_DIR/<pid>.json
+    """
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as handle:
+        json.dump(snapshot(), handle, separators=(",", ":"))
+    os.replace(temporary, path)
+
+
+@atexit.register
+def _flush_at_exit():
+    # Keep the last values of a worker that gunicorn is replacing
+    if _flusher_pid == os.getpid():
+        flush()
+
+
+def _read(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_host_values():
+    """
+    Read the values written by every worker on this host, first folding the
+    files of workers that have exited into the retired file. Holds a lock so
+    that a concurrent scrape never counts a retired worker twice.
+    """
+    with open(os.path.join(METRICS_DIR, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        names = [name for name in os.listdir(METRICS_DIR) if name.endswith(".json")]
+        exited = [
+            name for name in names
+            if name[:-5].isdigit() and not _is_running(int(name[:-5]))
+        ]
+        retired_path = os.path.join(METRICS_DIR, RETIRED_FILE)
+
+        if exited:
+            merged = _merge([_read(retired_path)] + [_read(os.path.join(METRICS_DIR, name)) for name in exited])
+            retired = {
+                name: [[list(labels), value] for labels, value in values.items()]
+                for name, values in merged.items()
+            }
+            with open(f"{retired_path}.tmp", "w") as handle:
+                json.dump(retired, handle, separators=(",", ":"))
+            os.replace(f"{retired_path}.tmp", retired_path)
+            for name in exited:
+                os.remove(os.path.join(METRICS_DIR, name))
+            names = [name for name in names if name not in exited and name != RETIRED_FILE] + [RETIRED_FILE]
+
+        return [_read(os.path.join(METRICS_DIR, name)) for name in names]
+
+
+def _merge(snapshots):
+    merged = {name: {} for name in _metrics}
+    for values_by_name in snapshots:
+        for name, values in values_by_name.items():
+            metric = _metrics.get(name)
+            if metric is not None:
+                metric.merge(merged[name], values)
+    return merged
+
+
+def render_metrics():
+    """
+    Render the summed values of every worker on this host in the Prometheus
+    text format
+    """
+    if not METRICS_ENABLED:
+        return ""
+
+    flush()
+    merged = _merge(_read_host_values())
+
+    lines = []
+    for name, metric in _metrics.items():
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.type}")
+        lines.extend(metric.expose(merged[name]))
+
+    # Hit ratio per cache over the lifetime of the counters, for dashboards
+    # that cannot compute it from cache_requests_total
+    lookups = {}
+    for (cache, result), count in merged[cache_requests.name].items():
+        hits, total = lookups.get(cache, (0, 0))
+        lookups[cache] = (hits + (count if result == "hit" else 0), total + count)
+    ratio_name = f"{NAMESPACE}_cache_hit_ratio"
+    lines.append(f"# HELP {ratio_name} Share of cache lookups served from the cache")
+    lines.append(f"# TYPE {ratio_name} gauge")
+    for cache, (hits, total) in sorted(lookups.items()):
+        if total:
+            lines.append(f"{ratio_name}{_format_labels(('cache',), (cache,))} {_format_value(hits / total)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,234 @@
+import time
+import logging
+import threading
+import contextvars
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+from utils.disaster_prediction import (
+    REGIONAL_DISASTERS, MIN_REPORTED_PROBABILITY,
+    score_disasters, build_prediction, get_prediction_inputs_key, load_weather_inputs
+)
+from utils.metrics import timed
+from utils.weather_api import get_cached_weather_arrays, WEATHER_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Predictions scored without weather data, from seasonal and regional priors
+# alone, expire with the weather cache rather than after days, so they are
+# scored again once Open-Meteo answers
+PRIORS_ONLY_VALID = timedelta(seconds=WEATHER_CACHE_TTL)
+
+# Seconds between background refreshes started by reads that find no fresh
+# weather batch to check the stored predictions against
+REFRESH_RETRY_INTERVAL = 60
+
+_UPSERT_COLUMNS = ["probability", "predicted_severity", "prediction_date", "valid_until", "inputs_key"]
+
+_refresh_lock = threading.Lock()
+_refreshing = False
+_next_refresh_at = 0.0
+
+
+def get_predictions(city):
+    """
+    Get the current disaster predictions for a city from DisasterPrediction,
+    computing and storing any that are missing or expired
+
+    Must be called inside an application context.
+    """
+    if city not in REGIONAL_DISASTERS:
+        raise ValueError(f"City '{city}' is not supported")
+
+    return get_all_predictions([city])[city]
+
+
+@timed("get_all_predictions")
+def get_all_predictions(cities=None):
+    """
+    Get the current disaster predictions for several cities
+
+    One prediction per (city, disaster type) is stored and served until its
+    valid_until passes or the inputs it was computed from change, so every
+    caller sees the same probabilities. The inputs are checked against the
+    cached weather batch, without calling Open-Meteo: once a new batch is
+    cached (or the season turns), the first read scores again from it. When
+    no fresh batch is cached, the stored predictions are served and
+    refresh_predictions() runs in the background, fetching the weather.
+
+    Must be called inside an application context.
+
+    Returns:
+        dict: City name mapped to its list of predictions
+    """
+    from utils.risk_scoring import HAZARDS
+
+    cities = _check_cities(cities)
+    now = datetime.now()
+    stored = _read_stored(cities, now)
+
+    weather = get_cached_weather_arrays()
+    if weather is not None:
+        inputs_key = get_prediction_inputs_key(now, weather)
+        for key in [key for key, row in stored.items() if row.inputs_key != inputs_key]:
+            del stored[key]
+    elif stored:
+        _start_background_refresh()
+
+    missing_cities = [
+        city for city in cities
+        if any((city, disaster_type) not in stored for disaster_type in HAZARDS)
+    ]
+    if missing_cities:
+        if weather is None:
+            weather = load_weather_inputs()
+        _store_scores(missing_cities, now, weather, stored)
+
+    all_predictions = {}
+    for city in cities:
+        all_predictions[city] = []
+        for disaster_type in HAZARDS:
+            row = stored[(city, disaster_type)]
+            if row.probability > MIN_REPORTED_PROBABILITY:
+                all_predictions[city].append(build_prediction(
+                    city, disaster_type, row.probability, row.predicted_severity,
+                    row.prediction_date, row.valid_until
+                ))
+
+    return all_predictions
+
+
+@timed("refresh_predictions")
+def refresh_predictions(cities=None):
+    """
+    Recompute the stored predictions that are missing, expired, or were
+    computed from other weather data or another season than the current ones
+
+    Without weather data, predictions computed from the last data that was
+    available are kept rather than replaced with priors alone.
+    Must be called inside an application context.
+
+    Returns:
+        int: Number of predictions stored
+    """
+    cities = _check_cities(cities)
+    now = datetime.now()
+    weather = load_weather_inputs()
+    inputs_key = get_prediction_inputs_key(now, weather) if weather is not None else None
+    stored = _read_stored(cities, now, inputs_key)
+    return _store_scores(cities, now, weather, stored)
+
+
+def _start_background_refresh():
+    """
+    Run refresh_predictions() in a daemon thread, unless one is running or
+    one was started within REFRESH_RETRY_INTERVAL
+    """
+    global _refreshing, _next_refresh_at
+    from flask import current_app
+
+    with _refresh_lock:
+        if _refreshing or time.monotonic() < _next_refresh_at:
+            return
+        _refreshing = True
+        _next_refresh_at = time.monotonic() + REFRESH_RETRY_INTERVAL
+
+    app = current_app._get_current_object()
+
+    def refresh():
+        global _refreshing
+        try:
+            with app.app_context():
+                refresh_predictions()
+        except Exception as e:
+            logger.warning("Background refresh of disaster predictions failed: %s", e)
+        finally:
+            with _refresh_lock:
+                _refreshing = False
+
+    # Logged with the ID of the request that started the refresh
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(refresh,), name="prediction-refresh", daemon=True).start()
+
+
+def _check_cities(cities):
+    if cities is None:
+        return list(REGIONAL_DISASTERS)
+    for city in cities:
+        if city not in REGIONAL_DISASTERS:
+            raise ValueError(f"City '{city}' is not supported")
+    return cities
+
+
+def _read_stored(cities, now, inputs_key=None):
+    """
+    Unexpired DisasterPrediction rows of cities, keyed by (city, disaster
+    type), optionally only those computed under inputs_key
+    """
+    from models import DisasterPrediction
+
+    query = DisasterPrediction.query.filter(
+        DisasterPrediction.location.in_(cities),
+        DisasterPrediction.valid_until > now
+    )
+    if inputs_key is not None:
+        query = query.filter(DisasterPrediction.inputs_key == inputs_key)
+    return {(row.location, row.disaster_type): row for row in query}
+
+
+def _store_scores(cities, now, weather, stored):
+    """
+    Score the cities with a prediction missing from stored, store the
+    missing predictions and add them to stored
+
+    Returns:
+        int: Number of predictions stored
+    """
+    from app import db
+    from models import DisasterPrediction
+    from schema import upsert_rows
+    from utils.risk_scoring import HAZARDS
+
+    stale_cities = [
+        city for city in cities
+        if any((city, disaster_type) not in stored for disaster_type in HAZARDS)
+    ]
+    if not stale_cities:
+        return 0
+
+    inputs_key = get_prediction_inputs_key(now, weather)
+    rows = []
+    for city, city_scores in score_disasters(stale_cities, now, weather).items():
+        for score in city_scores:
+            if (city, score["disaster_type"]) in stored:
+                continue
+            valid_for = timedelta(days=score["valid_days"])
+            if weather is None:
+                valid_for = min(valid_for, PRIORS_ONLY_VALID)
+            rows.append({
+                "location": city,
+                "disaster_type": score["disaster_type"],
+                "probability": score["probability"],
+                "predicted_severity": score["severity"],
+                "prediction_date": now,
+                "valid_until": now + valid_for,
+                "inputs_key": inputs_key
+            })
+    upsert_rows(DisasterPrediction, rows, ["location", "disaster_type"], _UPSERT_COLUMNS)
+    db.session.commit()
+    logger.info("Stored %s new disaster predictions for %s cities", len(rows), len(stale_cities))
+
+    for row in rows:
+        stored[(row["location"], row["disaster_type"])] = SimpleNamespace(**row)
+    return len(rows)
+
+
+def predictions_version(predictions):
+    """
+    A cheap stand-in for a city's prediction list that changes whenever the
+    list does; descriptions and precautions follow from type and severity
+    """
+    return [
+        (p["disaster_type"], p["probability"], p["severity"], p["prediction_date"], p["valid_until"])
+        for p in predictions
+    ]
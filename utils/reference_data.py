@@ -0,0 +1,318 @@
+"""
+Static reference data: the supported cities with their coordinates and
+hazards, seasons, disaster descriptions and precautions, WMO weather codes
+and the default government strategies
+
+The data is edited in data/reference.json; supporting another city means
+adding a line there. It is compiled into an indexed SQLite file by
+`flask --app main compile-reference`, or on import whenever the compiled
+file is missing or was compiled from a different source. Each table is read
+from the compiled file once, at import, into read-only mappings and tuples,
+so lookups are dict lookups that return shared objects. Processes read the
+data when they start; restart them after editing it.
+"""
+import os
+import json
+import hashlib
+import logging
+import sqlite3
+import tempfile
+from contextlib import closing
+from types import MappingProxyType
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The editable source, and the compiled file the tables are read from; the
+# compiled file alone is enough when the source is not deployed
+REFERENCE_DATA_SOURCE = os.environ.get("REFERENCE_DATA_SOURCE", os.path.join(_ROOT, "data", "reference.json"))
+REFERENCE_DATA_PATH = os.environ.get("REFERENCE_DATA_PATH", os.path.join(_ROOT, "instance", "reference.sqlite"))
+
+# Changed whenever the compiled layout changes, so older files are recompiled
+FORMAT_VERSION = 1
+
+# Every disaster type has one description per severity, 1 to 5
+SEVERITY_LEVELS = 5
+
+# Strategies stored under this disaster type ID apply to types without their own
+_GENERIC = 0
+
+# Disaster types are stored once and referred to by ID; tables read by key
+# are clustered on it (WITHOUT ROWID), so they need no separate index
+_SCHEMA = """
+CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE disaster_types (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE cities (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, latitude REAL NOT NULL, longitude REAL NOT NULL);
+CREATE TABLE city_hazards (city_id INTEGER NOT NULL, position INTEGER NOT NULL, disaster_type_id INTEGER NOT NULL,
+                           PRIMARY KEY (city_id, position)) WITHOUT ROWID;
+CREATE TABLE season_months (month INTEGER PRIMARY KEY, season TEXT NOT NULL);
+CREATE TABLE hazard_seasons (disaster_type_id INTEGER NOT NULL, position INTEGER NOT NULL, season TEXT NOT NULL,
+                             PRIMARY KEY (disaster_type_id, position)) WITHOUT ROWID;
+CREATE TABLE disaster_descriptions (disaster_type_id INTEGER NOT NULL, severity INTEGER NOT NULL, description TEXT NOT NULL,
+                                    PRIMARY KEY (disaster_type_id, severity)) WITHOUT ROWID;
+CREATE TABLE disaster_precautions (disaster_type_id INTEGER NOT NULL, position INTEGER NOT NULL, precaution TEXT NOT NULL,
+                                   PRIMARY KEY (disaster_type_id, position)) WITHOUT ROWID;
+CREATE TABLE weather_codes (code INTEGER PRIMARY KEY, description TEXT NOT NULL);
+CREATE TABLE strategies (id INTEGER PRIMARY KEY, disaster_type_id INTEGER NOT NULL, title TEXT NOT NULL,
+                         body TEXT NOT NULL, phase TEXT NOT NULL, authority TEXT NOT NULL);
+CREATE INDEX ix_strategies_disaster_type_id ON strategies (disaster_type_id);
+"""
+
+
+def _source_stamp(source):
+    """
+    Identify the contents of source by its modification time and size,
+    or None when it does not exist
+    """
+    try:
+        stat = os.stat(source)
+    except FileNotFoundError:
+        return None
+    return f"{FORMAT_VERSION}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _read_source(source):
+    """
+    Load and validate the source, with a digest of its contents
+    """
+    with open(source, "rb") as handle:
+        contents = handle.read()
+    data = json.loads(contents)
+    _validate(data)
+    return data, hashlib.sha256(contents).hexdigest()
+
+
+def _validate(data):
+    """
+    Raise ValueError if the tables in data do not refer to each other correctly
+    """
+    disaster_types = data["disasters"]
+    names = set()
+    for city in data["cities"]:
+        name = city["name"]
+        if name in names:
+            raise ValueError(f"City '{name}' is listed twice")
+        names.add(name)
+        if not (-90 <= city["latitude"] <= 90 and -180 <= city["longitude"] <= 180):
+            raise ValueError(f"City '{name}' has invalid coordinates")
+        for disaster_type in city["hazards"]:
+            if disaster_type not in disaster_types:
+                raise ValueError(f"City '{name}' has unknown hazard '{disaster_type}'")
+
+    months = sorted(month for months in data["seasons"].values() for month in months)
+    if months != list(range(1, 13)):
+        raise ValueError("Seasons must cover every month exactly once")
+    for disaster_type, seasons in data["hazard_seasons"].items():
+        if disaster_type not in disaster_types:
+            raise ValueError(f"Hazard seasons list unknown disaster type '{disaster_type}'")
+        for season in seasons:
+            if season not in data["seasons"]:
+                raise ValueError(f"Hazard '{disaster_type}' has unknown season '{season}'")
+
+    for disaster_type in data["strategies"]:
+        if disaster_type not in disaster_types:
+            raise ValueError(f"Strategies list unknown disaster type '{disaster_type}'")
+
+    for disaster_type, tables in disaster_types.items():
+        if len(tables["descriptions"]) != SEVERITY_LEVELS:
+            raise ValueError(f"Disaster type '{disaster_type}' needs {SEVERITY_LEVELS} descriptions")
+
+
+def _write(connection, data, digest, stamp):
+    """
+    Create the compiled tables in connection from the source data
+    """
+    disasters = data["disasters"]
+    # IDs in the order types first appear; 0 is left for the generic strategies
+    names = list(dict.fromkeys([*disasters, *data["hazard_seasons"], *data["strategies"]]))
+    type_ids = {name: type_id for type_id, name in enumerate(names, start=1)}
+    
+    connection.executescript(_SCHEMA)
+    connection.executemany("INSERT INTO metadata VALUES (?, ?)", [
+        ("version", str(data["version"])),
+        ("digest", digest),
+        ("source", stamp or "")
+    ])
+    connection.executemany("INSERT INTO disaster_types VALUES (?, ?)", [
+        (type_id, name) for name, type_id in type_ids.items()
+    ])
+    connection.executemany("INSERT INTO cities VALUES (?, ?, ?, ?)", [
+        (city_id, city["name"], city["latitude"], city["longitude"])
+        for city_id, city in enumerate(data["cities"], start=1)
+    ])
+    connection.executemany("INSERT INTO city_hazards VALUES (?, ?, ?)", [
+        (city_id, position, type_ids[disaster_type])
+        for city_id, city in enumerate(data["cities"], start=1)
+        for position, disaster_type in enumerate(city["hazards"])
+    ])
+    connection.executemany("INSERT INTO season_months VALUES (?, ?)", [
+        (month, season) for season, months in data["seasons"].items() for month in months
+    ])
+    connection.executemany("INSERT INTO hazard_seasons VALUES (?, ?, ?)", [
+        (type_ids[disaster_type], position, season)
+        for disaster_type, seasons in data["hazard_seasons"].items()
+        for position, season in enumerate(seasons)
+    ])
+    connection.executemany("INSERT INTO disaster_descriptions VALUES (?, ?, ?)", [
+        (type_ids[disaster_type], severity, description)
+        for disaster_type, tables in disasters.items()
+        for severity, description in enumerate(tables["descriptions"], start=1)
+    ])
+    connection.executemany("INSERT INTO disaster_precautions VALUES (?, ?, ?)", [
+        (type_ids[disaster_type], position, precaution)
+        for disaster_type, tables in disasters.items()
+        for position, precaution in enumerate(tables["precautions"])
+    ])
+    connection.executemany("INSERT INTO weather_codes VALUES (?, ?)", [
+        (int(code), description) for code, description in data["weather_codes"].items()
+    ])
+    strategies = [(type_ids[disaster_type], text) for disaster_type, texts in data["strategies"].items() for text in texts]
+    strategies += [(_GENERIC, text) for text in data["generic_strategies"]]
+    connection.executemany(
+        "INSERT INTO strategies (disaster_type_id, title, body, phase, authority) VALUES (?, ?, ?, ?, ?)",
+        [(type_id, text["title"], text["body"], text["phase"], text["authority"]) for type_id, text in strategies]
+    )
+    connection.commit()
+
+
+def compile_reference(source=REFERENCE_DATA_SOURCE, path=REFERENCE_DATA_PATH):
+    """
+    Compile the reference data in source into the SQLite file at path,
+    replacing it atomically so that starting processes never see half a file
+
+    Returns:
+        str: The version of the compiled data
+    """
+    data, digest = _read_source(source)
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(descriptor)
+    try:
+        with closing(sqlite3.connect(temporary)) as connection:
+            # The tables are small; small pages keep the file compact
+            connection.execute("PRAGMA page_size = 1024")
+            _write(connection, data, digest, _source_stamp(source))
+            connection.execute("VACUUM")
+        # mkstemp creates the file readable by its owner only
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return str(data["version"])
+
+
+def _open(source=REFERENCE_DATA_SOURCE, path=REFERENCE_DATA_PATH):
+    """
+    Connect to the compiled reference data, compiling it first if it is
+    missing or out of date, or in memory if it cannot be written
+    """
+    stamp = _source_stamp(source)
+    try:
+        connection = sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True)
+        try:
+            compiled = connection.execute("SELECT value FROM metadata WHERE key = 'source'").fetchone()
+            if stamp is None or (compiled is not None and compiled[0] == stamp):
+                return connection
+        except sqlite3.Error:
+            pass
+        connection.close()
+    except sqlite3.Error:
+        pass
+
+    try:
+        compile_reference(source, path)
+        return sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True)
+    except OSError as e:
+        logger.warning("Cannot compile reference data to %s, reading it into memory: %s", path, e)
+        connection = sqlite3.connect(":memory:")
+        _write(connection, *_read_source(source), stamp)
+        return connection
+
+
+def _group(rows, key_names=None):
+    """
+    Group (key, value) rows into a read-only mapping of key to a tuple of
+    values, in row order; key_names maps keys stored as IDs back to names
+    """
+    groups = {}
+    for key, value in rows:
+        groups.setdefault(key, []).append(value)
+    if key_names is not None:
+        groups = {key_names[key]: values for key, values in groups.items()}
+    return MappingProxyType({key: tuple(values) for key, values in groups.items()})
+
+
+def _read_tables(connection):
+    """
+    Read every compiled table into read-only mappings and tuples
+    """
+    execute = connection.execute
+    metadata = dict(execute("SELECT key, value FROM metadata"))
+    type_names = dict(execute("SELECT id, name FROM disaster_types"))
+    type_names[_GENERIC] = None
+    cities = execute("SELECT id, name, latitude, longitude FROM cities ORDER BY id").fetchall()
+    city_hazards = _group(
+        (city_id, type_names[type_id]) for city_id, type_id in execute(
+            "SELECT city_id, disaster_type_id FROM city_hazards ORDER BY city_id, position")
+    )
+    strategies = _group(
+        (type_id, MappingProxyType({"title": title, "body": body, "phase": phase, "authority": authority}))
+        for type_id, title, body, phase, authority in execute(
+            "SELECT disaster_type_id, title, body, phase, authority FROM strategies ORDER BY id")
+    )
+    return {
+        "VERSION": metadata["version"],
+        "DIGEST": metadata["digest"],
+        "CITIES": tuple(name for _, name, _, _ in cities),
+        "CITY_COORDINATES": MappingProxyType({name: (latitude, longitude) for _, name, latitude, longitude in cities}),
+        "DISASTER_TYPES": tuple(name for type_id, name in sorted(type_names.items()) if type_id != _GENERIC),
+        "CITY_HAZARDS": MappingProxyType({name: city_hazards.get(city_id, ()) for city_id, name, _, _ in cities}),
+        "SEASONS": _group((season, month) for month, season in execute("SELECT month, season FROM season_months ORDER BY month")),
+        "HAZARD_SEASONS": _group(execute(
+            "SELECT disaster_type_id, season FROM hazard_seasons ORDER BY disaster_type_id, position"), type_names),
+        "DISASTER_DESCRIPTIONS": _group(execute(
+            "SELECT disaster_type_id, description FROM disaster_descriptions ORDER BY disaster_type_id, severity"), type_names),
+        "DISASTER_PRECAUTIONS": _group(execute(
+            "SELECT disaster_type_id, precaution FROM disaster_precautions ORDER BY disaster_type_id, position"), type_names),
+        "WEATHER_DESCRIPTIONS": MappingProxyType(dict(execute("SELECT code, description FROM weather_codes"))),
+        "STRATEGY_TEXTS": MappingProxyType({
+            type_names[type_id]: texts for type_id, texts in strategies.items() if type_id != _GENERIC
+        }),
+        "GENERIC_STRATEGY_TEXTS": strategies.get(_GENERIC, ()),
+    }
+
+
+with closing(_open()) as _connection:
+    _tables = _read_tables(_connection)
+
+# Version of the reference data, from data/reference.json
+VERSION = _tables["VERSION"]
+# SHA-256 of data/reference.json, which changes with any edit to it
+DIGEST = _tables["DIGEST"]
+# Supported city names, in the order of the source
+CITIES = _tables["CITIES"]
+# City name -> (latitude, longitude)
+CITY_COORDINATES = _tables["CITY_COORDINATES"]
+# Disaster type names, in the order of the source
+DISASTER_TYPES = _tables["DISASTER_TYPES"]
+# City name -> disaster types the city is susceptible to
+CITY_HAZARDS = _tables["CITY_HAZARDS"]
+# Season name -> month numbers
+SEASONS = _tables["SEASONS"]
+# Disaster type -> seasons when it is more likely
+HAZARD_SEASONS = _tables["HAZARD_SEASONS"]
+# Disaster type -> descriptions of a predicted disaster, by severity - 1
+DISASTER_DESCRIPTIONS = _tables["DISASTER_DESCRIPTIONS"]
+# Disaster type -> precautionary measures
+DISASTER_PRECAUTIONS = _tables["DISASTER_PRECAUTIONS"]
+# WMO weather code -> description
+WEATHER_DESCRIPTIONS = _tables["WEATHER_DESCRIPTIONS"]
+# Disaster type -> default strategy texts (title, body, phase, authority)
+STRATEGY_TEXTS = _tables["STRATEGY_TEXTS"]
+# Default strategy texts for disaster types without their own
+GENERIC_STRATEGY_TEXTS = _tables["GENERIC_STRATEGY_TEXTS"]
+del _tables
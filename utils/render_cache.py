@@ -0,0 +1,90 @@
+"""
+Render caching for the dashboard, prediction and strategies pages
+
+Each page is stored once per (route, city or disaster type) together with
+the version of the data it was rendered from. The version is what the JSON
+API already uses for its ETags: the expiry of the cache entry the data came
+from, the time of the refresh that produced it, or for small payloads, the
+payload itself.
+
+For RENDER_REVALIDATE seconds after a page was rendered or checked, it is
+served as stored without reading its data at all. After that, the next
+request loads the data as before; if its version is unchanged the stored
+HTML is served again, and only when the weather, forecast, predictions or
+strategies have been refreshed is the page rendered anew. A page therefore
+trails its data by at most RENDER_REVALIDATE seconds, and an open dashboard
+receives newer values over its live update stream in the meantime.
+
+The layout shows flashed messages, so a request with messages pending, or
+whose data could not be loaded, is rendered fresh and never stored.
+Everything else the layout reads (the active nav link, static URLs) is the
+same for every request to a route.
+"""
+import os
+import time
+import hashlib
+import logging
+
+from flask import render_template, session
+
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Set RENDER_CACHE=0 to load the data and render every page on every request
+RENDER_CACHE_ENABLED = os.environ.get("RENDER_CACHE", "1") != "0"
+
+# Seconds a stored page is served before its data version is checked again;
+# 0 checks the version on every request
+RENDER_REVALIDATE = int(os.environ.get("RENDER_REVALIDATE", "30"))
+
+# Changing this invalidates every stored page, e.g. after a template change
+# on a shared cache backend
+RENDER_FORMAT_VERSION = "1"
+
+# 20 cities, 10 disaster types and the prediction page fit with room to spare.
+# Entries past their revalidation time are kept, so their HTML can be reused
+# when the data turns out unchanged.
+page_cache = TTLCache("rendered_pages", maxsize=128, default_ttl=RENDER_REVALIDATE)
+
+
+def _digest(version):
+    return hashlib.sha1(f"{RENDER_FORMAT_VERSION}|{version!r}".encode("utf-8")).hexdigest()
+
+
+def render_cached(route, key, template, load, store=True):
+    """
+    Render a page, reusing the HTML stored for route and key while its data
+    version is unchanged
+
+    Args:
+        route: Name of the route rendering the page
+        key: What the page is for, e.g. the selected city
+        template: Template to render
+        load: Callable loading the page's data, returning (version, context);
+            version is anything whose repr changes whenever the context does.
+            It may flash messages when data cannot be loaded.
+        store: False to render fresh without storing the page, for keys
+            outside the supported cities and disaster types, so arbitrary
+            query strings cannot fill the cache
+    """
+    if not RENDER_CACHE_ENABLED or not store or session.get("_flashes"):
+        return render_template(template, **load()[1])
+
+    cache_key = f"{route}|{key}"
+    entry = page_cache.peek(cache_key)
+    if entry is not None and entry[1] > time.time():
+        return entry[0][1]
+
+    page_cache.record_miss()
+    version, context = load()
+    if session.get("_flashes"):
+        return render_template(template, **context)
+
+    digest = _digest(version)
+    if entry is not None and entry[0][0] == digest:
+        html = entry[0][1]
+    else:
+        html = render_template(template, **context)
+    page_cache.set(cache_key, [digest, html])
+    return html
@@ -0,0 +1,208 @@
+import numpy as np
+
+from utils.reference_data import DISASTER_TYPES
+
+# Hazards scored for every city, in column order of the score matrices: every
+# disaster type of data/reference.json
+HAZARDS = list(DISASTER_TYPES)
+
+# Hazards with no weather signal, scored from the regional prior alone
+GEOLOGICAL_HAZARDS = {"Earthquake", "Tsunami"}
+
+# Probability with no adverse weather, in and out of a hazard's season
+IN_SEASON_BASE = 0.45
+OFF_SEASON_BASE = 0.1
+GEOLOGICAL_BASE = 0.05
+
+# Weight of a hazard in a city not listed as susceptible to it, so only
+# extreme weather pushes it over the reporting threshold
+NON_SUSCEPTIBLE_WEIGHT = 0.4
+
+# Days a prediction stays valid: the forecast horizon for weather-driven
+# hazards, longer for geological ones. Stored predictions are scored again
+# before then once the cached Open-Meteo batch has a new version or the
+# season changes (see utils.prediction_store)
+WEATHER_VALID_DAYS = 7
+GEOLOGICAL_VALID_DAYS = 14
+
+# IMD thresholds: heavy and very heavy rainfall in mm/24h, heat wave and cold
+# wave temperatures in degrees C, and cyclonic storm wind speed in km/h
+HEAVY_RAIN_24H = 64.5
+VERY_HEAVY_RAIN_24H = 115.6
+HEAT_WAVE_TMAX = 40.0
+COLD_WAVE_TMIN = 10.0
+CYCLONE_WIND = 62.0
+
+# Daily precipitation below this (mm) counts as a dry day
+DRY_DAY_PRECIPITATION = 1.0
+
+_HOURLY_FIELDS = ("precipitation", "temperature_2m", "windspeed_10m")
+_DAILY_FIELDS = ("precipitation_sum", "temperature_2m_max", "temperature_2m_min")
+
+
+def build_weather_matrices(arrays_by_city, cities):
+    """
+    Stack Open-Meteo hourly and daily arrays into (cities x time) matrices
+
+    Cities without data and missing values become NaN; series of different
+    lengths are padded with NaN.
+
+    Returns:
+        dict: Field name mapped to a float matrix with one row per city
+    """
+    matrices = {}
+    for section, fields in (("hourly", _HOURLY_FIELDS), ("daily", _DAILY_FIELDS)):
+        for field in fields:
+            rows = [((arrays_by_city.get(city) or {}).get(section) or {}).get(field) or [] for city in cities]
+            width = max((len(row) for row in rows), default=0) or 1
+            if all(len(row) == width for row in rows):
+                # Usual case: one conversion for the whole matrix, None -> NaN
+                matrices[field] = np.array(rows, dtype=float)
+                continue
+            matrix = np.full((len(cities), width), np.nan)
+            for i, row in enumerate(rows):
+                if row:
+                    matrix[i, :len(row)] = np.array(row, dtype=float)
+            matrices[field] = matrix
+    return matrices
+
+
+def weather_features(matrices):
+    """
+    Compute threshold-exceedance and rolling-window features for every city
+
+    Returns:
+        dict: Feature name mapped to a vector with one value per city
+    """
+    precipitation = np.nan_to_num(matrices["precipitation"])
+    cumulative = np.concatenate([np.zeros((precipitation.shape[0], 1)), np.cumsum(precipitation, axis=1)], axis=1)
+
+    def max_rolling_sum(hours):
+        if cumulative.shape[1] <= hours:
+            return cumulative[:, -1]
+        return (cumulative[:, hours:] - cumulative[:, :-hours]).max(axis=1)
+
+    daily_precipitation = matrices["precipitation_sum"]
+    tmax = matrices["temperature_2m_max"]
+    tmin = matrices["temperature_2m_min"]
+    days = np.maximum(np.sum(~np.isnan(daily_precipitation), axis=1), 1)
+    tmax_days = np.sum(~np.isnan(tmax), axis=1)
+
+    # Rows with no data reduce to NaN; map them to values that give no signal
+    with np.errstate(invalid="ignore"):
+        return {
+            "rain_24h": max_rolling_sum(24),
+            "rain_72h": max_rolling_sum(72),
+            "wind_max": np.nan_to_num(np.fmax.reduce(matrices["windspeed_10m"], axis=1)),
+            "tmax_max": np.nan_to_num(np.fmax.reduce(tmax, axis=1), nan=-np.inf),
+            "tmax_mean": np.where(tmax_days > 0, np.nansum(tmax, axis=1) / np.maximum(tmax_days, 1), -np.inf),
+            "tmin_min": np.nan_to_num(np.fmin.reduce(tmin, axis=1), nan=np.inf),
+            "heat_days": np.sum(tmax >= HEAT_WAVE_TMAX, axis=1),
+            "dry_fraction": np.sum(daily_precipitation < DRY_DAY_PRECIPITATION, axis=1) / days,
+        }
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def hazard_signals(features):
+    """
+    Map weather features to a 0-1 signal per city and hazard
+
+    Returns:
+        ndarray: (cities x HAZARDS) matrix
+    """
+    rain_24h = features["rain_24h"]
+    rain_72h = features["rain_72h"]
+    wind_max = features["wind_max"]
+    dry_fraction = features["dry_fraction"]
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        heavy_rain = _sigmoid((rain_24h - VERY_HEAVY_RAIN_24H) / 25.0)
+        sustained_rain = _sigmoid((rain_72h - 150.0) / 40.0)
+        hot = _sigmoid((features["tmax_max"] - HEAT_WAVE_TMAX) / 1.5)
+        warm = _sigmoid((features["tmax_mean"] - 35.0) / 3.0)
+        cold = _sigmoid((COLD_WAVE_TMIN - features["tmin_min"]) / 1.5)
+        windy = _sigmoid((wind_max - CYCLONE_WIND) / 8.0)
+        breezy = _sigmoid((wind_max - 25.0) / 8.0)
+
+        signals = {
+            "Flood": np.maximum(heavy_rain, sustained_rain),
+            "Cyclone": 0.7 * windy + 0.3 * heavy_rain * windy,
+            "Drought": dry_fraction * warm,
+            "Landslide": sustained_rain,
+            "Heat Wave": hot * np.minimum(1.0, 0.5 + features["heat_days"] / 4.0),
+            "Cold Wave": cold,
+            "Urban Flooding": _sigmoid((rain_24h - HEAVY_RAIN_24H) / 15.0),
+            "Forest Fire": dry_fraction * _sigmoid((features["tmax_max"] - 38.0) / 2.0) * (0.5 + 0.5 * breezy),
+        }
+
+    zeros = np.zeros_like(rain_24h, dtype=float)
+    return np.nan_to_num(np.stack([signals.get(hazard, zeros) for hazard in HAZARDS], axis=1))
+
+
+class RiskModel:
+    """
+    Vectorized disaster risk scoring for a fixed set of cities
+
+    The regional susceptibility and seasonal tables are turned into matrices
+    once, so scoring every city and hazard is a handful of array operations.
+    """
+
+    def __init__(self, cities, regional_disasters, seasonal_disasters, season_by_month):
+        self.cities = list(cities)
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+
+        susceptible = np.array([
+            [hazard in regional_disasters.get(city, ()) for hazard in HAZARDS]
+            for city in self.cities
+        ])
+        self.susceptibility = np.where(susceptible, 1.0, NON_SUSCEPTIBLE_WEIGHT)
+
+        # Base probability per month (row 0 is January) and hazard
+        self.base_by_month = np.array([
+            [
+                GEOLOGICAL_BASE if hazard in GEOLOGICAL_HAZARDS
+                else IN_SEASON_BASE if season_by_month.get(month) in seasonal_disasters.get(hazard, ())
+                else OFF_SEASON_BASE
+                for hazard in HAZARDS
+            ]
+            for month in range(1, 13)
+        ])
+
+        self.valid_days = np.array([
+            GEOLOGICAL_VALID_DAYS if hazard in GEOLOGICAL_HAZARDS else WEATHER_VALID_DAYS
+            for hazard in HAZARDS
+        ])
+
+        # (weather version, signals) for the last weather arrays scored
+        self._signals_cache = (None, None)
+
+    def signals_for(self, weather):
+        """
+        Hazard signals for the given weather arrays, recomputed only when the
+        data version changes; no weather means no signal
+        """
+        if weather is None:
+            return np.zeros((len(self.cities), len(HAZARDS)))
+
+        version, signals = self._signals_cache
+        if signals is None or version != weather.get("version"):
+            matrices = build_weather_matrices(weather.get("cities", {}), self.cities)
+            signals = hazard_signals(weather_features(matrices))
+            self._signals_cache = (weather.get("version"), signals)
+        return signals
+
+    def score(self, signals, month):
+        """
+        Score every city and hazard
+
+        Returns:
+            tuple: (probability, severity) matrices of shape (cities x HAZARDS);
+            severity is on the 1-5 scale
+        """
+        base = self.base_by_month[month - 1]
+        probability = self.susceptibility * (base + (1.0 - base) * signals)
+        severity = np.clip(1 + (probability * 5).astype(int), 1, 5)
+        return probability, severity
@@ -0,0 +1,542 @@
+"""
+Full-text search over government strategies and historical disasters
+
+Documents come from three places:
+- the built-in default strategies of utils.govt_strategies, indexed as they are
+- ReliefWeb guideline reports, stored in SearchDocument whenever they are fetched
+- historical disasters, stored in SearchDocument whenever they are ingested
+
+Each worker keeps an in-memory inverted index over them and ranks matches
+with BM25, scoring a term's whole posting list with numpy at once. The index
+is built by app.warm_up() in gunicorn's master before it forks, so workers
+inherit it; a process without one builds it in a background thread on its
+first search and answers from the database, unranked, until it is ready.
+The index is then brought up to date from SearchDocument rows updated since
+the last sync, so documents stored by any worker or CLI command become
+searchable within SEARCH_SYNC_INTERVAL.
+"""
+import os
+import re
+import math
+import time
+import hashlib
+import logging
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for documents stored by other processes
+SEARCH_SYNC_INTERVAL = float(os.environ.get("SEARCH_SYNC_INTERVAL", "2"))
+
+# Rows are re-read this far back on every sync, so that a transaction that
+# committed late with an earlier updated_at is not missed
+SEARCH_SYNC_OVERLAP = timedelta(seconds=10)
+
+# Term frequency weight of a title word relative to a body word
+TITLE_WEIGHT = 3
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Rebuild the index once it holds more replaced document versions than this
+# and than live documents
+COMPACT_MIN_REPLACED = 1000
+
+# Document kinds, for filtering results
+SEARCH_KINDS = ("strategy", "guideline", "disaster")
+
+MAX_RESULTS = 100
+SNIPPET_LENGTH = 200
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or that the "
+    "their this to was were which will with".split()
+)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Split text into lowercase index terms, dropping stop words and folding
+    simple plurals ("floods" -> "flood")
+    """
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+class SearchIndex:
+    """
+    In-memory BM25 index of one worker
+
+    A document that is indexed again under the same key replaces the old
+    version, which stays in the posting lists but is masked out of results.
+    """
+    def __init__(self):
+        self.documents = []  # position -> document dict
+        self._positions = {}  # doc_key -> position of the live version
+        self._postings = {}  # term -> (array of positions, array of weighted term frequencies)
+        self._lengths = array("f")
+        self._live = bytearray()
+        self._kinds = array("b")
+        self._types = array("h")
+        self._kind_codes = {}
+        self._type_codes = {}
+        self._live_count = 0
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._live_count
+
+    @property
+    def replaced_count(self):
+        return len(self.documents) - self._live_count
+
+    def compacted(self):
+        """
+        A new index holding only the live version of each document
+        """
+        index = SearchIndex()
+        with self._lock:
+            documents = [self.documents[position] for position in self._positions.values()]
+        for document in documents:
+            index.add(document)
+        return index
+
+    def add(self, document):
+        """
+        Index a document dict with doc_key, kind, title and body, and
+        optionally disaster_type, phase, source, url and date
+        """
+        frequencies = {}
+        for term in tokenize(document.get("title") or ""):
+            frequencies[term] = frequencies.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(document.get("body") or ""):
+            frequencies[term] = frequencies.get(term, 0) + 1
+        length = float(sum(frequencies.values()))
+
+        with self._lock:
+            self._remove(document["doc_key"])
+
+            position = len(self.documents)
+            self.documents.append(document)
+            self._positions[document["doc_key"]] = position
+            self._lengths.append(length)
+            self._live.append(1)
+            self._kinds.append(self._code(self._kind_codes, document.get("kind")))
+            self._types.append(self._code(self._type_codes, (document.get("disaster_type") or "").lower()))
+            self._live_count += 1
+            self._total_length += length
+
+            for term, frequency in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("i"), array("f"))
+                postings[0].append(position)
+                postings[1].append(frequency)
+
+    def version_of(self, doc_key):
+        """
+        The updated_at of the indexed version of a document, if it has one
+        """
+        position = self._positions.get(doc_key)
+        return self.documents[position].get("updated_at") if position is not None else None
+
+    def _remove(self, doc_key):
+        position = self._positions.pop(doc_key, None)
+        if position is not None:
+            self._live[position] = 0
+            self._live_count -= 1
+            self._total_length -= self._lengths[position]
+
+    @staticmethod
+    def _code(codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+
+    def search(self, query, kind=None, disaster_type=None, limit=20):
+        """
+        Rank the documents containing every term of query
+
+        Returns:
+            tuple: (total number of matches, list of (document, score) for
+            the best `limit` of them, best first)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+
+        with self._lock:
+            if not self._live_count:
+                return 0, []
+
+            # Arrays are copied rather than viewed, since a buffer that numpy
+            # views can no longer grow
+            live = np.array(self._live, dtype=bool)
+            if kind is not None:
+                live &= np.array(self._kinds, dtype=np.int8) == self._kind_codes.get(kind, -1)
+            if disaster_type is not None:
+                type_code = self._type_codes.get(disaster_type.lower(), -1)
+                live &= np.array(self._types, dtype=np.int16) == type_code
+
+            lengths = np.array(self._lengths, dtype=np.float32)
+            average_length = self._total_length / self._live_count
+            scores = np.zeros(len(live), dtype=np.float32)
+            matched = np.zeros(len(live), dtype=np.int16)
+
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    return 0, []
+                positions = np.array(postings[0], dtype=np.int32)
+                frequencies = np.array(postings[1], dtype=np.float32)
+
+                # Dead versions inflate the document frequency slightly; the
+                # ranking is unaffected in practice
+                document_frequency = min(len(positions), self._live_count)
+                idf = math.log(1 + (self._live_count - document_frequency + 0.5) / (document_frequency + 0.5))
+                normalization = BM25_K1 * (1 - BM25_B + BM25_B * lengths[positions] / average_length)
+                scores[positions] += idf * frequencies * (BM25_K1 + 1) / (frequencies + normalization)
+                matched[positions] += 1
+
+            candidates = np.flatnonzero(live & (matched == len(terms)))
+            total = len(candidates)
+            if total > limit:
+                candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+            return total, [(self.documents[position], float(scores[position])) for position in candidates]
+
+
+_index = None
+_synced_until = None
+_next_sync_at = 0.0
+_build_thread = None
+_index_lock = threading.Lock()
+
+
+def _reset_locks():
+    """
+    Replace the locks in a forked child, where one a parent thread held at
+    the fork would stay held; the index itself is kept
+    """
+    global _index_lock, _build_thread
+
+    _index_lock = threading.Lock()
+    _build_thread = None
+    if _index is not None:
+        _index._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks)
+
+
+def build_index():
+    """
+    Build the index from the default strategies and every SearchDocument row
+    and make it this process's index
+
+    Must be called inside an application context.
+    """
+    global _index, _synced_until, _next_sync_at
+
+    start = time.perf_counter()
+    index = SearchIndex()
+    _add_default_strategies(index)
+    synced_until = _sync(index, None)
+    with _index_lock:
+        _index = index
+        _synced_until = synced_until
+        _next_sync_at = time.monotonic() + SEARCH_SYNC_INTERVAL
+    logger.info("Built search index of %s documents in %.2fs", len(index), time.perf_counter() - start)
+
+
+def _build_in_background(app):
+    with app.app_context():
+        try:
+            build_index()
+        except Exception as e:
+            logger.error("Error building search index: %s", e)
+
+
+def _get_index():
+    """
+    Get this worker's index, synced with SearchDocument at most every
+    SEARCH_SYNC_INTERVAL seconds, or None while it is still being built
+
+    Must be called inside an application context.
+    """
+    global _index, _synced_until, _next_sync_at, _build_thread
+    from flask import current_app
+
+    with _index_lock:
+        if _index is None:
+            if _build_thread is None or not _build_thread.is_alive():
+                _build_thread = threading.Thread(
+                    target=_build_in_background, args=(current_app._get_current_object(),),
+                    name="search-index-build", daemon=True
+                )
+                _build_thread.start()
+            return None
+
+        if time.monotonic() >= _next_sync_at:
+            _synced_until = _sync(_index, _synced_until)
+            _next_sync_at = time.monotonic() + SEARCH_SYNC_INTERVAL
+            # Re-ingested documents leave their old versions behind
+            if _index.replaced_count > max(COMPACT_MIN_REPLACED, len(_index)):
+                _index = _index.compacted()
+
+        return _index
+
+
+def _default_strategy_documents():
+    from utils.govt_strategies import DEFAULT_STRATEGIES
+
+    for disaster_type, strategies in DEFAULT_STRATEGIES.items():
+        for number, strategy in enumerate(strategies):
+            yield {
+                "doc_key": f"strategy:{disaster_type}:{number}",
+                "kind": "strategy",
+                "disaster_type": disaster_type,
+                "title": strategy["title"],
+                "body": strategy["body"],
+                "phase": strategy["phase"],
+                "source": strategy["source"],
+                "url": None,
+                "date": None
+            }
+
+
+def _add_default_strategies(index):
+    for document in _default_strategy_documents():
+        index.add(document)
+
+
+def _sync(index, synced_until):
+    """
+    Add SearchDocument rows updated since synced_until (all of them if None)
+    to the index
+
+    Returns:
+        datetime: The synced_until to pass to the next sync
+    """
+    from models import SearchDocument
+
+    query = SearchDocument.query
+    if synced_until is not None:
+        query = query.filter(SearchDocument.updated_at >= synced_until - SEARCH_SYNC_OVERLAP)
+
+    for row in query.yield_per(1000):
+        if index.version_of(row.doc_key) == row.updated_at:
+            continue
+        index.add({
+            "doc_key": row.doc_key,
+            "kind": row.kind,
+            "disaster_type": row.disaster_type,
+            "title": row.title,
+            "body": row.body,
+            "phase": None,
+            "source": row.source,
+            "url": row.url,
+            "date": row.date,
+            "updated_at": row.updated_at
+        })
+        if synced_until is None or row.updated_at > synced_until:
+            synced_until = row.updated_at
+
+    return synced_until if synced_until is not None else datetime.utcnow()
+
+
+def _search_database(query, kind=None, disaster_type=None, limit=20):
+    """
+    Unranked search for while the index is being built: default strategies
+    containing every term, then SearchDocument rows whose title or body
+    contains every term, newest first
+
+    Returns:
+        tuple: (total number of matches, list of (document, score) for the
+        first `limit` of them), as SearchIndex.search does
+    """
+    from sqlalchemy import func, or_
+    from models import SearchDocument
+
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return 0, []
+
+    matches = []
+    if kind in (None, "strategy"):
+        for document in _default_strategy_documents():
+            if disaster_type is not None and document["disaster_type"].lower() != disaster_type.lower():
+                continue
+            document_terms = set(tokenize(document["title"] + " " + document["body"]))
+            if all(term in document_terms for term in terms):
+                matches.append((document, 0.0))
+
+    rows = SearchDocument.query
+    if kind is not None:
+        rows = rows.filter(SearchDocument.kind == kind)
+    if disaster_type is not None:
+        rows = rows.filter(func.lower(SearchDocument.disaster_type) == disaster_type.lower())
+    for term in terms:
+        # Terms are [a-z0-9]+, so hold no LIKE wildcards
+        rows = rows.filter(or_(SearchDocument.title.ilike(f"%{term}%"), SearchDocument.body.ilike(f"%{term}%")))
+
+    total = len(matches) + rows.count()
+    for row in rows.order_by(SearchDocument.date.desc()).limit(max(0, limit - len(matches))):
+        matches.append(({
+            "doc_key": row.doc_key,
+            "kind": row.kind,
+            "disaster_type": row.disaster_type,
+            "title": row.title,
+            "body": row.body,
+            "phase": None,
+            "source": row.source,
+            "url": row.url,
+            "date": row.date
+        }, 0.0))
+
+    return total, matches[:limit]
+
+
+def store_documents(documents):
+    """
+    Store documents in SearchDocument, replacing earlier versions with the
+    same doc_key, and have this worker's index pick them up on its next search
+
+    Does not commit.
+    """
+    from models import SearchDocument
+    from schema import upsert_rows
+
+    global _next_sync_at
+
+    if not documents:
+        return
+
+    updated_at = datetime.utcnow()
+    rows = [
+        {
+            "doc_key": document["doc_key"],
+            "kind": document["kind"],
+            "disaster_type": document.get("disaster_type"),
+            "title": document.get("title"),
+            "body": document.get("body"),
+            "source": document.get("source"),
+            "url": document.get("url"),
+            "date": document.get("date"),
+            "updated_at": updated_at
+        }
+        for document in documents
+    ]
+    upsert_rows(
+        SearchDocument, rows, ["doc_key"],
+        ["kind", "disaster_type", "title", "body", "source", "url", "date", "updated_at"]
+    )
+    _next_sync_at = 0.0
+
+
+def disaster_document(record):
+    """
+    Search document for a DisasterRecord
+    """
+    key = f"disaster:{record.source_id}" if record.source_id is not None else f"disaster:local:{record.id}"
+    return {
+        "doc_key": key,
+        "kind": "disaster",
+        "disaster_type": record.disaster_type,
+        "title": record.name or f"{record.disaster_type} in {record.location}",
+        "body": record.description,
+        "source": "ReliefWeb" if record.source_id is not None else None,
+        "url": record.url,
+        "date": record.date.strftime("%Y-%m-%d") if record.date else None
+    }
+
+
+def guideline_document(disaster_type, strategy):
+    """
+    Search document for a ReliefWeb guideline from get_reliefweb_strategies()
+    """
+    identity = strategy.get("url") or strategy.get("title") or ""
+    return {
+        "doc_key": f"guideline:{hashlib.sha1(identity.encode('utf-8')).hexdigest()}",
+        "kind": "guideline",
+        "disaster_type": disaster_type,
+        "title": strategy.get("title"),
+        "body": strategy.get("body"),
+        "source": strategy.get("source"),
+        "url": strategy.get("url"),
+        "date": (strategy.get("date") or "")[:10] or None
+    }
+
+
+def search_documents(query, kind=None, disaster_type=None, limit=20):
+    """
+    Search strategies, guidelines and historical disasters
+
+    Must be called inside an application context.
+
+    Args:
+        query: Words that must all appear in a result
+        kind: Optional filter, one of SEARCH_KINDS
+        disaster_type: Optional disaster type filter (e.g. Flood)
+        limit: Maximum number of results, at most MAX_RESULTS
+
+    Returns:
+        dict: The total number of matches and the best results, best first
+    """
+    limit = max(1, min(limit, MAX_RESULTS))
+    index = _get_index()
+    if index is not None:
+        total, matches = index.search(query, kind=kind, disaster_type=disaster_type, limit=limit)
+    else:
+        total, matches = _search_database(query, kind=kind, disaster_type=disaster_type, limit=limit)
+    terms = set(tokenize(query))
+
+    results = []
+    for document, score in matches:
+        results.append({
+            "kind": document["kind"],
+            "disaster_type": document["disaster_type"],
+            "title": document["title"],
+            "snippet": _snippet(document.get("body") or "", terms),
+            "phase": document.get("phase"),
+            "source": document.get("source"),
+            "url": document.get("url"),
+            "date": document.get("date"),
+            "score": round(score, 4)
+        })
+
+    return {"query": query, "total": total, "results": results}
+
+
+def _snippet(body, terms):
+    """
+    The part of body around the first query term, at most SNIPPET_LENGTH characters
+    """
+    start = 0
+    for match in _TOKEN_PATTERN.finditer(body.lower()):
+        if any(term in terms for term in tokenize(match.group())):
+            start = max(0, match.start() - SNIPPET_LENGTH // 4)
+            break
+
+    snippet = body[start:start + SNIPPET_LENGTH].strip()
+    if start > 0:
+        snippet = "..." + snippet
+    if start + SNIPPET_LENGTH < len(body):
+        snippet += "..."
+    return snippet
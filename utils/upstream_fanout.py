@@ -0,0 +1,166 @@
+"""
+Concurrent fan-out of blocking upstream calls
+
+The upstream fetchers are synchronous (requests, through utils.http_client).
+A request that needs several of them runs them side by side on a thread
+pool shared by every request in the worker and waits for all of them, so it
+takes as long as the slowest call rather than the sum of them. The calls
+reuse the pooled sessions, circuit breakers and caches of the synchronous
+implementation.
+
+This shortens requests; it does not let a worker serve more of them at once.
+A gunicorn sync worker still holds one request until its slowest call
+returns, so with upstreams answering in L seconds it serves at most about
+1/L requests per second, however many calls each request fans out. More
+capacity than that takes more workers or threaded workers.
+
+Strategies and image analyses are one upstream call per request, so they
+have nothing to fan out.
+"""
+import os
+import threading
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from utils.disaster_prediction import predict_disasters
+from utils.weather_api import get_weather_data, get_forecast_data
+from utils.weather_ingest import get_current_weather
+from utils.prediction_store import get_predictions, get_all_predictions
+from utils.historical_store import get_historical_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Threads available for blocking upstream calls, shared by every request in the
+# worker; keep it at or below the per-host pool size in utils.http_client
+UPSTREAM_CONCURRENCY = int(os.environ.get("UPSTREAM_CONCURRENCY", "10"))
+
+# Upper bound on how long a request handler waits for a batch of calls
+GATHER_TIMEOUT = float(os.environ.get("UPSTREAM_GATHER_TIMEOUT", "30"))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """
+    Get the worker's shared thread pool, creating it on first use
+
+    The pool is recreated after a fork, since threads do not survive into
+    gunicorn worker processes.
+    """
+    global _executor, _executor_pid
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=UPSTREAM_CONCURRENCY, thread_name_prefix="upstream")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def gather(calls, timeout=GATHER_TIMEOUT):
+    """
+    Run blocking calls concurrently on the shared thread pool and wait for
+    all of them
+
+    Each call runs in a copy of the calling context, so its log records
+    carry the ID of the request that is waiting for it.
+
+    Args:
+        calls: (function, *args) tuples
+        timeout: Seconds to wait for the calls altogether
+
+    Returns:
+        list: The result of each call, in order; a call that failed, or had
+        not finished within timeout, is returned as its exception instead
+        of raising
+    """
+    executor = _get_executor()
+    futures = [executor.submit(contextvars.copy_context().run, *call) for call in calls]
+    wait(futures, timeout)
+
+    results = []
+    for call, future in zip(calls, futures):
+        if not future.done():
+            # Left running; its result is discarded
+            future.cancel()
+            logger.warning("%s did not finish within %ss", call[0].__name__, timeout)
+            results.append(TimeoutError(f"{call[0].__name__} did not finish within {timeout}s"))
+        elif future.exception() is not None:
+            results.append(future.exception())
+        else:
+            results.append(future.result())
+    return results
+
+
+def _with_app_context(app, func, *args):
+    with app.app_context():
+        return func(*args)
+
+
+def fetch_weather_data(city, app=None):
+    """
+    Fetch current weather for a city; given the Flask app, ingested
+    WeatherData rows are preferred over calling Open-Meteo
+    """
+    if app is None:
+        return get_weather_data(city)
+    return _with_app_context(app, get_current_weather, city)
+
+
+def fetch_disaster_predictions(city, app=None):
+    """
+    Fetch disaster predictions for a city; given the Flask app, the stored
+    predictions in DisasterPrediction are served instead of fresh ones
+    """
+    if app is None:
+        return predict_disasters(city)
+    return _with_app_context(app, get_predictions, city)
+
+
+def fetch_historical_disasters(app):
+    """
+    Fetch India's historical disasters from the local store, which only
+    waits on ReliefWeb while it is empty
+
+    Returns:
+        tuple: (disasters, updated_at) as returned by get_historical_snapshot
+    """
+    return _with_app_context(app, get_historical_snapshot)
+
+
+def fetch_all_disaster_predictions(cities, app):
+    """
+    Fetch the stored disaster predictions of several cities
+    """
+    return _with_app_context(app, get_all_predictions, cities)
+
+
+def gather_dashboard_data(city, app=None):
+    """
+    Fetch weather, forecast and disaster predictions for a city concurrently
+
+    Returns:
+        tuple: (weather, forecast, predictions); a fetch that failed is
+        returned as its exception instead of raising
+    """
+    return tuple(gather([
+        (fetch_weather_data, city, app),
+        (get_forecast_data, city),
+        (fetch_disaster_predictions, city, app)
+    ]))
+
+
+def gather_prediction_data(cities, app):
+    """
+    Fetch the historical disasters and the predictions of cities concurrently
+
+    Returns:
+        tuple: ((disasters, updated_at), predictions by city); a fetch that
+        failed is returned as its exception instead of raising
+    """
+    return tuple(gather([
+        (fetch_historical_disasters, app),
+        (fetch_all_disaster_predictions, cities, app)
+    ]))
@@ -1,43 +1,48 @@
 import requests
 import logging
+import os
+import time
 from datetime import datetime, timedelta
+from utils import http_client
+from utils.cache import TTLCache
+# City name -> (latitude, longitude) of every supported city
+from utils.reference_data import CITY_COORDINATES, WEATHER_DESCRIPTIONS
 
 logger = logging.getLogger(__name__)
 
-# City coordinates (latitude, longitude) for major Indian cities
-CITY_COORDINATES = {
-    "Mumbai": [19.0760, 72.8777],
-    "Delhi": [28.6139, 77.2090],
-    "Bangalore": [12.9716, 77.5946],
-    "Hyderabad": [17.3850, 78.4867],
-    "Chennai": [13.0827, 80.2707],
-    "Kolkata": [22.5726, 88.3639],
-    "Pune": [18.5204, 73.8567],
-    "Ahmedabad": [23.0225, 72.5714],
-    "Jaipur": [26.9124, 75.7873],
-    "Surat": [21.1702, 72.8311],
-    "Lucknow": [26.8467, 80.9462],
-    "Kanpur": [26.4499, 80.3319],
-    "Nagpur": [21.1458, 79.0882],
-    "Indore": [22.7196, 75.8577],
-    "Thane": [19.2183, 72.9781],
-    "Bhopal": [23.2599, 77.4126],
-    "Visakhapatnam": [17.6868, 83.2185],
-    "Patna": [25.5941, 85.1376],
-    "Vadodara": [22.3072, 73.1812],
-    "Ghaziabad": [28.6692, 77.4538]
-}
+# Open-Meteo forecast endpoint; overridable to point at a local stub upstream
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Open-Meteo refreshes current conditions every 15 minutes and its model
+# output hourly, so cached entries never outlive the next top of the hour
+WEATHER_CACHE_TTL = 15 * 60
+FORECAST_CACHE_TTL = 60 * 60
+
+weather_cache = TTLCache("weather", maxsize=256, default_ttl=WEATHER_CACHE_TTL)
+forecast_cache = TTLCache("forecast", maxsize=256, default_ttl=FORECAST_CACHE_TTL)
+batch_cache = TTLCache("weather_batch", maxsize=4, default_ttl=WEATHER_CACHE_TTL)
 
 def get_weather_data(city):
     """
     Get current weather data for a city using Open-Meteo API
+    Results are cached until the next Open-Meteo update
     """
     if city not in CITY_COORDINATES:
         raise ValueError(f"City '{city}' is not supported")
     
+    return weather_cache.get_or_load(
+        city,
+        lambda: _fetch_weather_data(city),
+        ttl=cache_ttl(WEATHER_CACHE_TTL)
+    )
+
+def _fetch_weather_data(city):
+    """
+    Fetch current weather data for a city from Open-Meteo, bypassing the cache
+    """
     lat, lon = CITY_COORDINATES[city]
     
-    url = f"https://api.open-meteo.com/v1/forecast"
+    url = OPEN_METEO_URL
     params = {
         "latitude": lat,
         "longitude": lon,
@@ -46,56 +51,47 @@ def get_weather_data(city):
     }
     
     try:
-        response = requests.get(url, params=params)
+        response = http_client.get(url, params=params)
         response.raise_for_status()
         data = response.json()
         
-        # Extract current weather data
-        current = data.get("current_weather", {})
-        
-        # Get the current hour's index
-        current_time = datetime.fromisoformat(current.get("time", "").replace("Z", ""))
-        current_hour_index = None
-        
-        hourly_time = data.get("hourly", {}).get("time", [])
-        for i, time_str in enumerate(hourly_time):
-            if time_str == current.get("time"):
-                current_hour_index = i
-                break
-        
-        if current_hour_index is not None:
-            humidity = data.get("hourly", {}).get("relativehumidity_2m", [])[current_hour_index]
-            precipitation = data.get("hourly", {}).get("precipitation", [])[current_hour_index]
-        else:
-            humidity = None
-            precipitation = None
-        
-        return {
-            "city": city,
-            "temperature": current.get("temperature"),
-            "windspeed": current.get("windspeed"),
-            "winddirection": current.get("winddirection"),
-            "weathercode": current.get("weathercode"),
-            "humidity": humidity,
-            "precipitation": precipitation,
-            "time": current.get("time"),
-            "weather_description": get_weather_description(current.get("weathercode"))
-        }
+        return _parse_current_weather(city, data)
     
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching weather data for {city}: {str(e)}")
+        logger.error("Error fetching weather data for %s: %s", city, e)
         raise Exception(f"Failed to fetch weather data: {str(e)}")
 
 def get_forecast_data(city):
     """
     Get 5-day weather forecast for a city using Open-Meteo API
+    Results are cached until the next Open-Meteo update
+    """
+    return get_versioned_forecast_data(city)[0]
+
+def get_versioned_forecast_data(city):
+    """
+    Get the forecast like get_forecast_data, with the expiry of its cache
+    entry, which changes whenever the forecast is reloaded
+    
+    Returns:
+        tuple: (forecast, expires_at)
     """
     if city not in CITY_COORDINATES:
         raise ValueError(f"City '{city}' is not supported")
     
+    return forecast_cache.get_or_load_entry(
+        city,
+        lambda: _fetch_forecast_data(city),
+        ttl=cache_ttl(FORECAST_CACHE_TTL)
+    )
+
+def _fetch_forecast_data(city):
+    """
+    Fetch the 5-day forecast for a city from Open-Meteo, bypassing the cache
+    """
     lat, lon = CITY_COORDINATES[city]
     
-    url = f"https://api.open-meteo.com/v1/forecast"
+    url = OPEN_METEO_URL
     params = {
         "latitude": lat,
         "longitude": lon,
@@ -105,62 +101,266 @@ def get_forecast_data(city):
     }
     
     try:
-        response = requests.get(url, params=params)
+        response = http_client.get(url, params=params)
         response.raise_for_status()
         data = response.json()
         
-        daily_data = data.get("daily", {})
+        return _parse_forecast(data)
+    
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching forecast data for %s: %s", city, e)
+        raise Exception(f"Failed to fetch forecast data: {str(e)}")
+
+def get_all_weather_data():
+    """
+    Get current weather and 5-day forecast for every supported city
+    using a single Open-Meteo request for all coordinates
+    
+    Returns:
+        dict: City name mapped to {"weather": ..., "forecast": [...]}
+    """
+    return _get_weather_batch()["results"]
+
+def get_all_weather_arrays():
+    """
+    Get the raw hourly and daily Open-Meteo arrays for every supported city,
+    from the same request as get_all_weather_data
+    
+    Returns:
+        dict: {"version": ..., "cities": {city: {"hourly": {...}, "daily": {...}}}}
+        where version changes whenever Open-Meteo publishes new data
+    """
+    return _get_weather_batch()["arrays"]
+
+def get_cached_weather_arrays():
+    """
+    Get the arrays of get_all_weather_arrays if the batch holding them is
+    cached and fresh, without calling Open-Meteo
+    
+    Returns:
+        dict or None: None when the batch has expired or was never fetched
+    """
+    entry = batch_cache.peek(tuple(CITY_COORDINATES))
+    if entry is None or entry[1] <= time.time():
+        return None
+    return entry[0]["arrays"]
+
+def _get_weather_batch():
+    cities = tuple(CITY_COORDINATES)
+    
+    return batch_cache.get_or_load(
+        cities,
+        lambda: _fetch_all_weather_data(cities),
+        ttl=cache_ttl(WEATHER_CACHE_TTL)
+    )
+
+def _fetch_all_weather_data(cities):
+    """
+    Fetch current weather and forecasts for several cities from Open-Meteo
+    in one request, priming the per-city caches with the results
+    
+    Returns:
+        dict: {"results": ..., "arrays": ...} as returned by
+        get_all_weather_data and get_all_weather_arrays
+    """
+    url = OPEN_METEO_URL
+    params = {
+        "latitude": ",".join(str(CITY_COORDINATES[city][0]) for city in cities),
+        "longitude": ",".join(str(CITY_COORDINATES[city][1]) for city in cities),
+        "current_weather": True,
+        "hourly": "temperature_2m,relativehumidity_2m,precipitation,windspeed_10m",
+        "daily": "weathercode,temperature_2m_max,temperature_2m_min,precipitation_sum",
+        "timezone": "auto",
+        "forecast_days": 7
+    }
+    
+    try:
+        response = http_client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        
+        # Open-Meteo returns a list with one entry per coordinate pair,
+        # in request order, or a single object when only one was given
+        locations = data if isinstance(data, list) else [data]
+        if len(locations) != len(cities):
+            raise Exception(f"Expected {len(cities)} locations, got {len(locations)}")
+        
+        results = {}
+        arrays = {}
+        for city, location_data in zip(cities, locations):
+            weather = _parse_current_weather(city, location_data)
+            forecast = _parse_forecast(location_data)
+            
+            weather_cache.set(city, weather, cache_ttl(WEATHER_CACHE_TTL))
+            forecast_cache.set(city, forecast, cache_ttl(FORECAST_CACHE_TTL))
+            
+            results[city] = {
+                "weather": weather,
+                "forecast": forecast
+            }
+            arrays[city] = {
+                "hourly": location_data.get("hourly", {}),
+                "daily": location_data.get("daily", {})
+            }
         
-        forecast = []
-        for i in range(min(5, len(daily_data.get("time", [])))):
-            forecast.append({
-                "date": daily_data.get("time", [])[i],
-                "weathercode": daily_data.get("weathercode", [])[i],
-                "temperature_max": daily_data.get("temperature_2m_max", [])[i],
-                "temperature_min": daily_data.get("temperature_2m_min", [])[i],
-                "precipitation": daily_data.get("precipitation_sum", [])[i],
-                "weather_description": get_weather_description(daily_data.get("weathercode", [])[i])
-            })
+        # The latest observation time identifies the data the same way in
+        # every worker, so it can key anything derived from these arrays
+        version = max((result["weather"]["time"] or "" for result in results.values()), default="")
         
-        return forecast
+        return {
+            "results": results,
+            "arrays": {
+                "version": version,
+                "cities": arrays
+            }
+        }
     
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching forecast data for {city}: {str(e)}")
-        raise Exception(f"Failed to fetch forecast data: {str(e)}")
+        logger.error("Error fetching weather data for all cities: %s", e)
+        raise Exception(f"Failed to fetch weather data: {str(e)}")
 
-def get_weather_description(code):
+def get_hourly_observations(cities=None, past_days=1):
     """
-    Convert WMO weather code to description
+    Get hourly observations up to the current hour for several cities
+    using a single Open-Meteo request
+    
+    Args:
+        cities: City names (default: every supported city)
+        past_days: Days of history to include before today
+        
+    Returns:
+        dict: City name mapped to a list of hourly observation dicts with
+        naive UTC datetime timestamps, oldest first
     """
-    weather_codes = {
-        0: "Clear sky",
-        1: "Mainly clear",
-        2: "Partly cloudy",
-        3: "Overcast",
-        45: "Fog",
-        48: "Depositing rime fog",
-        51: "Light drizzle",
-        53: "Moderate drizzle",
-        55: "Dense drizzle",
-        56: "Light freezing drizzle",
-        57: "Dense freezing drizzle",
-        61: "Slight rain",
-        63: "Moderate rain",
-        65: "Heavy rain",
-        66: "Light freezing rain",
-        67: "Heavy freezing rain",
-        71: "Slight snow fall",
-        73: "Moderate snow fall",
-        75: "Heavy snow fall",
-        77: "Snow grains",
-        80: "Slight rain showers",
-        81: "Moderate rain showers",
-        82: "Violent rain showers",
-        85: "Slight snow showers",
-        86: "Heavy snow showers",
-        95: "Thunderstorm",
-        96: "Thunderstorm with slight hail",
-        99: "Thunderstorm with heavy hail"
+    if cities is None:
+        cities = list(CITY_COORDINATES)
+    for city in cities:
+        if city not in CITY_COORDINATES:
+            raise ValueError(f"City '{city}' is not supported")
+    
+    url = OPEN_METEO_URL
+    params = {
+        "latitude": ",".join(str(CITY_COORDINATES[city][0]) for city in cities),
+        "longitude": ",".join(str(CITY_COORDINATES[city][1]) for city in cities),
+        "hourly": "temperature_2m,relativehumidity_2m,precipitation,windspeed_10m,winddirection_10m,weathercode",
+        "past_days": past_days,
+        "forecast_days": 1
     }
     
-    return weather_codes.get(code, "Unknown")
+    try:
+        response = http_client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        
+        locations = data if isinstance(data, list) else [data]
+        if len(locations) != len(cities):
+            raise Exception(f"Expected {len(cities)} locations, got {len(locations)}")
+        
+        now = datetime.utcnow()
+        observations = {}
+        for city, location_data in zip(cities, locations):
+            hourly = location_data.get("hourly", {})
+            city_observations = []
+            for i, time_str in enumerate(hourly.get("time", [])):
+                timestamp = datetime.fromisoformat(time_str)
+                if timestamp > now:
+                    break
+                city_observations.append({
+                    "timestamp": timestamp,
+                    "temperature": hourly.get("temperature_2m", [])[i],
+                    "humidity": hourly.get("relativehumidity_2m", [])[i],
+                    "precipitation": hourly.get("precipitation", [])[i],
+                    "wind_speed": hourly.get("windspeed_10m", [])[i],
+                    "wind_direction": hourly.get("winddirection_10m", [])[i],
+                    "weathercode": hourly.get("weathercode", [])[i]
+                })
+            observations[city] = city_observations
+        
+        return observations
+    
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching hourly observations: %s", e)
+        raise Exception(f"Failed to fetch hourly observations: {str(e)}")
+
+def _parse_current_weather(city, data):
+    """
+    Build the current weather summary from an Open-Meteo location response,
+    with its time in GMT whatever timezone the request asked for
+    """
+    current = data.get("current_weather", {})
+    
+    # Get the current hour's index
+    current_hour_index = None
+    
+    hourly_time = data.get("hourly", {}).get("time", [])
+    for i, time_str in enumerate(hourly_time):
+        if time_str == current.get("time"):
+            current_hour_index = i
+            break
+    
+    if current_hour_index is not None:
+        humidity = data.get("hourly", {}).get("relativehumidity_2m", [])[current_hour_index]
+        precipitation = data.get("hourly", {}).get("precipitation", [])[current_hour_index]
+    else:
+        humidity = None
+        precipitation = None
+    
+    # Responses to "timezone": "auto" give local times, with the offset
+    observed_at = current.get("time")
+    utc_offset = data.get("utc_offset_seconds") or 0
+    if observed_at and utc_offset:
+        observed_at = (datetime.fromisoformat(observed_at) - timedelta(seconds=utc_offset)).strftime("%Y-%m-%dT%H:%M")
+    
+    return {
+        "city": city,
+        "temperature": current.get("temperature"),
+        "windspeed": current.get("windspeed"),
+        "winddirection": current.get("winddirection"),
+        "weathercode": current.get("weathercode"),
+        "humidity": humidity,
+        "precipitation": precipitation,
+        "time": observed_at,
+        "weather_description": get_weather_description(current.get("weathercode"))
+    }
+
+def _parse_forecast(data):
+    """
+    Build the 5-day forecast list from an Open-Meteo location response
+    """
+    daily_data = data.get("daily", {})
+    
+    forecast = []
+    for i in range(min(5, len(daily_data.get("time", [])))):
+        forecast.append({
+            "date": daily_data.get("time", [])[i],
+            "weathercode": daily_data.get("weathercode", [])[i],
+            "temperature_max": daily_data.get("temperature_2m_max", [])[i],
+            "temperature_min": daily_data.get("temperature_2m_min", [])[i],
+            "precipitation": daily_data.get("precipitation_sum", [])[i],
+            "weather_description": get_weather_description(daily_data.get("weathercode", [])[i])
+        })
+    
+    return forecast
+
+def cache_ttl(max_ttl):
+    """
+    Seconds until the next hourly Open-Meteo update, capped at max_ttl
+    """
+    seconds_to_next_hour = 3600 - (time.time() % 3600)
+    return min(max_ttl, seconds_to_next_hour)
+
+def get_cache_stats():
+    """
+    Get hit/miss/stale counters for the weather and forecast caches
+    """
+    return {
+        "weather": weather_cache.stats(),
+        "forecast": forecast_cache.stats(),
+        "weather_batch": batch_cache.stats()
+    }
+
+def get_weather_description(code):
+    """
+    Convert WMO weather code to description
+    """
+    return WEATHER_DESCRIPTIONS.get(code, "Unknown")
\ No newline at end of file
@@ -0,0 +1,206 @@
+import os
+import threading
+import logging
+from datetime import datetime, timedelta
+
+from utils.weather_api import get_weather_data, get_hourly_observations, get_weather_description
+
+logger = logging.getLogger(__name__)
+
+# Seconds between ingestion runs; Open-Meteo publishes hourly values
+INGEST_INTERVAL = int(os.environ.get("WEATHER_INGEST_INTERVAL", str(15 * 60)))
+
+# Rows per INSERT statement, kept well under SQLite's bound-parameter limit
+INGEST_BATCH_SIZE = 100
+
+# Lock file used to pick the one worker that ingests when running in-process
+INGEST_LOCK_FILE = os.environ.get("WEATHER_INGEST_LOCK_FILE", "/tmp/climate_app_weather_ingest.lock")
+
+# A stored observation counts as current weather for this long
+STORED_WEATHER_MAX_AGE = timedelta(hours=1)
+
+_UPSERT_COLUMNS = ["temperature", "humidity", "wind_speed", "precipitation", "wind_direction", "weathercode"]
+
+_ingest_pid = None
+_ingest_lock = threading.Lock()
+
+
+def ingest_weather_observations(cities=None, past_days=1):
+    """
+    Fetch hourly observations for all cities in one request and upsert them
+    into WeatherData, keyed on (location, timestamp)
+
+    Safe to run repeatedly: hours already stored are updated in place.
+    Must be called inside an application context.
+
+    Returns:
+        int: Number of rows written
+    """
+    observations = get_hourly_observations(cities, past_days=past_days)
+
+    rows = []
+    for city, city_observations in observations.items():
+        for observation in city_observations:
+            # WeatherData requires every core reading
+            if any(observation[key] is None for key in ("temperature", "humidity", "wind_speed", "precipitation")):
+                continue
+            rows.append(dict(observation, location=city))
+
+    _upsert_rows(rows)
+    logger.info("Ingested %s hourly weather observations for %s cities", len(rows), len(observations))
+    return len(rows)
+
+
+def _upsert_rows(rows):
+    """
+    Insert WeatherData rows in batches, updating rows whose (location, timestamp) exists
+    """
+    from app import db
+    from models import WeatherData
+    from schema import upsert_rows
+
+    upsert_rows(WeatherData, rows, ["location", "timestamp"], _UPSERT_COLUMNS, batch_size=INGEST_BATCH_SIZE)
+    db.session.commit()
+
+
+def get_stored_weather(city):
+    """
+    Get the current weather for a city from ingested WeatherData rows
+
+    Returns:
+        dict: Same shape as utils.weather_api.get_weather_data, or None if
+        no observation from the last hour is stored
+    """
+    from models import WeatherData
+
+    observation = (
+        WeatherData.query
+        .filter(
+            WeatherData.location == city,
+            WeatherData.timestamp >= datetime.utcnow() - STORED_WEATHER_MAX_AGE
+        )
+        .order_by(WeatherData.timestamp.desc())
+        .first()
+    )
+    if observation is None:
+        return None
+
+    return {
+        "city": city,
+        "temperature": observation.temperature,
+        "windspeed": observation.wind_speed,
+        "winddirection": observation.wind_direction,
+        "weathercode": observation.weathercode,
+        "humidity": observation.humidity,
+        "precipitation": observation.precipitation,
+        "time": observation.timestamp.strftime("%Y-%m-%dT%H:%M"),
+        "weather_description": get_weather_description(observation.weathercode)
+    }
+
+
+def get_current_weather(city):
+    """
+    Get the current weather for a city, preferring ingested rows over a
+    network call to Open-Meteo. Must be called inside an application context.
+    """
+    try:
+        stored = get_stored_weather(city)
+    except Exception as e:
+        logger.warning("Could not read stored weather for %s: %s", city, e)
+        stored = None
+
+    if stored is not None:
+        return stored
+    return get_weather_data(city)
+
+
+def get_weather_history(city, hours=24):
+    """
+    Get the stored hourly observations for a city over the last `hours` hours,
+    oldest first
+    """
+    from models import WeatherData
+
+    observations = (
+        WeatherData.query
+        .filter(
+            WeatherData.location == city,
+            WeatherData.timestamp >= datetime.utcnow() - timedelta(hours=hours)
+        )
+        .order_by(WeatherData.timestamp)
+        .all()
+    )
+
+    return [
+        {
+            "time": observation.timestamp.strftime("%Y-%m-%dT%H:%M"),
+            "temperature": observation.temperature,
+            "humidity": observation.humidity,
+            "wind_speed": observation.wind_speed,
+            "precipitation": observation.precipitation,
+            "weathercode": observation.weathercode
+        }
+        for observation in observations
+    ]
+
+
+def run_ingestion_loop(app, interval=INGEST_INTERVAL, stop_event=None):
+    """
+    Ingest observations every `interval` seconds until stop_event is set,
+    then recompute the stored disaster predictions the new weather outdates
+    """
+    from utils.prediction_store import refresh_predictions
+
+    stop_event = stop_event or threading.Event()
+
+    while not stop_event.is_set():
+        with app.app_context():
+            try:
+                ingest_weather_observations()
+            except Exception as e:
+                logger.error("Weather ingestion failed: %s", e)
+            try:
+                refresh_predictions()
+            except Exception as e:
+                logger.error("Refreshing disaster predictions failed: %s", e)
+        stop_event.wait(interval)
+
+
+def start_ingestion_thread(app, interval=INGEST_INTERVAL):
+    """
+    Run the ingestion loop in a daemon thread of this process, once per
+    process
+
+    With several gunicorn workers only the one holding INGEST_LOCK_FILE
+    ingests; the others return without starting a thread.
+
+    Returns:
+        threading.Thread or None
+    """
+    import fcntl
+
+    global _ingest_pid
+
+    if _ingest_pid == os.getpid():
+        return None
+    with _ingest_lock:
+        if _ingest_pid == os.getpid():
+            return None
+        _ingest_pid = os.getpid()
+
+    lock_file = open(INGEST_LOCK_FILE, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        logger.info("Weather ingestion is running in another process")
+        return None
+
+    def run():
+        # Hold the lock file open for as long as this process ingests
+        with lock_file:
+            run_ingestion_loop(app, interval)
+
+    thread = threading.Thread(target=run, name="weather-ingest", daemon=True)
+    thread.start()
+    return thread